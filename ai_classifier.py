@@ -4,17 +4,171 @@ import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.pipeline import Pipeline
+from sklearn.base import clone
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, accuracy_score
+import copy
+import logging
 import re
 import pickle
 import os
+import time
+from logs import event, get_logger
+from metrics import metrics
+from response_templates import RESPONSE_TEMPLATES, render_response
 
+logger = get_logger('classifier')
 
+# Stopwords em português (lista básica, sem NLTK)
+STOP_WORDS = {
+    'de', 'da', 'do', 'das', 'dos', 'a', 'o', 'as', 'os', 'um', 'uma', 
+    'uns', 'umas', 'em', 'por', 'para', 'com', 'sem', 'sob', 'sobre',
+    'entre', 'ante', 'após', 'até', 'com', 'contra', 'desde', 'em',
+    'entre', 'para', 'perante', 'por', 'sem', 'sob', 'sobre', 'trás',
+    'e', 'mas', 'ou', 'pois', 'que', 'se', 'porque', 'como', 'quando',
+    'onde', 'qual', 'quem', 'cujo', 'cuja', 'cujos', 'cujas', 'este',
+    'esta', 'estes', 'estas', 'esse', 'essa', 'esses', 'essas', 'aquele',
+    'aquela', 'aqueles', 'aquelas', 'isto', 'isso', 'aquilo', 'ao', 'aos',
+    'na', 'no', 'nas', 'nos', 'pela', 'pelo', 'pelas', 'pelos', 'meu',
+    'minha', 'meus', 'minhas', 'teu', 'tua', 'teus', 'tuas', 'seu', 'sua',
+    'seus', 'suas', 'nosso', 'nossa', 'nossos', 'nossas', 'deles', 'delas',
+    'algum', 'alguma', 'alguns', 'algumas', 'todo', 'toda', 'todos', 'todas',
+    'outro', 'outra', 'outros', 'outras', 'certo', 'certa', 'certos', 'certas',
+    'vário', 'vária', 'vários', 'várias', 'qualquer', 'quaisquer', 'tal',
+    'tais', 'cada', 'ambos', 'ambas', 'muito', 'muita', 'muitos', 'muitas',
+    'pouco', 'pouca', 'poucos', 'poucas', 'alguns', 'algumas', 'tanto',
+    'tanta', 'tantos', 'tantas', 'quanto', 'quanta', 'quantos', 'quantas',
+    'outrem', 'ninguém', 'nada', 'nenhum', 'nenhuma', 'nenhuns',
+    'nenhumas', 'algo', 'alguém', 'ser', 'estar', 'ter', 'haver', 'ir',
+    'vir', 'fazer', 'dizer', 'dar', 'ver', 'saber', 'poder', 'querer'
+}
+
+
+def preprocess_text(text):
+    """Preprocessa o texto para classificação (versão sem NLTK)"""
+    if not text:
+        return ""
+    
+    # Converter para minúsculas
+    text = text.lower()
+    
+    # Remover caracteres especiais mas manter acentos
+    text = re.sub(r'[^a-záàãâéêíóôõúç\s]', ' ', text)
+    
+    # Tokenização simples (sem NLTK) - dividir por espaços
+    tokens = text.split()
+    
+    # Filtrar stopwords e palavras muito curtas
+    tokens = [token for token in tokens if token not in STOP_WORDS and len(token) > 2]
+    
+    return ' '.join(tokens)
+
+
+# Janela de entrada: corpos enormes (logs colados, base64, conversas inteiras) são
+# reduzidos antes do preprocessamento e da extração de n-gramas
+INPUT_MAX_BYTES = int(os.getenv('INPUT_MAX_BYTES', 65536))      # 0 = sem limite
+INPUT_HEAD_TOKENS = int(os.getenv('INPUT_HEAD_TOKENS', 512))    # 0 = sem janela de tokens
+INPUT_TAIL_TOKENS = int(os.getenv('INPUT_TAIL_TOKENS', 128))
+INPUT_STRIP_QUOTES = os.getenv('INPUT_STRIP_QUOTES', '1') == '1'
+INPUT_STRIP_SIGNATURE = os.getenv('INPUT_STRIP_SIGNATURE', '1') == '1'
+
+# Cabeçalho do histórico citado numa resposta ("Em ..., Fulano escreveu:", "-----Original Message-----")
+REPLY_HEADER = re.compile(
+    r'^\s*(?:em .{0,200}escreveu:|on .{0,200}wrote:|-{2,}\s*(?:mensagem original|original message)\s*-{2,}'
+    r'|de:\s.+\n\s*(?:enviad[oa](?: em)?|data|sent|date):\s)',
+    re.IGNORECASE | re.MULTILINE)
+QUOTED_LINE = re.compile(r'^[ \t]*>.*$\n?', re.MULTILINE)
+SIGNATURE = re.compile(
+    r'^(?:--\s*$|enviado do meu |sent from my |atenciosamente,?\s*$|att\.?,?\s*$|abraços?,?\s*$)',
+    re.IGNORECASE | re.MULTILINE)
+
+
+def cap_bytes(text, limit):
+    """Primeiros 3/4 e últimos 1/4 de `limit` bytes do texto em UTF-8"""
+    # Até 4 bytes por caractere: textos curtos nem são codificados
+    if limit <= 0 or len(text) <= limit // 4:
+        return text
+    data = text.encode('utf-8')
+    if len(data) <= limit:
+        return text
+    head = limit * 3 // 4
+    return (data[:head].decode('utf-8', errors='ignore') + '\n'
+            + data[len(data) - (limit - head):].decode('utf-8', errors='ignore'))
+
+
+def strip_quoted(text):
+    """Remove o histórico citado (a partir do cabeçalho da resposta) e as linhas com '>'"""
+    match = REPLY_HEADER.search(text)
+    stripped = text[:match.start()] if match else text
+    stripped = QUOTED_LINE.sub('', stripped)
+    # Resposta sem texto próprio: o histórico é tudo o que há para classificar
+    return stripped if stripped.strip() else text
+
+
+def strip_signature(text):
+    """Remove a assinatura e o que vem depois dela (só se sobrar texto antes)"""
+    match = SIGNATURE.search(text)
+    if match and text[:match.start()].strip():
+        return text[:match.start()]
+    return text
+
+
+def window_tokens(text, head, tail):
+    """Primeiros `head` e últimos `tail` tokens (separados por espaço)"""
+    if head <= 0:
+        return text
+    tokens = text.split()
+    if len(tokens) <= head + tail:
+        return text
+    return ' '.join(tokens[:head] + (tokens[-tail:] if tail > 0 else []))
+
+
+def window_body(body):
+    """Trecho do corpo usado pelo modelo: limite de bytes, sem citações e assinatura, janelas de tokens"""
+    if not body:
+        return body or ''
+    body = cap_bytes(body, INPUT_MAX_BYTES)
+    if INPUT_STRIP_QUOTES:
+        body = strip_quoted(body)
+    if INPUT_STRIP_SIGNATURE:
+        body = strip_signature(body)
+    return window_tokens(body, INPUT_HEAD_TOKENS, INPUT_TAIL_TOKENS)
+
+
+def model_text(subject, body):
+    """Texto de entrada do modelo, no treino e na classificação"""
+    return f"{subject} {subject} {window_body(body)}"  # Duplicar assunto para dar mais peso
+
+def build_pipeline(**params):
+    """Pipeline TF-IDF + Naive Bayes do modelo; `params` no formato de set_params (ex.: tfidf__max_features)"""
+    pipeline = Pipeline([
+        ('tfidf', TfidfVectorizer(
+            max_features=2000,  # Aumentei o número de features
+            ngram_range=(1, 3),  # Inclui trigramas para melhor contexto
+            min_df=1,  # Frequência mínima do documento
+            max_df=0.95,  # Frequência máxima do documento
+            sublinear_tf=True,  # Escala sublinear para TF
+            use_idf=True,
+            smooth_idf=True
+        )),
+        ('classifier', MultinomialNB(
+            alpha=0.01,  # Suavização menor para dados maiores
+            fit_prior=True  # Usar priors baseados na frequência das classes
+        ))
+    ])
+    return pipeline.set_params(**params)
+
+def record_stage(timings, stage, start):
+    """Duração de uma etapa do classificador, nas métricas ou no dict `timings`"""
+    if timings is None:
+        metrics.observe('classifier_stage_duration_seconds', time.perf_counter() - start, stage=stage)
+    else:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
 
 class EmailClassifier:
-    def __init__(self):
-        self.model = None
+    def __init__(self, model=None):
+        self.model = model
+        self.last_gate = None  # relatório de model_eval.gate do último retreinamento
         self.categories = {
             1: 'Suporte Técnico',
             2: 'Vendas', 
@@ -26,7 +180,9 @@ class EmailClassifier:
         self.model_path = 'email_classifier_model.pkl'
         self.vectorizer_path = 'email_vectorizer.pkl'
         
-        # Carregar ou treinar modelo
+        # Carregar ou treinar modelo (com `model`, usa o pipeline recebido)
+        if model is not None:
+            return
         if os.path.exists(self.model_path):
             self.load_model()
         else:
@@ -34,50 +190,11 @@ class EmailClassifier:
     
     def preprocess_text(self, text):
         """Preprocessa o texto para classificação (versão sem NLTK)"""
-        if not text:
-            return ""
-        
-        # Converter para minúsculas
-        text = text.lower()
-        
-        # Remover caracteres especiais mas manter acentos
-        text = re.sub(r'[^a-záàãâéêíóôõúç\s]', ' ', text)
-        
-        # Tokenização simples (sem NLTK) - dividir por espaços
-        tokens = text.split()
-        
-        # Remover stopwords manualmente (lista básica em português)
-        stop_words = {
-            'de', 'da', 'do', 'das', 'dos', 'a', 'o', 'as', 'os', 'um', 'uma', 
-            'uns', 'umas', 'em', 'por', 'para', 'com', 'sem', 'sob', 'sobre',
-            'entre', 'ante', 'após', 'até', 'com', 'contra', 'desde', 'em',
-            'entre', 'para', 'perante', 'por', 'sem', 'sob', 'sobre', 'trás',
-            'e', 'mas', 'ou', 'pois', 'que', 'se', 'porque', 'como', 'quando',
-            'onde', 'qual', 'quem', 'cujo', 'cuja', 'cujos', 'cujas', 'este',
-            'esta', 'estes', 'estas', 'esse', 'essa', 'esses', 'essas', 'aquele',
-            'aquela', 'aqueles', 'aquelas', 'isto', 'isso', 'aquilo', 'ao', 'aos',
-            'na', 'no', 'nas', 'nos', 'pela', 'pelo', 'pelas', 'pelos', 'meu',
-            'minha', 'meus', 'minhas', 'teu', 'tua', 'teus', 'tuas', 'seu', 'sua',
-            'seus', 'suas', 'nosso', 'nossa', 'nossos', 'nossas', 'deles', 'delas',
-            'algum', 'alguma', 'alguns', 'algumas', 'todo', 'toda', 'todos', 'todas',
-            'outro', 'outra', 'outros', 'outras', 'certo', 'certa', 'certos', 'certas',
-            'vário', 'vária', 'vários', 'várias', 'qualquer', 'quaisquer', 'tal',
-            'tais', 'cada', 'ambos', 'ambas', 'muito', 'muita', 'muitos', 'muitas',
-            'pouco', 'pouca', 'poucos', 'poucas', 'alguns', 'algumas', 'tanto',
-            'tanta', 'tantos', 'tantas', 'quanto', 'quanta', 'quantos', 'quantas',
-            'outrem', 'ninguém', 'nada', 'nenhum', 'nenhuma', 'nenhuns',
-            'nenhumas', 'algo', 'alguém', 'ser', 'estar', 'ter', 'haver', 'ir',
-            'vir', 'fazer', 'dizer', 'dar', 'ver', 'saber', 'poder', 'querer'
-        }
-        
-        # Filtrar stopwords e palavras muito curtas
-        tokens = [token for token in tokens if token not in stop_words and len(token) > 2]
-        
-        return ' '.join(tokens)
+        return preprocess_text(text)
     
     def train_initial_model(self):
         """Treina o modelo inicial com dados sintéticos EXPANDIDOS"""
-        print("Treinando modelo inicial...")
+        logger.info("Treinando modelo inicial...")
         
         # Dados de exemplo MUITO MAIS ABUNDANTES para treinamento inicial
         training_data = [
@@ -248,27 +365,11 @@ class EmailClassifier:
         texts = [self.preprocess_text(text) for text, _ in training_data]
         labels = [label for _, label in training_data]
         
-        print(f"Treinando com {len(texts)} exemplos:")
-        for cat_id, cat_name in self.categories.items():
-            count = labels.count(cat_id)
-            print(f"  {cat_name}: {count} exemplos")
+        logger.info("Treinando com %d exemplos: %s", len(texts),
+                    ', '.join(f"{cat_name} {labels.count(cat_id)}" for cat_id, cat_name in self.categories.items()))
         
         # Criar pipeline com parâmetros otimizados
-        self.model = Pipeline([
-            ('tfidf', TfidfVectorizer(
-                max_features=2000,  # Aumentei o número de features
-                ngram_range=(1, 3),  # Inclui trigramas para melhor contexto
-                min_df=1,  # Frequência mínima do documento
-                max_df=0.95,  # Frequência máxima do documento
-                sublinear_tf=True,  # Escala sublinear para TF
-                use_idf=True,
-                smooth_idf=True
-            )),
-            ('classifier', MultinomialNB(
-                alpha=0.01,  # Suavização menor para dados maiores
-                fit_prior=True  # Usar priors baseados na frequência das classes
-            ))
-        ])
+        self.model = build_pipeline()
         
         # Treinar modelo
         self.model.fit(texts, labels)
@@ -276,70 +377,110 @@ class EmailClassifier:
         # Avaliar modelo nos dados de treino
         predictions = self.model.predict(texts)
         accuracy = accuracy_score(labels, predictions)
-        print(f"Acurácia no treinamento: {accuracy:.3f}")
+        logger.info("Acurácia no treinamento: %.3f", accuracy)
         
         # Salvar modelo
         self.save_model()
         
-        print("Modelo inicial treinado com sucesso!")
+        logger.info("Modelo inicial treinado com sucesso!")
     
     def classify_email(self, subject, body):
         """Classifica um email com melhor lógica de decisão"""
         if not self.model:
-            print("Modelo não carregado, retornando categoria padrão")
+            logger.warning("Modelo não carregado, retornando categoria padrão")
             return 6, 0.5  # Categoria geral com baixa confiança
         
         # Combinar assunto e corpo (assunto tem peso maior)
-        full_text = f"{subject} {subject} {body}"  # Duplicar assunto para dar mais peso
-        processed_text = self.preprocess_text(full_text)
+        start = time.perf_counter()
+        processed_text = self.preprocess_text(model_text(subject, body))
+        metrics.observe('classifier_stage_duration_seconds', time.perf_counter() - start, stage='preprocess')
         
         if not processed_text or len(processed_text.strip()) < 3:
-            print("Texto muito curto após processamento")
+            logger.debug("Texto muito curto após processamento", extra=event('classifier.short_text'))
             return 6, 0.3
         
         try:
-            # Fazer predição
-            prediction = self.model.predict([processed_text])[0]
-            probabilities = self.model.predict_proba([processed_text])[0]
+            # Vetorizar uma única vez e derivar a predição das probabilidades
+            start = time.perf_counter()
+            features = self.model.named_steps['tfidf'].transform([processed_text])
+            metrics.observe('classifier_stage_duration_seconds', time.perf_counter() - start, stage='vectorize')
+            
+            start = time.perf_counter()
+            probabilities = self.model.named_steps['classifier'].predict_proba(features)[0]
+            prediction = self.model.classes_[probabilities.argmax()]
             confidence = max(probabilities)
+            metrics.observe('classifier_stage_duration_seconds', time.perf_counter() - start, stage='predict')
             
-            # Log para debug
-            print(f"Texto processado: {processed_text[:100]}...")
-            print(f"Predição: {prediction} ({self.categories[prediction]})")
-            print(f"Confiança: {confidence:.3f}")
-            print(f"Probabilidades por categoria:")
-            for i, prob in enumerate(probabilities):
-                cat_id = self.model.classes_[i]
-                print(f"  {self.categories[cat_id]}: {prob:.3f}")
+            # Traço para debug (desligado por padrão: LOG_LEVELS=classifier=DEBUG)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Predição %s (%s), confiança %.3f%s; probabilidades: %s; texto: %s...",
+                             prediction, self.categories[prediction], confidence,
+                             ", abaixo de 0.4: Geral" if confidence < 0.4 else "",
+                             ', '.join(f"{self.categories[cat_id]} {prob:.3f}"
+                                       for cat_id, prob in zip(self.model.classes_, probabilities)),
+                             processed_text[:100],
+                             extra=event('classifier.prediction', category_id=int(prediction),
+                                         confidence=round(float(confidence), 3)))
             
             # Se confiança muito baixa, classificar como geral
             if confidence < 0.4:
-                print("Confiança muito baixa, classificando como Geral")
                 return 6, confidence
             
             return int(prediction), float(confidence)
             
         except Exception as e:
-            print(f"Erro na classificação: {e}")
+            logger.exception("Erro na classificação: %s", e)
+            metrics.inc('errors_total', component='classifier')
             return 6, 0.3
     
+    def classify_batch(self, emails, timings=None):
+        """Classifica vários emails [(subject, body)] numa única vetorização; [(categoria, confiança)]
+        
+        Com `timings` (dict), a duração de cada etapa vai para ele em vez das métricas deste processo.
+        """
+        if not self.model:
+            logger.warning("Modelo não carregado, retornando categoria padrão")
+            return [(6, 0.5)] * len(emails)
+
+        start = time.perf_counter()
+        processed = [self.preprocess_text(model_text(subject, body)) for subject, body in emails]
+        record_stage(timings, 'preprocess', start)
+
+        # Textos curtos demais ficam fora da matriz, como em classify_email
+        results = [(6, 0.3)] * len(emails)
+        valid = [i for i, text in enumerate(processed) if text and len(text.strip()) >= 3]
+        if not valid:
+            return results
+
+        try:
+            start = time.perf_counter()
+            features = self.model.named_steps['tfidf'].transform([processed[i] for i in valid])
+            record_stage(timings, 'vectorize', start)
+
+            start = time.perf_counter()
+            probabilities = self.model.named_steps['classifier'].predict_proba(features)
+            predictions = self.model.classes_[probabilities.argmax(axis=1)]
+            confidences = probabilities.max(axis=1)
+            record_stage(timings, 'predict', start)
+        except Exception as e:
+            logger.exception("Erro na classificação em lote: %s", e)
+            metrics.inc('errors_total', component='classifier')
+            return results
+
+        for i, prediction, confidence in zip(valid, predictions, confidences):
+            # Se confiança muito baixa, classificar como geral
+            results[i] = (6, float(confidence)) if confidence < 0.4 else (int(prediction), float(confidence))
+        return results
+
     def generate_response(self, category_id, subject, body):
         """Gera resposta automática baseada na categoria"""
-        responses = {
-            1: f"Obrigado por entrar em contato sobre '{subject}'. Nossa equipe de suporte técnico analisará sua solicitação e retornará em até 24 horas com uma solução.",
-            2: f"Agradecemos seu interesse em nossos produtos/serviços. Um consultor comercial entrará em contato em breve para apresentar uma proposta personalizada sobre '{subject}'.",
-            3: f"Obrigado pelo seu interesse em nossa campanha. Acompanhe nossas redes sociais e newsletter para mais novidades sobre '{subject}'.",
-            4: f"Recebemos sua mensagem sobre '{subject}'. O setor de RH analisará sua solicitação e retornará o contato conforme necessário.",
-            5: f"Sua solicitação financeira sobre '{subject}' foi recebida. O departamento financeiro processará a informação e retornará em até 2 dias úteis.",
-            6: f"Obrigado por entrar em contato sobre '{subject}'. Analisaremos sua mensagem e retornaremos o contato conforme apropriado."
-        }
-        
-        return responses.get(category_id, responses[6])
+        template = RESPONSE_TEMPLATES.get(category_id, RESPONSE_TEMPLATES[6])
+        return render_response(template, subject)
     
     def retrain_with_feedback(self, feedback_data):
         """Retreina o modelo com dados de feedback"""
         if not feedback_data:
-            print("Nenhum dado de feedback fornecido")
+            logger.info("Nenhum dado de feedback fornecido")
             return
         
         try:
@@ -353,52 +494,95 @@ class EmailClassifier:
                 correct_category = feedback.get('correct_category_id')
                 
                 if correct_category and correct_category in self.categories:
-                    full_text = f"{subject} {subject} {body}"  # Duplicar assunto
-                    processed_text = self.preprocess_text(full_text)
+                    processed_text = self.preprocess_text(model_text(subject, body))
                     
                     if processed_text:
                         texts.append(processed_text)
                         labels.append(correct_category)
             
-            if texts and labels:
-                print(f"Retreinando com {len(texts)} exemplos de feedback")
-                
-                # Combinar com dados originais se necessário
-                if len(texts) < 20:  # Se tiver poucos feedbacks, manter dados originais
-                    print("Poucos feedbacks, mantendo treinamento incremental...")
-                    # Fazer treinamento incremental (apenas com novos dados)
-                    self.model.fit(texts, labels)
-                else:
-                    # Com muitos feedbacks, retreinar completamente
-                    print("Retreinamento completo com feedbacks...")
-                    self.model.fit(texts, labels)
-                
-                self.save_model()
-                print(f"Modelo retreinado com sucesso!")
+            self.retrain_with_examples(texts, labels)
+        
+        except Exception as e:
+            logger.exception("Erro no retreinamento: %s", e)
+    
+    def retrain_with_examples(self, texts, labels):
+        """Retreina o modelo com textos já preprocessados; True se o modelo foi salvo"""
+        self.last_gate = None
+        if not texts or not labels:
+            logger.info("Nenhum dado válido para retreinamento")
+            return False
+        
+        try:
+            logger.info("Retreinando com %d exemplos de feedback", len(texts))
+            
+            # O modelo em uso continua classificando até o candidato ser aprovado
+            candidate = clone(self.model)
+            
+            # Combinar com dados originais se necessário
+            if len(texts) < 20:  # Se tiver poucos feedbacks, manter dados originais
+                logger.info("Poucos feedbacks, mantendo treinamento incremental...")
+                # Fazer treinamento incremental (apenas com novos dados)
+                candidate.fit(texts, labels)
             else:
-                print("Nenhum dado válido para retreinamento")
+                # Com muitos feedbacks, retreinar completamente
+                logger.info("Retreinamento completo com feedbacks...")
+                candidate.fit(texts, labels)
+            
+            return self.promote(candidate)
+        
+        except Exception as e:
+            logger.exception("Erro no retreinamento: %s", e)
+            return False
+    
+    def update_with_examples(self, texts, labels):
+        """Atualiza o modelo atual só com exemplos novos (vocabulário mantido); True se salvo"""
+        self.last_gate = None
+        if not texts or not labels:
+            logger.info("Nenhum feedback novo para atualizar o modelo")
+            return False
+        
+        try:
+            logger.info("Atualizando modelo com %d exemplos novos de feedback", len(texts))
+            candidate = copy.deepcopy(self.model)
+            features = candidate.named_steps['tfidf'].transform(texts)
+            candidate.named_steps['classifier'].partial_fit(features, labels)
+            return self.promote(candidate)
         
         except Exception as e:
-            print(f"Erro no retreinamento: {e}")
+            logger.exception("Erro na atualização incremental: %s", e)
+            return False
+    
+    def promote(self, candidate):
+        """Troca o modelo pelo candidato e salva, se ele passar pelo portão de regressão"""
+        from model_eval import gate  # model_eval importa este módulo
+        
+        self.last_gate = gate(self.model, candidate)
+        if self.last_gate and not self.last_gate['approved']:
+            logger.warning("Modelo retreinado recusado: %s", '; '.join(self.last_gate['regressions']))
+            return False
+        
+        self.model = candidate
+        self.save_model()
+        logger.info("Modelo retreinado com sucesso!")
+        return True
     
     def save_model(self):
         """Salva o modelo treinado"""
         try:
             with open(self.model_path, 'wb') as f:
                 pickle.dump(self.model, f)
-            print("Modelo salvo com sucesso")
+            logger.info("Modelo salvo com sucesso")
         except Exception as e:
-            print(f"Erro ao salvar modelo: {e}")
+            logger.error("Erro ao salvar modelo: %s", e)
     
     def load_model(self):
         """Carrega o modelo salvo"""
         try:
             with open(self.model_path, 'rb') as f:
                 self.model = pickle.load(f)
-            print("Modelo carregado com sucesso!")
+            logger.info("Modelo carregado com sucesso!")
         except Exception as e:
-            print(f"Erro ao carregar modelo: {e}")
-            print("Treinando novo modelo...")
+            logger.warning("Erro ao carregar modelo: %s; treinando novo modelo...", e)
             self.train_initial_model()
 
     def test_categories(self):
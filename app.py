@@ -1,26 +1,50 @@
-from flask import Flask, request, jsonify , render_template
+from flask import Flask, request, jsonify , render_template, g, Response, send_file, make_response
 from flask_graphql import GraphQLView
 from flask_cors import CORS
 import jwt
 import traceback
 import os
+import time
 # Imports das classes 
 from database import Database
 from ai_classifier import EmailClassifier
 from schema import schema
+from ingest import dedup_key, find_existing, suggested_response_for, insert_email
+from archive import parse_date, reaches_archive, start_archiver
+from training_data import collect_training_data, get_watermark, set_watermark
+from logs import event, get_logger
+from metrics import metrics, SIZE_BUCKETS
+from ratelimit import admission, classify_operations, inference, Shed
+from http_cache import StaticAssets, compress_response, conditional
+import classify_pool
+import events
+import group_commit
+import profiling
+
+logger = get_logger('app')
 
 app = Flask(__name__)
 CORS(app)
 # Usar variável de ambiente para a chave secreta
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your_secret_key')
 
+# Arquivos de static/ com hash no nome, pré-comprimidos (servidos em /assets)
+assets = StaticAssets(app.static_folder)
+
+# GraphQL por GET só com estes campos recebe ETag (dados que quase nunca mudam)
+CACHEABLE_GRAPHQL_FIELDS = {'categories'}
+
 # Inicializar componentes
 try:
     db = Database()
     classifier = EmailClassifier()
-    print("Componentes inicializados com sucesso!")
+    start_archiver(db)
+    events.start_relay()
+    group_commit.start_writer(db)
+    classify_pool.start_pool(classifier)
+    logger.info("Componentes inicializados com sucesso!")
 except Exception as e:
-    print(f"Erro ao inicializar componentes: {e}")
+    logger.exception("Erro ao inicializar componentes: %s", e)
     db = None
     classifier = None
 
@@ -29,6 +53,12 @@ def get_current_user(token):
     if not token or not db:
         return None, False
     
+    # O mesmo token é verificado uma vez por requisição (admissão, contexto GraphQL, rotas)
+    cached = g.get('current_user')
+    if cached and cached[0] == token:
+        return cached[1]
+    
+    header = token
     try:
         if token.startswith('Bearer '):
             token = token[7:]
@@ -36,15 +66,14 @@ def get_current_user(token):
         payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
         user_id = payload['user_id']
         
-        cursor = db.connection.cursor()
-        cursor.execute("SELECT is_admin FROM users WHERE id = %s", (user_id,))
+        cursor = db.execute_prepared('users.is_admin', "SELECT is_admin FROM users WHERE id = %s", (user_id,))
         user_data = cursor.fetchone()
         
-        if user_data:
-            return user_id, user_data[0]
-        return None, False
+        g.current_user = (header, (user_id, user_data[0]) if user_data else (None, False))
+        return g.current_user[1]
     except Exception as e:
-        print(f"Erro na autenticação: {e}")
+        logger.warning("Erro na autenticação: %s", e, extra=event('auth.invalid_token'))
+        metrics.inc('errors_total', component='auth')
         return None, False
 
 class GraphQLContext:
@@ -59,6 +88,32 @@ class GraphQLContext:
         self.user_id = user_id
         self.is_admin = is_admin
 
+class GraphQLMetricsMiddleware:
+    """Mede resolvers e mutations de nível superior (campos aninhados não são medidos)"""
+    
+    def resolve(self, next, root, info, **args):
+        if root is not None:
+            return next(root, info, **args)
+        
+        operation_type = info.operation.operation
+        g.graphql_fields = getattr(g, 'graphql_fields', []) + [info.field_name]
+        g.graphql_type = operation_type
+        
+        start = time.perf_counter()
+        try:
+            # O graphql-core devolve uma Promise: exceções do resolver chegam como rejeição
+            return next(root, info, **args).catch(self.record_shed)
+        finally:
+            metrics.observe('graphql_resolver_duration_seconds', time.perf_counter() - start,
+                            field=info.field_name, type=operation_type)
+    
+    @staticmethod
+    def record_shed(error):
+        # Sem vaga de inferência: a resposta inteira vira 429 (graphql_shed)
+        if isinstance(error, Shed):
+            g.shed = error
+        raise error
+
 # Configurar GraphQL endpoint
 app.add_url_rule(
     '/graphql',
@@ -66,10 +121,221 @@ app.add_url_rule(
         'graphql',
         schema=schema,
         graphiql=True,
-        get_context=lambda: GraphQLContext()
+        get_context=lambda: GraphQLContext(),
+        middleware=[GraphQLMetricsMiddleware()]
     )
 )
 
+@app.context_processor
+def asset_helpers():
+    return {'asset_url': assets.url}
+
+# Registrado primeiro para rodar por último: comprime a resposta já pronta
+@app.after_request
+def compress(response):
+    return compress_response(response, request.accept_encodings)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+def graphql_request_query():
+    """(query, operationName) de uma requisição ao /graphql, lidos como o GraphQLView os lê"""
+    if request.mimetype == 'application/graphql':
+        data = {'query': request.get_data(as_text=True)}
+    elif request.is_json:
+        data = request.get_json(silent=True)
+    else:
+        data = request.form
+    if not isinstance(data, dict):
+        data = {}
+    return (data.get('query') or request.args.get('query'),
+            data.get('operationName') or request.args.get('operationName'))
+
+@app.before_request
+def admission_control():
+    """Limite de taxa por usuário e de inferências simultâneas; recusa com 429 e Retry-After"""
+    if admission is None or request.url_rule is None:
+        return None
+    
+    route = request.url_rule.rule
+    query, operation_name = graphql_request_query() if route == '/graphql' else (None, None)
+    costs = classify_operations(route, query, operation_name)
+    if not costs:
+        return None
+    
+    # Sem login (ou só login/cadastro), o orçamento é do IP
+    user_id = None
+    if set(costs) != {'auth'}:
+        user_id = get_current_user(request.headers.get('Authorization'))[0]
+    key = f"user:{user_id}" if user_id else f"ip:{request.remote_addr}"
+    
+    try:
+        admission.check_rate(costs, key)
+    except Shed as e:
+        return shed_response(e, route)
+    return None
+
+def shed_response(e, route):
+    """429 com Retry-After no formato da rota (GraphQL ou JSON)"""
+    message = ('Limite de requisições excedido' if e.reason == 'rate_limit'
+               else 'Servidor ocupado, tente novamente')
+    body = {'errors': [{'message': message}]} if route == '/graphql' else {'error': message}
+    body['retry_after'] = e.retry_after
+    response = jsonify(body)
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+@app.errorhandler(Shed)
+def handle_shed(e):
+    return shed_response(e, request.url_rule.rule if request.url_rule else None)
+
+@app.teardown_request
+def release_db_connection(error):
+    # Transação da requisição encerrada e conexão devolvida às ociosas
+    if db:
+        db.release_connection()
+
+@app.after_request
+def record_request_metrics(response):
+    started = getattr(g, 'request_started', None)
+    if started is None:
+        return response
+    
+    elapsed = time.perf_counter() - started
+    # Rótulo pela regra da rota (não pela URL) para manter a cardinalidade baixa
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    
+    metrics.inc('http_requests_total', route=route, method=request.method, status=response.status_code)
+    metrics.observe('http_request_duration_seconds', elapsed, route=route, method=request.method)
+    
+    # Operações GraphQL identificadas pelos campos de nível superior
+    fields = getattr(g, 'graphql_fields', None)
+    if fields:
+        operation = '+'.join(sorted(set(fields)))
+        operation_type = g.graphql_type
+        metrics.inc('graphql_operations_total', operation=operation, type=operation_type)
+        metrics.observe('graphql_operation_duration_seconds', elapsed, operation=operation, type=operation_type)
+    
+    return response
+
+@app.after_request
+def conditional_graphql(response):
+    """GET do /graphql só com campos cacheáveis: ETag e 304 se os dados não mudaram"""
+    fields = getattr(g, 'graphql_fields', None)
+    if (request.method != 'GET' or not fields or response.status_code != 200
+            or not set(fields) <= CACHEABLE_GRAPHQL_FIELDS):
+        return response
+    
+    payload = response.get_json(silent=True)
+    if not payload or payload.get('errors'):
+        return response
+    return conditional(response, request)
+
+@app.after_request
+def graphql_shed(response):
+    # Resolver sem vaga de inferência (GraphQLMetricsMiddleware): 429 em vez de erro GraphQL com 200
+    shed = g.pop('shed', None)
+    return shed_response(shed, '/graphql') if shed else response
+
+# Perfil sob demanda: sem PROFILING_ENABLED os hooks nem são registrados
+if profiling.PROFILING_ENABLED:
+    @app.before_request
+    def start_profiling():
+        mode = profiling.requested_mode(request.headers.get(profiling.PROFILE_HEADER))
+        trigger = 'header'
+        
+        # Só admins podem pedir perfil pelo cabeçalho
+        if mode and not get_current_user(request.headers.get('Authorization'))[1]:
+            mode = None
+        if not mode and profiling.sampled():
+            mode, trigger = profiling.PROFILE_SAMPLE_MODE, 'sample_rate'
+        
+        if mode:
+            g.profile = profiling.ProfileSession(mode, trigger)
+            g.profile.start()
+    
+    @app.after_request
+    def save_profile(response):
+        session = g.pop('profile', None)
+        if session:
+            session.stop()
+            try:
+                route = request.url_rule.rule if request.url_rule else request.path
+                session.save(route=route, method=request.method, status=response.status_code,
+                             graphql=getattr(g, 'graphql_fields', None))
+                response.headers['X-Profile-Id'] = session.profile_id
+            except OSError as e:
+                logger.error("Erro ao gravar perfil: %s", e)
+        return response
+    
+    @app.teardown_request
+    def stop_profiling(error):
+        # Requisições que terminaram em exceção não passam pelo after_request
+        session = g.pop('profile', None)
+        if session:
+            session.stop()
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Métricas no formato do Prometheus (METRICS_TOKEN, se definido, é exigido como Bearer)"""
+    token = os.getenv('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'error': 'Acesso negado'}), 403
+    
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/queries', methods=['GET'])
+def query_report():
+    """Consultas SQL com maior tempo total e últimas consultas lentas com plano (apenas admin)"""
+    if not db:
+        return jsonify({'error': 'Sistema não inicializado'}), 500
+    
+    auth_header = request.headers.get('Authorization')
+    user_id, is_admin = get_current_user(auth_header)
+    
+    if not user_id or not is_admin:
+        return jsonify({'error': 'Acesso negado'}), 403
+    
+    try:
+        top = max(1, min(int(request.args.get('top', 20)), 200))
+    except ValueError:
+        return jsonify({'error': 'Parâmetro top inválido'}), 400
+    
+    return jsonify(db.query_report(top))
+
+@app.route('/admin/profiles', methods=['GET'])
+def list_profiles():
+    """Perfis de requisições gravados (apenas admin)"""
+    user_id, is_admin = get_current_user(request.headers.get('Authorization'))
+    if not user_id or not is_admin:
+        return jsonify({'error': 'Acesso negado'}), 403
+    
+    return jsonify({'enabled': profiling.PROFILING_ENABLED, 'profiles': profiling.list_profiles()})
+
+@app.route('/admin/profiles/<profile_id>/<kind>', methods=['GET'])
+def get_profile(profile_id, kind):
+    """Dump do cProfile (prof), pilhas colapsadas (folded) ou resumo do pstats (txt)"""
+    user_id, is_admin = get_current_user(request.headers.get('Authorization'))
+    if not user_id or not is_admin:
+        return jsonify({'error': 'Acesso negado'}), 403
+    
+    if kind == 'txt':
+        text = profiling.summary(profile_id)
+        if text is None:
+            return jsonify({'error': 'Perfil não encontrado'}), 404
+        return Response(text, mimetype='text/plain')
+    
+    path = profiling.profile_path(profile_id, kind)
+    if not path:
+        return jsonify({'error': 'Perfil não encontrado'}), 404
+    
+    if kind == 'prof':
+        return send_file(os.path.abspath(path), mimetype='application/octet-stream',
+                         as_attachment=True, download_name=f"{profile_id}.prof")
+    return send_file(os.path.abspath(path), mimetype='text/plain')
+
 @app.route('/retrain', methods=['POST'])
 def retrain_model():
     """Endpoint para retreinar o modelo com feedback"""
@@ -82,34 +348,72 @@ def retrain_model():
     if not user_id or not is_admin:
         return jsonify({'error': 'Acesso negado'}), 403
     
+    # full: todo o feedback; incremental: só o feedback posterior ao último treino
+    mode = request.args.get('mode', 'full')
+    if mode not in ('full', 'incremental'):
+        return jsonify({'error': 'Modo inválido (full ou incremental)'}), 400
+    
     try:
-        # Buscar dados de feedback
-        cursor = db.connection.cursor()
-        cursor.execute("""
-            SELECT e.subject, e.body, f.corrected_category_id
-            FROM feedback f
-            JOIN emails e ON f.email_id = e.id
-            WHERE f.corrected_category_id IS NOT NULL
-        """)
+        watermark = get_watermark(db) if mode == 'incremental' else None
+        if watermark is None:
+            mode = 'full'
         
-        feedback_data = []
-        for row in cursor.fetchall():
-            feedback_data.append({
-                'subject': row[0],
-                'body': row[1],
-                'correct_category_id': row[2]
-            })
+        # Varredura pesada: réplica, se houver; senão uma conexão só para o cursor sem buffer
+        connection = db.read_connection('analytics', user_id)
+        dedicated = connection is db.connection
+        if dedicated:
+            connection = db.open_connection()
+        try:
+            texts, labels, watermark = collect_training_data(db, connection, classifier.categories, watermark)
+        finally:
+            if dedicated:
+                connection.close()
         
         # Retreinar modelo
-        classifier.retrain_with_feedback(feedback_data)
+        with inference('admin'):
+            if mode == 'incremental':
+                trained = classifier.update_with_examples(texts, labels)
+            else:
+                trained = classifier.retrain_with_examples(texts, labels)
+        
+        # Candidato pior que o modelo em uso: o modelo atual continua e o feedback fica para o próximo treino
+        gate = classifier.last_gate
+        if gate and not gate['approved']:
+            return jsonify({
+                'error': 'Modelo retreinado recusado: ' + '; '.join(gate['regressions']),
+                'mode': mode,
+                'examples': len(texts),
+                'gate': gate,
+                'success': False
+            }), 409
+        
+        # Treino que falhou (detalhes no log) ou sem exemplos: a marca d'água não avança
+        if not trained:
+            return jsonify({
+                'error': ('Modelo não retreinado: treino falhou' if texts
+                          else 'Modelo não retreinado: nenhum exemplo de feedback'),
+                'mode': mode,
+                'examples': len(texts),
+                'success': False
+            }), 500 if texts else 422
+        
+        if watermark:
+            set_watermark(db, watermark)
         
         return jsonify({
-            'message': f'Modelo retreinado com {len(feedback_data)} exemplos de feedback',
+            'message': f'Modelo retreinado com {len(texts)} exemplos de feedback',
+            'mode': mode,
+            'examples': len(texts),
+            'watermark': watermark[0] if watermark else None,
+            'gate': gate,
             'success': True
         })
     
+    except Shed:
+        raise
     except Exception as e:
-        print(f"Erro no retreinamento: {e}")
+        logger.exception("Erro no retreinamento: %s", e)
+        metrics.inc('errors_total', component='retrain')
         return jsonify({'error': str(e)}), 500
 
 @app.route('/upload_emails', methods=['POST'])
@@ -127,9 +431,12 @@ def upload_emails():
     try:
         emails_data = request.json.get('emails', [])
         processed_emails = []
+        duplicates = 0
         
         cursor = db.connection.cursor()
         
+        # Chaves de idempotência de todo o lote, verificadas numa única consulta
+        items = []
         for email_data in emails_data:
             sender = email_data.get('sender', '')
             subject = email_data.get('subject', '')
@@ -138,37 +445,132 @@ def upload_emails():
             if not all([sender, subject, body]):
                 continue
             
-            # Classificar email
-            category_id, confidence = classifier.classify_email(subject, body)
-            suggested_response = classifier.generate_response(category_id, subject, body)
+            key = dedup_key(user_id, sender, subject, body, email_data.get('message_id'))
+            items.append((sender, subject, body, key))
+        
+        metrics.observe('batch_size', len(items), buckets=SIZE_BUCKETS, operation='upload_emails')
+        existing = find_existing(db, cursor, [item[3] for item in items])
+        
+        # Emails novos classificados de uma vez (em paralelo nos lotes grandes, com CLASSIFY_WORKERS)
+        new_items = [item for item in items if item[3] not in existing]
+        with inference('bulk'):
+            predictions = dict(zip(
+                [item[3] for item in new_items],
+                classify_pool.classify_batch(classifier, [(subject, body) for _, subject, body, _ in new_items])))
+        
+        for sender, subject, body, key in items:
+            if key in existing:
+                duplicates += 1
+                processed_emails.append({
+                    'id': existing[key],
+                    'sender': sender,
+                    'subject': subject,
+                    'duplicate': True
+                })
+                continue
+            
+            category_id, confidence = predictions[key]
+            response_template_id, suggested_response = suggested_response_for(
+                db, classifier, category_id, subject, body)
             
             # Salvar no banco
-            cursor.execute("""
-                INSERT INTO emails (sender, subject, body, category_id, confidence_score, 
-                                  suggested_response, user_id, is_processed)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """, (sender, subject, body, category_id, confidence, suggested_response, user_id, True))
+            email_id, created = insert_email(
+                db, cursor, user_id, sender, subject, body, category_id, confidence,
+                response_template_id, suggested_response, key)
+            existing[key] = email_id
+            
+            if not created:
+                duplicates += 1
             
             processed_emails.append({
-                'id': cursor.lastrowid,
+                'id': email_id,
                 'sender': sender,
                 'subject': subject,
                 'category_id': category_id,
-                'confidence': confidence
+                'confidence': confidence,
+                'duplicate': not created
             })
         
         db.connection.commit()
+        db.record_write(user_id)
+        
+        events.publish_emails(user_id, [
+            (item['id'], item['sender'], item['subject'], item['category_id'],
+             classifier.categories.get(item['category_id'], "Desconhecida"), item['confidence'])
+            for item in processed_emails if not item['duplicate']])
         
         return jsonify({
             'message': f'{len(processed_emails)} emails processados com sucesso',
             'emails': processed_emails,
+            'duplicates': duplicates,
             'success': True
         })
     
+    except Shed:
+        raise
     except Exception as e:
-        print(f"Erro no upload: {e}")
+        logger.exception("Erro no upload: %s", e)
+        metrics.inc('errors_total', component='upload_emails')
+        db.connection.rollback()
         return jsonify({'error': str(e)}), 500
 
+def email_aggregates(cursor, table, user_id, since, until):
+    """Contagem por categoria e soma/contagem de confiança de uma tabela de emails"""
+    conditions = []
+    params = []
+    if user_id:
+        conditions.append("user_id = %s")
+        params.append(user_id)
+    if since:
+        conditions.append("created_at >= %s")
+        params.append(since)
+    if until:
+        conditions.append("created_at < %s")
+        params.append(until)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    db.execute(cursor, f'stats.{table}_aggregates', f"""
+        SELECT COALESCE(category_id, 0), COUNT(*),
+               SUM(CASE WHEN confidence_score > 0 THEN confidence_score ELSE 0 END),
+               SUM(CASE WHEN confidence_score > 0 THEN 1 ELSE 0 END)
+        FROM {table}
+        {where}
+        GROUP BY COALESCE(category_id, 0)
+    """, tuple(params))
+    
+    by_category = {}
+    confidence_sum = 0.0
+    confidence_count = 0
+    for category_id, count, conf_sum, conf_count in cursor.fetchall():
+        by_category[category_id] = count
+        confidence_sum += float(conf_sum or 0)
+        confidence_count += int(conf_count or 0)
+    
+    return by_category, confidence_sum, confidence_count
+
+def archived_totals(cursor, user_id):
+    """Mesmo formato de email_aggregates, lido dos totais pré-agregados do arquivo"""
+    if user_id:
+        db.execute(cursor, 'stats.archive_totals_user', """
+            SELECT category_id, SUM(email_count), SUM(confidence_sum), SUM(confidence_count)
+            FROM email_archive_totals WHERE user_id = %s GROUP BY category_id
+        """, (user_id,))
+    else:
+        db.execute(cursor, 'stats.archive_totals', """
+            SELECT category_id, SUM(email_count), SUM(confidence_sum), SUM(confidence_count)
+            FROM email_archive_totals GROUP BY category_id
+        """)
+    
+    by_category = {}
+    confidence_sum = 0.0
+    confidence_count = 0
+    for category_id, count, conf_sum, conf_count in cursor.fetchall():
+        by_category[category_id] = int(count)
+        confidence_sum += float(conf_sum or 0)
+        confidence_count += int(conf_count or 0)
+    
+    return by_category, confidence_sum, confidence_count
+
 @app.route('/stats', methods=['GET'])
 def get_stats():
     """Endpoint para estatísticas do sistema"""
@@ -182,76 +584,104 @@ def get_stats():
         return jsonify({'error': 'Usuário não autenticado'}), 401
     
     try:
-        cursor = db.connection.cursor()
+        since = parse_date(request.args.get('since'))
+        until = parse_date(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'Intervalo de datas inválido'}), 400
+    
+    try:
+        # Painel: agregados lidos das réplicas, fora do primário
+        cursor = db.read_connection('analytics', user_id).cursor()
+        scope_user_id = None if is_admin else user_id
         
-        # Estatísticas gerais
-        if is_admin:
-            # Total de emails
-            cursor.execute("SELECT COUNT(*) FROM emails")
-            total_emails = cursor.fetchone()[0]
-            
-            # Emails por categoria
-            cursor.execute("""
-                SELECT c.name, COUNT(e.id) as count
-                FROM categories c
-                LEFT JOIN emails e ON c.id = e.category_id
-                GROUP BY c.id, c.name
-                ORDER BY count DESC
-            """)
-            emails_by_category = [{'category': row[0], 'count': row[1]} for row in cursor.fetchall()]
+        # Agregados das linhas ativas (uma única varredura)
+        by_category, confidence_sum, confidence_count = email_aggregates(
+            cursor, 'emails', scope_user_id, since, until)
+        
+        # O arquivo só entra quando o intervalo chega até ele
+        if reaches_archive(db, since):
+            if since is None and until is None:
+                archived = archived_totals(cursor, scope_user_id)
+            else:
+                archived = email_aggregates(cursor, 'emails_archive', scope_user_id, since, until)
             
+            for category_id, count in archived[0].items():
+                by_category[category_id] = by_category.get(category_id, 0) + count
+            confidence_sum += archived[1]
+            confidence_count += archived[2]
+        
+        total_emails = sum(by_category.values())
+        
+        # Emails por categoria
+        db.execute(cursor, 'categories.list', "SELECT id, name FROM categories")
+        emails_by_category = [{'category': name, 'count': by_category.get(category_id, 0)}
+                              for category_id, name in cursor.fetchall()]
+        emails_by_category.sort(key=lambda item: item['count'], reverse=True)
+        
+        if is_admin:
             # Total de usuários
-            cursor.execute("SELECT COUNT(*) FROM users")
+            db.execute(cursor, 'stats.count_users', "SELECT COUNT(*) FROM users")
             total_users = cursor.fetchone()[0]
             
             # Feedback recebido
-            cursor.execute("SELECT COUNT(*) FROM feedback")
+            db.execute(cursor, 'stats.count_feedback', "SELECT COUNT(*) FROM feedback")
             total_feedback = cursor.fetchone()[0]
         else:
-            # Estatísticas do usuário atual
-            cursor.execute("SELECT COUNT(*) FROM emails WHERE user_id = %s", (user_id,))
-            total_emails = cursor.fetchone()[0]
-            
-            cursor.execute("""
-                SELECT c.name, COUNT(e.id) as count
-                FROM categories c
-                LEFT JOIN emails e ON c.id = e.category_id AND e.user_id = %s
-                GROUP BY c.id, c.name
-                ORDER BY count DESC
-            """, (user_id,))
-            emails_by_category = [{'category': row[0], 'count': row[1]} for row in cursor.fetchall()]
-            
             total_users = 1  # Apenas o usuário atual
             
-            cursor.execute("SELECT COUNT(*) FROM feedback WHERE user_id = %s", (user_id,))
+            db.execute(cursor, 'stats.count_feedback_user', "SELECT COUNT(*) FROM feedback WHERE user_id = %s", (user_id,))
             total_feedback = cursor.fetchone()[0]
         
         # Confiança média das classificações
-        if is_admin:
-            cursor.execute("SELECT AVG(confidence_score) FROM emails WHERE confidence_score > 0")
-        else:
-            cursor.execute("SELECT AVG(confidence_score) FROM emails WHERE user_id = %s AND confidence_score > 0", (user_id,))
-        
-        avg_confidence = cursor.fetchone()[0] or 0.0
+        avg_confidence = confidence_sum / confidence_count if confidence_count else 0.0
         
-        return jsonify({
+        # Painel atualizado sem mudanças nos dados: 304 sem corpo
+        return conditional(jsonify({
             'total_emails': total_emails,
             'total_users': total_users,
             'total_feedback': total_feedback,
             'avg_confidence': round(float(avg_confidence), 3),
             'emails_by_category': emails_by_category,
             'success': True
-        })
+        }), request)
     
     except Exception as e:
-        print(f"Erro nas estatísticas: {e}")
+        logger.exception("Erro nas estatísticas: %s", e)
+        metrics.inc('errors_total', component='stats')
         return jsonify({'error': str(e)}), 500
 
+@app.route('/events', methods=['GET'])
+def event_stream():
+    """Emails classificados e variação das estatísticas em Server-Sent Events
+    
+    O EventSource do navegador não envia cabeçalhos: o token também é aceito em ?token=.
+    """
+    if not db:
+        return jsonify({'error': 'Sistema não inicializado'}), 500
+    
+    user_id, is_admin = get_current_user(request.args.get('token') or request.headers.get('Authorization'))
+    if not user_id:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    subscription = events.broker.subscribe(user_id, is_admin, request.headers.get('Last-Event-ID'))
+    if subscription is None:
+        metrics.inc('events_connections_total', result='rejected')
+        response = jsonify({'error': 'Limite de conexões atingido'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    
+    metrics.inc('events_connections_total', result='accepted')
+    # O stream pode durar horas: a conexão (e a transação da autenticação) não fica presa a ele
+    db.release_connection()
+    return Response(events.broker.stream(subscription), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/')
 def index():
     """Página inicial - servir HTML"""
     try:
-         return render_template('index.html')
+         return conditional(make_response(render_template('index.html')), request)
     except FileNotFoundError:
         return jsonify({
             'message': 'Email Classifier API está rodando',
@@ -259,6 +689,14 @@ def index():
             'status': 'ok'
         })
 
+@app.route('/assets/<path:filename>')
+def static_asset(filename):
+    """Arquivo estático pelo nome com hash, com cache imutável e versão comprimida"""
+    response = assets.response(filename, request.accept_encodings)
+    if response is None:
+        return jsonify({'error': 'Arquivo não encontrado'}), 404
+    return response.make_conditional(request)
+
 @app.errorhandler(500)
 def internal_error(error):
     return jsonify({'error': 'Erro interno do servidor'}), 500
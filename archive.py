@@ -0,0 +1,211 @@
+"""Retenção: move emails antigos de emails para emails_archive em lotes pequenos.
+
+Uso:
+    python archive.py --days 180 [--batch-size 500] [--sleep 0.1]
+
+Na aplicação o arquivador roda em segundo plano quando ARCHIVE_AFTER_DAYS > 0;
+um lock nomeado do MySQL garante um único arquivador entre os workers.
+Emails com feedback não são arquivados (são dados de treinamento).
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from database import Database
+from logs import get_logger
+from metrics import metrics
+
+logger = get_logger('archive')
+
+# Idade mínima (dias) para arquivar; 0 desativa o arquivador em segundo plano
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 0))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 500))
+ARCHIVE_INTERVAL = int(os.getenv('ARCHIVE_INTERVAL', 3600))
+ARCHIVE_PAUSE = 0.1
+HORIZON_CACHE_TTL = 60
+ARCHIVE_LOCK_NAME = 'email_archiver'
+
+EMAIL_ARCHIVE_COLUMNS = """id, sender, subject, category_id, confidence_score, user_id,
+                           is_processed, response_template_id, dedup_key, created_at"""
+
+_horizon_cache = {'value': None, 'loaded_at': 0}
+
+
+def archive_horizon(db):
+    """Data de criação do email mais novo já arquivado (None se o arquivo está vazio)"""
+    if time.time() - _horizon_cache['loaded_at'] > HORIZON_CACHE_TTL:
+        metrics.inc('cache_requests_total', cache='archive_horizon', result='miss')
+        cursor = db.connection.cursor()
+        db.execute(cursor, 'system_state.archive_horizon', "SELECT value FROM system_state WHERE name = 'archive_horizon'")
+        row = cursor.fetchone()
+        _horizon_cache['value'] = datetime.fromisoformat(row[0]) if row and row[0] else None
+        _horizon_cache['loaded_at'] = time.time()
+    else:
+        metrics.inc('cache_requests_total', cache='archive_horizon', result='hit')
+    return _horizon_cache['value']
+
+
+def reaches_archive(db, since):
+    """True se um intervalo começando em `since` (None = sem limite) inclui linhas arquivadas"""
+    horizon = archive_horizon(db)
+    if horizon is None:
+        return False
+    return since is None or since <= horizon
+
+
+def parse_date(value):
+    """Aceita 'AAAA-MM-DD' ou data/hora ISO; None se vazio (ValueError se inválido)"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value)
+
+
+def archive_batch(db, connection, cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Arquiva até batch_size emails criados antes de cutoff numa transação curta"""
+    cursor = connection.cursor()
+
+    try:
+        db.execute(cursor, 'archive.select_batch', """
+            SELECT e.id FROM emails e
+            WHERE e.created_at < %s
+              AND NOT EXISTS (SELECT 1 FROM feedback f WHERE f.email_id = e.id)
+            ORDER BY e.created_at, e.id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (cutoff, batch_size))
+        ids = [row[0] for row in cursor.fetchall()]
+
+        if not ids:
+            connection.rollback()
+            return 0
+
+        placeholders = ', '.join(['%s'] * len(ids))
+        params = tuple(ids)
+
+        db.execute(cursor, 'archive.copy_emails', f"""
+            INSERT IGNORE INTO emails_archive ({EMAIL_ARCHIVE_COLUMNS})
+            SELECT {EMAIL_ARCHIVE_COLUMNS} FROM emails WHERE id IN ({placeholders})
+        """, params)
+        db.execute(cursor, 'archive.copy_contents', f"""
+            INSERT IGNORE INTO email_contents_archive (email_id, body, body_compressed, suggested_response)
+            SELECT email_id, body, body_compressed, suggested_response
+            FROM email_contents WHERE email_id IN ({placeholders})
+        """, params)
+        db.execute(cursor, 'archive.add_totals', f"""
+            INSERT INTO email_archive_totals (user_id, category_id, email_count, confidence_sum, confidence_count)
+            SELECT user_id, COALESCE(category_id, 0), COUNT(*),
+                   SUM(CASE WHEN confidence_score > 0 THEN confidence_score ELSE 0 END),
+                   SUM(CASE WHEN confidence_score > 0 THEN 1 ELSE 0 END)
+            FROM emails WHERE id IN ({placeholders})
+            GROUP BY user_id, COALESCE(category_id, 0)
+            ON DUPLICATE KEY UPDATE
+                email_count = email_count + VALUES(email_count),
+                confidence_sum = confidence_sum + VALUES(confidence_sum),
+                confidence_count = confidence_count + VALUES(confidence_count)
+        """, params)
+        # ORDER BY em vez de MAX(): o SQLite só converte a coluna em datetime quando ela é lida diretamente
+        db.execute(cursor, 'archive.newest', f"""
+            SELECT created_at FROM emails WHERE id IN ({placeholders}) ORDER BY created_at DESC LIMIT 1
+        """, params)
+        newest = cursor.fetchone()[0]
+
+        # email_contents sai junto por ON DELETE CASCADE
+        db.execute(cursor, 'archive.delete_emails', f"DELETE FROM emails WHERE id IN ({placeholders})", params)
+
+        db.execute(cursor, 'system_state.set_archive_horizon', """
+            INSERT INTO system_state (name, value) VALUES ('archive_horizon', %s)
+            ON DUPLICATE KEY UPDATE value = GREATEST(COALESCE(value, ''), VALUES(value))
+        """, (newest.isoformat(sep=' '),))
+
+        connection.commit()
+        return len(ids)
+
+    except Exception:
+        connection.rollback()
+        raise
+
+
+def run_archiver(db, connection, days, batch_size=ARCHIVE_BATCH_SIZE, pause=ARCHIVE_PAUSE):
+    """Arquiva tudo que tem mais de `days` dias, lote a lote"""
+    cutoff = datetime.now() - timedelta(days=days)
+    total = 0
+
+    while True:
+        archived = archive_batch(db, connection, cutoff, batch_size)
+        total += archived
+        if archived < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    if total:
+        logger.info("Arquivador: %d emails anteriores a %s arquivados", total, f"{cutoff:%Y-%m-%d}")
+    return total
+
+
+class Archiver(threading.Thread):
+    """Executa o arquivamento periodicamente com conexão própria"""
+
+    def __init__(self, db, days=ARCHIVE_AFTER_DAYS, interval=ARCHIVE_INTERVAL):
+        super().__init__(name='email-archiver', daemon=True)
+        self.db = db
+        self.days = days
+        self.interval = interval
+
+    def run(self):
+        while True:
+            connection = None
+            try:
+                connection = self.db.open_connection()
+                cursor = connection.cursor()
+
+                # Apenas um worker arquiva por vez
+                if self.db.backend.try_lock(self.db, cursor, ARCHIVE_LOCK_NAME):
+                    try:
+                        run_archiver(self.db, connection, self.days)
+                    finally:
+                        self.db.backend.release_lock(self.db, cursor, ARCHIVE_LOCK_NAME)
+            except Exception as e:
+                logger.exception("Erro no arquivador: %s", e)
+                metrics.inc('errors_total', component='archiver')
+            finally:
+                if connection and connection.is_connected():
+                    connection.close()
+
+            time.sleep(self.interval)
+
+
+def start_archiver(db):
+    """Inicia o arquivador em segundo plano se ARCHIVE_AFTER_DAYS estiver configurado"""
+    if ARCHIVE_AFTER_DAYS <= 0 or not db or db.legacy_content:
+        return None
+
+    archiver = Archiver(db)
+    archiver.start()
+    return archiver
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arquiva emails antigos")
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS or 180)
+    parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+    parser.add_argument('--sleep', type=float, default=ARCHIVE_PAUSE, help="pausa entre lotes (segundos)")
+    args = parser.parse_args()
+
+    db = Database()
+    if not db.connection or not db.connection.is_connected():
+        raise SystemExit(1)
+
+    if db.legacy_content:
+        print("Execute migrate_content.py antes de arquivar")
+        raise SystemExit(1)
+
+    total = run_archiver(db, db.connection, args.days, args.batch_size, args.sleep)
+    print(f"Arquivamento concluído: {total} emails")
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
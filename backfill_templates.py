@@ -0,0 +1,105 @@
+"""Troca respostas sugeridas gravadas por texto pela referência ao modelo da categoria.
+
+Uso:
+    python backfill_templates.py [--batch-size 1000] [--sleep 0.05]
+
+Só são convertidas as linhas cujo texto é exatamente o modelo (qualquer versão)
+renderizado com o assunto do email; respostas personalizadas continuam gravadas.
+Cada lote é uma transação curta e a execução pode ser repetida com segurança.
+"""
+import argparse
+import time
+
+from database import Database
+from content_store import load_contents
+from response_templates import render_response
+
+
+def load_template_versions(db):
+    """{category_id: (template_id, [corpo de cada versão])}"""
+    cursor = db.connection.cursor()
+    db.execute(cursor, 'backfill.template_versions', """
+        SELECT t.id, t.category_id, v.body
+        FROM response_templates t
+        JOIN response_template_versions v ON v.template_id = t.id
+        ORDER BY t.id, v.version
+    """)
+
+    versions = {}
+    for template_id, category_id, body in cursor.fetchall():
+        versions.setdefault(category_id, (template_id, []))[1].append(body)
+    return versions
+
+
+def backfill(db, batch_size, pause):
+    versions = load_template_versions(db)
+    cursor = db.connection.cursor()
+
+    db.execute(cursor, 'backfill.id_range', "SELECT MIN(id), MAX(id) FROM emails WHERE response_template_id IS NULL")
+    min_id, max_id = cursor.fetchone()
+    if min_id is None:
+        print("Nenhum email sem modelo de resposta")
+        return 0
+
+    linked = 0
+    start_id = min_id
+
+    while start_id <= max_id:
+        end_id = start_id + batch_size - 1
+
+        db.execute(cursor, 'backfill.select_batch', """
+            SELECT id, subject, category_id FROM emails
+            WHERE id BETWEEN %s AND %s AND response_template_id IS NULL
+        """, (start_id, end_id))
+        rows = cursor.fetchall()
+        contents = load_contents(db, cursor, [row[0] for row in rows])
+
+        matches = {}  # template_id -> [email_id]
+        for email_id, subject, category_id in rows:
+            template = versions.get(category_id)
+            suggested_response = contents.get(email_id, (None, None))[1]
+            if not template or suggested_response is None:
+                continue
+
+            template_id, bodies = template
+            if any(render_response(body, subject) == suggested_response for body in bodies):
+                matches.setdefault(template_id, []).append(email_id)
+
+        for template_id, email_ids in matches.items():
+            placeholders = ', '.join(['%s'] * len(email_ids))
+            db.execute(cursor, 'backfill.link_template', f"""
+                UPDATE emails SET response_template_id = %s WHERE id IN ({placeholders})
+            """, (template_id, *email_ids))
+            db.execute(cursor, 'backfill.clear_response', f"""
+                UPDATE email_contents SET suggested_response = NULL WHERE email_id IN ({placeholders})
+            """, tuple(email_ids))
+            linked += len(email_ids)
+
+        db.connection.commit()
+        print(f"Lote {start_id}-{end_id}: {sum(len(ids) for ids in matches.values())} de {len(rows)} convertidos")
+
+        start_id = end_id + 1
+        if pause:
+            time.sleep(pause)
+
+    return linked
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Associa emails existentes aos modelos de resposta")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--sleep', type=float, default=0.05, help="pausa entre lotes (segundos)")
+    args = parser.parse_args()
+
+    db = Database()
+    if not db.connection or not db.connection.is_connected():
+        raise SystemExit(1)
+
+    linked = backfill(db, args.batch_size, args.sleep)
+    print(f"Backfill concluído: {linked} emails associados a modelos")
+
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
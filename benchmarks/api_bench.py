@@ -0,0 +1,388 @@
+"""Benchmark ponta a ponta da API (GraphQL, /upload_emails, /stats, /retrain) e da camada de dados.
+
+Popula o banco configurado pelas variáveis DB_* com volumes configuráveis e
+dispara as operações pelo Flask test client, com várias threads, sem rede.
+O resultado (vazão e p50/p95/p99 por operação) é gravado em JSON para
+comparação entre commits com benchmarks/compare.py.
+
+Uso:
+    DB_NAME=email_classifier_bench python benchmarks/api_bench.py \\
+        --users 20 --emails 1000000 --feedback 5000 --threads 8 --duration 20 \\
+        --output bench_output.json
+
+    # Sem servidor de banco: SQLite embutido num arquivo temporário
+    python benchmarks/api_bench.py --backend sqlite --emails 100000
+
+O modelo retreinado por /retrain é gravado num diretório temporário, nunca
+no modelo do projeto.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import bcrypt
+import jwt
+
+from synthetic_emails import generate_email
+
+BENCH_PASSWORD = 'bench123'
+SEED_BATCH_SIZE = 1000
+
+
+# Estatística
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(count / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / count * 1000, 3) if count else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if count else 0.0,
+    }
+
+
+# Carga de dados
+
+def seed_users(db, count):
+    """Cria (ou reaproveita) bench_user_N; retorna os IDs"""
+    cursor = db.connection.cursor()
+    password_hash = bcrypt.hashpw(BENCH_PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=4)).decode('utf-8')
+
+    cursor.execute("SELECT id FROM users WHERE SUBSTR(username, 1, 11) = 'bench_user_'")
+    user_ids = [row[0] for row in cursor.fetchall()]
+
+    for i in range(len(user_ids), count):
+        cursor.execute(
+            "INSERT INTO users (username, email, password_hash) VALUES (%s, %s, %s)",
+            (f"bench_user_{i}", f"bench_user_{i}@bench.local", password_hash)
+        )
+        user_ids.append(cursor.lastrowid)
+
+    db.connection.commit()
+    return user_ids[:count]
+
+
+def seed_emails(db, user_ids, count, rng):
+    """Insere emails em lotes multi-linha, com IDs explícitos para gravar o conteúdo em seguida"""
+    cursor = db.connection.cursor()
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM emails")
+    next_id = cursor.fetchone()[0] + 1
+    now = datetime.now()
+
+    inserted = 0
+    started = time.time()
+    while inserted < count:
+        size = min(SEED_BATCH_SIZE, count - inserted)
+        emails = []
+        contents = []
+        for offset in range(size):
+            sender, subject, body, category_id = generate_email(rng)
+            email_id = next_id + offset
+            created_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+            emails.append((email_id, sender, subject, category_id, round(rng.uniform(0.4, 1.0), 3),
+                           rng.choice(user_ids), True, created_at))
+            contents.append((email_id, body, None, None))
+
+        cursor.executemany("""
+            INSERT INTO emails (id, sender, subject, category_id, confidence_score, user_id,
+                                is_processed, created_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, emails)
+        cursor.executemany("""
+            INSERT INTO email_contents (email_id, body, body_compressed, suggested_response)
+            VALUES (%s, %s, %s, %s)
+        """, contents)
+        db.connection.commit()
+
+        next_id += size
+        inserted += size
+        if inserted % (SEED_BATCH_SIZE * 50) == 0 or inserted == count:
+            print(f"  {inserted}/{count} emails ({inserted / (time.time() - started):.0f}/s)")
+
+    return next_id - 1
+
+
+def seed_feedback(db, user_ids, count, rng):
+    cursor = db.connection.cursor()
+    cursor.execute("SELECT id, user_id, category_id FROM emails ORDER BY id DESC LIMIT %s", (count,))
+    rows = cursor.fetchall()
+
+    values = [(email_id, user_id, category_id, rng.randint(1, 6), 'bench')
+              for email_id, user_id, category_id in rows]
+    for start in range(0, len(values), SEED_BATCH_SIZE):
+        cursor.executemany("""
+            INSERT INTO feedback (email_id, user_id, original_category_id, corrected_category_id, feedback_text)
+            VALUES (%s, %s, %s, %s, %s)
+        """, values[start:start + SEED_BATCH_SIZE])
+        db.connection.commit()
+
+
+def sample_email_ids(db, sample_size):
+    cursor = db.connection.cursor()
+    cursor.execute("SELECT id FROM emails ORDER BY id DESC LIMIT %s", (sample_size,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+# Operações
+
+def make_token(app, user_id):
+    payload = {'user_id': user_id, 'exp': datetime.utcnow() + timedelta(days=1)}
+    return 'Bearer ' + jwt.encode(payload, app.config['SECRET_KEY'], algorithm='HS256')
+
+
+def graphql(client, token, query, variables=None):
+    response = client.post('/graphql', json={'query': query, 'variables': variables or {}},
+                           headers={'Authorization': token})
+    data = response.get_json(silent=True) or {}
+    return response.status_code == 200 and not data.get('errors')
+
+
+def build_operations(ctx):
+    """{nome: função(client, rng) -> sucesso}"""
+
+    def user_token(rng):
+        return rng.choice(ctx['user_tokens'])
+
+    def emails_query(client, rng):
+        return graphql(client, user_token(rng), "{ emails { id subject categoryName confidenceScore } }")
+
+    def email_query(client, rng):
+        return graphql(client, ctx['admin_token'],
+                       "query($id: Int!) { email(id: $id) { id subject body suggestedResponse } }",
+                       {'id': rng.choice(ctx['email_ids'])})
+
+    def classify_email(client, rng):
+        sender, subject, body, _ = generate_email(rng)
+        # Sufixo aleatório: cada chamada é um email novo (não cai na deduplicação)
+        return graphql(client, user_token(rng), """
+            mutation($sender: String!, $subject: String!, $body: String!) {
+              classifyEmail(sender: $sender, subject: $subject, body: $body) {
+                email { id categoryName } message
+              }
+            }
+        """, {'sender': sender, 'subject': subject, 'body': f"{body} #{rng.getrandbits(64):x}"})
+
+    def add_feedback(client, rng):
+        return graphql(client, ctx['admin_token'], """
+            mutation($emailId: Int!, $categoryId: Int!) {
+              addFeedback(emailId: $emailId, correctedCategoryId: $categoryId, feedbackText: "bench") {
+                feedback { id } message
+              }
+            }
+        """, {'emailId': rng.choice(ctx['email_ids']), 'categoryId': rng.randint(1, 6)})
+
+    def upload_emails(client, rng):
+        emails = []
+        for _ in range(ctx['upload_size']):
+            sender, subject, body, _ = generate_email(rng)
+            emails.append({'sender': sender, 'subject': subject, 'body': f"{body} #{rng.getrandbits(64):x}"})
+        response = client.post('/upload_emails', json={'emails': emails},
+                               headers={'Authorization': user_token(rng)})
+        return response.status_code == 200
+
+    def stats_user(client, rng):
+        return client.get('/stats', headers={'Authorization': user_token(rng)}).status_code == 200
+
+    def stats_admin(client, rng):
+        return client.get('/stats', headers={'Authorization': ctx['admin_token']}).status_code == 200
+
+    def retrain(client, rng):
+        # 409: o candidato foi treinado e avaliado, mas recusado pelo portão de regressão
+        return client.post('/retrain', headers={'Authorization': ctx['admin_token']}).status_code in (200, 409)
+
+    return {
+        'graphql.emails': emails_query,
+        'graphql.email': email_query,
+        'graphql.classifyEmail': classify_email,
+        'graphql.addFeedback': add_feedback,
+        'upload_emails': upload_emails,
+        'stats.user': stats_user,
+        'stats.admin': stats_admin,
+        'retrain': retrain,
+    }
+
+
+# Gerador de carga
+
+def run_load(app, operation, threads, duration, max_requests, warmup, seed):
+    """Executa `operation` em várias threads até esgotar tempo ou número de requisições"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    remaining = [max_requests]
+
+    def take():
+        if max_requests is None:
+            return True
+        with lock:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def worker(index):
+        client = app.test_client()
+        rng = random.Random(seed + index)
+
+        for _ in range(warmup):
+            operation(client, rng)
+
+        local_latencies = []
+        local_errors = 0
+        barrier.wait()
+        deadline = time.perf_counter() + duration
+
+        while time.perf_counter() < deadline and take():
+            start = time.perf_counter()
+            try:
+                ok = operation(client, rng)
+            except Exception:
+                ok = False
+            local_latencies.append(time.perf_counter() - start)
+            if not ok:
+                local_errors += 1
+
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    barrier = threading.Barrier(threads + 1)
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in workers:
+        thread.join()
+
+    return summarize(latencies, errors[0], time.perf_counter() - started)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta da API")
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--emails', type=int, default=100000)
+    parser.add_argument('--feedback', type=int, default=1000)
+    parser.add_argument('--skip-seed', action='store_true', help="reaproveita os dados já carregados")
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0, help="segundos por operação")
+    parser.add_argument('--warmup', type=int, default=3, help="requisições de aquecimento por thread")
+    parser.add_argument('--upload-size', type=int, default=50, help="emails por chamada de /upload_emails")
+    parser.add_argument('--retrain-requests', type=int, default=3)
+    parser.add_argument('--operations', help="lista separada por vírgulas (padrão: todas)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--allow-any-db', action='store_true',
+                        help="permite usar um banco cujo nome não contém 'bench'")
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'], default=os.getenv('DB_BACKEND', 'mysql'),
+                        help="sqlite: banco embutido, sem custo de rede (padrão: arquivo temporário)")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+
+    # Modelos gravados por /retrain (e o banco SQLite temporário) ficam fora do projeto
+    workdir = tempfile.mkdtemp(prefix='email-bench-')
+
+    os.environ['DB_BACKEND'] = args.backend
+    if args.backend == 'sqlite':
+        db_name = os.path.abspath(os.getenv('DB_PATH') or os.path.join(workdir, 'email_classifier_bench.db'))
+        os.environ['DB_PATH'] = db_name
+    else:
+        db_name = os.getenv('DB_NAME', '')
+    if 'bench' not in os.path.basename(db_name) and not args.allow_any_db:
+        raise SystemExit("Use um banco de benchmark (DB_NAME ou DB_PATH contendo 'bench') ou --allow-any-db")
+
+    os.chdir(workdir)
+
+    # Mede a capacidade do servidor: sem limite de taxa por usuário, mas com o limite de
+    # inferências simultâneas de produção (429 por falta de vaga aparecem como erros)
+    for operation_class in ('AUTH', 'CLASSIFY', 'BULK', 'ADMIN'):
+        os.environ.setdefault(f'RATE_LIMIT_{operation_class}', '0')
+    import app as app_module
+    app, db = app_module.app, app_module.db
+    if not db or not db.connection or not app_module.classifier:
+        raise SystemExit("Aplicação não inicializada (verifique o banco)")
+
+    rng = random.Random(args.seed)
+    if not args.skip_seed:
+        print(f"Populando {db_name}: {args.users} usuários, {args.emails} emails, {args.feedback} feedbacks")
+        seed_started = time.time()
+        user_ids = seed_users(db, args.users)
+        seed_emails(db, user_ids, args.emails, rng)
+        seed_feedback(db, user_ids, args.feedback, rng)
+        print(f"Carga concluída em {time.time() - seed_started:.1f}s")
+    else:
+        user_ids = seed_users(db, args.users)
+
+    cursor = db.connection.cursor()
+    cursor.execute("SELECT id FROM users WHERE username = 'admin'")
+    admin_id = cursor.fetchone()[0]
+
+    ctx = {
+        'user_tokens': [make_token(app, user_id) for user_id in user_ids],
+        'admin_token': make_token(app, admin_id),
+        'email_ids': sample_email_ids(db, 10000),
+        'upload_size': args.upload_size,
+    }
+    operations = build_operations(ctx)
+    selected = args.operations.split(',') if args.operations else list(operations)
+
+    results = {}
+    for name in selected:
+        if name == 'retrain':
+            # Operação pesada e exclusiva: sequencial e com poucas repetições
+            results[name] = run_load(app, operations[name], 1, float('inf'), args.retrain_requests, 0, args.seed)
+        else:
+            results[name] = run_load(app, operations[name], args.threads, args.duration, None,
+                                     args.warmup, args.seed)
+        summary = results[name]
+        print(f"{name:24s} {summary['throughput_rps']:9.1f} req/s  p50 {summary['p50_ms']:8.2f} ms  "
+              f"p95 {summary['p95_ms']:8.2f} ms  p99 {summary['p99_ms']:8.2f} ms  erros {summary['errors']}")
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': vars(args),
+        'results': results,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados gravados em {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Acurácia e desempenho de uma configuração do classificador, com verificação de regressão.
+
+Treina o pipeline do EmailClassifier (build_pipeline, com os parâmetros de
+--params) em emails sintéticos, ou carrega um modelo salvo com --model, e o
+avalia com model_eval.evaluate num corpus separado: o JSONL de --corpus (ou
+EVAL_CORPUS_PATH) ou emails sintéticos gerados com outra semente. Grava
+acurácia, F1 macro, latência p50/p99 de um email, vazão em lote, tamanho do
+modelo e tempo de carga.
+
+Com --baseline (um relatório anterior deste script), aplica os limites
+MODEL_GATE_* a todas as medidas (o portão do /retrain usa acurácia, F1, p50 e tamanho)
+e termina com código 1 se algo piorou.
+
+Uso:
+    python benchmarks/classifier_bench.py --output classifier_antes.json
+    python benchmarks/classifier_bench.py --params '{"tfidf__max_features": 5000}' --baseline classifier_antes.json
+    python benchmarks/classifier_bench.py --model email_classifier_model.pkl --corpus rotulados.jsonl
+"""
+import argparse
+import json
+import os
+import pickle
+import platform
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.api_bench import git_revision
+from synthetic_emails import generate_emails
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Acurácia e desempenho do classificador")
+    parser.add_argument('--params', default='{}', help="parâmetros do pipeline em JSON (formato de set_params)")
+    parser.add_argument('--model', help="avalia um modelo salvo em vez de treinar")
+    parser.add_argument('--train', type=int, default=3000, help="emails sintéticos de treino")
+    parser.add_argument('--corpus', default=os.getenv('EVAL_CORPUS_PATH'), help="corpus de avaliação (JSONL)")
+    parser.add_argument('--eval-size', type=int, default=1000, help="emails sintéticos de avaliação (sem --corpus)")
+    parser.add_argument('--baseline', help="relatório anterior para verificar regressões")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='classifier_output.json')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+
+    from ai_classifier import build_pipeline, model_text, preprocess_text
+    from model_eval import EVAL_SEED, GATE_THRESHOLDS, evaluate, load_corpus, regressions
+
+    params = json.loads(args.params)
+    training_seconds = None
+    if args.model:
+        with open(args.model, 'rb') as f:
+            model = pickle.load(f)
+    else:
+        train = generate_emails(args.train, seed=args.seed)
+        model = build_pipeline(**params)
+        started = time.perf_counter()
+        model.fit([preprocess_text(model_text(subject, body)) for _, subject, body, _ in train],
+                  [category_id for _, _, _, category_id in train])
+        training_seconds = round(time.perf_counter() - started, 3)
+
+    corpus = load_corpus(args.corpus, args.eval_size, EVAL_SEED)
+    result = evaluate(model, corpus)
+    print(f"acurácia {result['accuracy']:.4f}  F1 macro {result['macro_f1']:.4f}  "
+          f"p50 {result['p50_ms']:.3f} ms  p99 {result['p99_ms']:.3f} ms  "
+          f"lote {result['batch_emails_per_second']:.0f} emails/s  "
+          f"modelo {result['model_bytes'] / 1024:.0f} KiB  carga {result['load_ms']:.1f} ms")
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': vars(args),
+        'corpus': args.corpus or 'synthetic',
+        'training_seconds': training_seconds,
+        'results': result,
+    }
+
+    problems = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        problems = regressions(baseline, result)
+        report['thresholds'] = GATE_THRESHOLDS
+        report['regressions'] = problems
+        for problem in problems:
+            print(f"REGRESSÃO: {problem}")
+        if not problems:
+            print("Sem regressões em relação ao baseline")
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados gravados em {output}")
+
+    if problems:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Escalabilidade da classificação em paralelo (classify_pool) de 1 a N processos.
+
+Treina o pipeline do EmailClassifier num corpus sintético e classifica o mesmo
+lote com o ClassifierPool para cada número de processos. 1 processo é o
+classify_batch no próprio processo (a referência). Para cada configuração o
+resultado mostra emails/s, aceleração e eficiência em relação à referência,
+o tempo de criação do pool (cópia do modelo para os filhos) e se as
+predições são idênticas às da referência.
+
+Uso:
+    python benchmarks/classify_pool_bench.py --workers 1,2,4,8,16 --emails 20000 --output classify_pool_output.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.api_bench import git_revision
+from synthetic_emails import generate_emails
+
+
+def default_workers():
+    """1, 2, 4, ... até o número de núcleos"""
+    cores = os.cpu_count() or 1
+    counts = []
+    count = 1
+    while count < cores:
+        counts.append(count)
+        count *= 2
+    counts.append(cores)
+    return ','.join(str(count) for count in counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Escalabilidade da classificação em paralelo")
+    parser.add_argument('--workers', default=default_workers(), help="processos, separados por vírgula")
+    parser.add_argument('--emails', type=int, default=20000, help="emails no lote classificado")
+    parser.add_argument('--train', type=int, default=3000, help="emails de treino")
+    parser.add_argument('--chunk-size', type=int, default=500, help="CLASSIFY_CHUNK_SIZE")
+    parser.add_argument('--body-words', type=int, nargs=2, default=(20, 200), metavar=('MIN', 'MAX'))
+    parser.add_argument('--repeat', type=int, default=3, help="rodadas por configuração (vale a melhor)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='classify_pool_output.json')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+
+    from ai_classifier import EmailClassifier, model_text, preprocess_text
+    from classify_pool import ClassifierPool
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.naive_bayes import MultinomialNB
+    from sklearn.pipeline import Pipeline
+
+    # Mesmo pipeline do modelo inicial
+    train = generate_emails(args.train, seed=args.seed)
+    model = Pipeline([
+        ('tfidf', TfidfVectorizer(max_features=2000, ngram_range=(1, 3), min_df=1, max_df=0.95,
+                                  sublinear_tf=True, use_idf=True, smooth_idf=True)),
+        ('classifier', MultinomialNB(alpha=0.01, fit_prior=True)),
+    ])
+    model.fit([preprocess_text(model_text(subject, body)) for _, subject, body, _ in train],
+              [category_id for _, _, _, category_id in train])
+    classifier = EmailClassifier(model=model)
+
+    emails = [(subject, body) for _, subject, body, _ in
+              generate_emails(args.emails, seed=args.seed + 1, body_words=tuple(args.body_words))]
+
+    results = {}
+    baseline = None
+    reference = None
+    for workers in [int(value) for value in args.workers.split(',') if value.strip()]:
+        pool = ClassifierPool(classifier, workers, args.chunk_size, min_batch=0)
+
+        # Primeiro lote pequeno cria os processos e copia o modelo
+        started = time.perf_counter()
+        pool.classify_batch(emails[:workers])
+        startup = time.perf_counter() - started
+
+        elapsed = None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            predictions = pool.classify_batch(emails)
+            elapsed = min(elapsed or float('inf'), time.perf_counter() - started)
+        pool.shutdown()
+
+        if reference is None:
+            reference = predictions
+        rate = len(emails) / elapsed
+        baseline = baseline or rate
+        results[str(workers)] = {
+            'seconds': round(elapsed, 3),
+            'emails_per_second': round(rate, 1),
+            'speedup': round(rate / baseline, 2),
+            'efficiency': round(rate / baseline / workers, 2),
+            'pool_startup_seconds': round(startup, 3),
+            'matches_serial': predictions == reference,
+        }
+        result = results[str(workers)]
+        print(f"{workers:3d} processos {result['emails_per_second']:10.1f} emails/s  "
+              f"aceleração {result['speedup']:5.2f}x  eficiência {result['efficiency']:4.2f}  "
+              f"criação do pool {result['pool_startup_seconds']:.2f} s  "
+              f"{'iguais' if result['matches_serial'] else 'DIFERENTES'}")
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': vars(args),
+        'results': results,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados gravados em {output}")
+
+
+if __name__ == '__main__':
+    main()
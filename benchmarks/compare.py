@@ -0,0 +1,65 @@
+"""Compara dois resultados de benchmark (JSON) e aponta regressões.
+
+Uso:
+    python benchmarks/compare.py antes.json depois.json [--threshold 0.10]
+
+Sai com código 1 se alguma operação piorar mais que o limite em vazão ou p95/p99.
+"""
+import argparse
+import json
+
+# (métrica, maior é melhor)
+METRICS = [
+    ('throughput_rps', True),
+    ('p50_ms', False),
+    ('p95_ms', False),
+    ('p99_ms', False),
+]
+
+
+def compare(baseline, candidate, threshold):
+    regressions = []
+    for name, base in baseline['results'].items():
+        current = candidate['results'].get(name)
+        if not current:
+            continue
+
+        cells = []
+        for metric, higher_is_better in METRICS:
+            before, after = base.get(metric, 0), current.get(metric, 0)
+            change = (after - before) / before if before else 0.0
+            worse = -change if higher_is_better else change
+            flag = ''
+            if worse > threshold and metric != 'p50_ms':
+                flag = ' !'
+                regressions.append((name, metric, before, after))
+            cells.append(f"{metric} {before:.2f} -> {after:.2f} ({change:+.1%}){flag}")
+
+        print(f"{name:24s} " + '  '.join(cells))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara resultados de benchmark")
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=0.10, help="piora relativa tolerada")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding='utf-8') as f:
+        candidate = json.load(f)
+
+    print(f"Base: {baseline.get('git_revision')}  Candidato: {candidate.get('git_revision')}")
+    regressions = compare(baseline, candidate, args.threshold)
+
+    if regressions:
+        print(f"\n{len(regressions)} regressões acima de {args.threshold:.0%}")
+        raise SystemExit(1)
+    print("\nSem regressões")
+
+
+if __name__ == '__main__':
+    main()
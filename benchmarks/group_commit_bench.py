@@ -0,0 +1,161 @@
+"""Benchmark do group commit: um commit por email vs a thread gravadora.
+
+Várias threads gravam emails já classificados ao mesmo tempo, primeiro cada
+uma com o próprio INSERT e commit (como ClassifyEmail sem group commit) e
+depois pela GroupCommitWriter. Para cada concorrência o resultado mostra
+inserções/s, commits/s, emails por commit e latência p50/p99 de cada gravação.
+
+Uso:
+    DB_NAME=email_classifier_bench python benchmarks/group_commit_bench.py \\
+        --threads 1,8,32,64 --inserts 200 --output group_commit_output.json
+
+    python benchmarks/group_commit_bench.py --backend sqlite
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.api_bench import git_revision, percentile, seed_users
+
+
+def make_row(rng):
+    """Linha no formato de insert_emails com chave única"""
+    body = f"Mensagem de teste {rng.random()}"
+    return (f"bench{rng.randint(1, 999)}@example.com", "Benchmark de gravação", body,
+            rng.randint(1, 6), round(rng.random(), 3), None, None, uuid.uuid4().hex)
+
+
+def insert_direct(db, user_id, row):
+    from ingest import insert_email
+
+    cursor = db.connection.cursor()
+    sender, subject, body, category_id, confidence, response_template_id, suggested_response, key = row
+    try:
+        insert_email(db, cursor, user_id, sender, subject, body, category_id, confidence,
+                     response_template_id, suggested_response, key)
+        db.connection.commit()
+    except Exception:
+        db.connection.rollback()
+        raise
+
+
+def run(db, threads, inserts, user_ids, seed, writer=None):
+    """Grava threads * inserts emails; retorna as medidas da rodada"""
+    latencies = [[] for _ in range(threads)]
+    errors = [0] * threads
+    start = threading.Barrier(threads + 1)
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        user_id = user_ids[index % len(user_ids)]
+        rows = [make_row(rng) for _ in range(inserts)]
+        start.wait()
+        for row in rows:
+            started = time.perf_counter()
+            try:
+                if writer:
+                    writer.submit(user_id, row)
+                else:
+                    insert_direct(db, user_id, row)
+            except Exception:
+                errors[index] += 1
+                continue
+            latencies[index].append(time.perf_counter() - started)
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    commits_before = writer.commits if writer else 0
+    start.wait()
+    started = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    samples = sorted(latency for thread_latencies in latencies for latency in thread_latencies)
+    inserted = len(samples)
+    commits = writer.commits - commits_before if writer else inserted
+    return {
+        'inserts': inserted,
+        'errors': sum(errors),
+        'seconds': round(elapsed, 3),
+        'inserts_per_second': round(inserted / elapsed, 1) if elapsed else 0.0,
+        'commits_per_second': round(commits / elapsed, 1) if elapsed else 0.0,
+        'rows_per_commit': round(inserted / commits, 2) if commits else 0.0,
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 3) if samples else None,
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 3) if samples else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do group commit")
+    parser.add_argument('--threads', default='1,8,32,64', help="concorrências, separadas por vírgula")
+    parser.add_argument('--inserts', type=int, default=200, help="emails gravados por thread")
+    parser.add_argument('--max-rows', type=int, default=100, help="GROUP_COMMIT_MAX_ROWS")
+    parser.add_argument('--max-delay-ms', type=float, default=5, help="GROUP_COMMIT_MAX_DELAY_MS")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='group_commit_output.json')
+    parser.add_argument('--allow-any-db', action='store_true',
+                        help="permite usar um banco cujo nome não contém 'bench'")
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'], default=os.getenv('DB_BACKEND', 'mysql'))
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+
+    os.environ['DB_BACKEND'] = args.backend
+    if args.backend == 'sqlite':
+        db_name = os.path.abspath(os.getenv('DB_PATH') or os.path.join(
+            tempfile.mkdtemp(prefix='email-bench-'), 'email_classifier_bench.db'))
+        os.environ['DB_PATH'] = db_name
+    else:
+        db_name = os.getenv('DB_NAME', '')
+    if 'bench' not in os.path.basename(db_name) and not args.allow_any_db:
+        raise SystemExit("Use um banco de benchmark (DB_NAME ou DB_PATH contendo 'bench') ou --allow-any-db")
+
+    from database import Database
+    from group_commit import GroupCommitWriter
+    db = Database()
+    if not db.connection:
+        raise SystemExit("Banco indisponível")
+
+    user_ids = seed_users(db, 8)
+    writer = GroupCommitWriter(db, args.max_rows, args.max_delay_ms / 1000)
+    writer.start()
+
+    results = {}
+    for threads in [int(value) for value in args.threads.split(',') if value.strip()]:
+        direct = run(db, threads, args.inserts, user_ids, args.seed)
+        grouped = run(db, threads, args.inserts, user_ids, args.seed + 1000, writer)
+        results[str(threads)] = {'direct': direct, 'group_commit': grouped}
+        for mode, result in (('direto', direct), ('grupo', grouped)):
+            print(f"{threads:4d} threads {mode:6s} {result['inserts_per_second']:9.1f} inserções/s "
+                  f"{result['commits_per_second']:9.1f} commits/s {result['rows_per_commit']:6.1f} por commit "
+                  f"p50 {result['p50_ms']} ms p99 {result['p99_ms']} ms erros {result['errors']}")
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'backend': db.backend.name,
+        'config': vars(args),
+        'results': results,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados gravados em {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Benchmark das instruções preparadas: texto vs registro de instruções preparadas.
+
+Executa cada consulta quente do registro (Database.execute_prepared) alternando
+entre o protocolo de texto (cursor novo a cada chamada, como antes) e a
+instrução preparada na conexão, e grava o custo médio por consulta e a
+economia em JSON.
+
+Uso:
+    DB_NAME=email_classifier_bench python benchmarks/prepared_bench.py \\
+        --iterations 20000 --output prepared_output.json
+
+    python benchmarks/prepared_bench.py --backend sqlite
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.api_bench import git_revision, percentile, sample_email_ids, seed_emails, seed_users
+
+
+def hot_statements(db, user_ids, email_ids):
+    """(nome, sql, gerador de parâmetros) das consultas quentes do registro"""
+    from schema import EMAIL_BY_ID_SQL, EMAIL_BY_ID_USER_SQL
+
+    cursor = db.connection.cursor()
+    cursor.execute("SELECT id FROM categories")
+    category_ids = [row[0] for row in cursor.fetchall()]
+
+    return [
+        ('users.is_admin', "SELECT is_admin FROM users WHERE id = %s",
+         lambda rng: (rng.choice(user_ids),)),
+        ('emails.by_id', EMAIL_BY_ID_SQL['emails'],
+         lambda rng: (rng.choice(email_ids),)),
+        ('emails.by_id_user', EMAIL_BY_ID_USER_SQL['emails'],
+         lambda rng: (rng.choice(email_ids), rng.choice(user_ids))),
+        ('categories.name', "SELECT name FROM categories WHERE id = %s",
+         lambda rng: (rng.choice(category_ids),)),
+        ('categories.list', "SELECT id, name, description, color, created_at FROM categories",
+         lambda rng: ()),
+    ]
+
+
+def run_text(db, name, sql, params):
+    cursor = db.connection.cursor()
+    db.execute(cursor, name, sql, params)
+    return cursor.fetchall()
+
+
+def run_prepared(db, name, sql, params):
+    return db.execute_prepared(name, sql, params).fetchall()
+
+
+def measure(db, runner, name, sql, make_params, iterations, seed):
+    rng = random.Random(seed)
+    latencies = []
+    for _ in range(iterations):
+        params = make_params(rng)
+        started = time.perf_counter()
+        runner(db, name, sql, params)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        'mean_us': round(sum(latencies) / len(latencies) * 1e6, 2),
+        'p50_us': round(percentile(latencies, 0.50) * 1e6, 2),
+        'p99_us': round(percentile(latencies, 0.99) * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das instruções preparadas")
+    parser.add_argument('--iterations', type=int, default=5000, help="execuções por consulta e modo")
+    parser.add_argument('--warmup', type=int, default=200)
+    parser.add_argument('--emails', type=int, default=10000, help="emails criados se o banco estiver vazio")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='prepared_output.json')
+    parser.add_argument('--allow-any-db', action='store_true',
+                        help="permite usar um banco cujo nome não contém 'bench'")
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'], default=os.getenv('DB_BACKEND', 'mysql'))
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+
+    os.environ['DB_BACKEND'] = args.backend
+    if args.backend == 'sqlite':
+        db_name = os.path.abspath(os.getenv('DB_PATH') or os.path.join(
+            tempfile.mkdtemp(prefix='email-bench-'), 'email_classifier_bench.db'))
+        os.environ['DB_PATH'] = db_name
+    else:
+        db_name = os.getenv('DB_NAME', '')
+    if 'bench' not in os.path.basename(db_name) and not args.allow_any_db:
+        raise SystemExit("Use um banco de benchmark (DB_NAME ou DB_PATH contendo 'bench') ou --allow-any-db")
+
+    from database import Database
+    db = Database()
+    if not db.connection:
+        raise SystemExit("Banco indisponível")
+
+    rng = random.Random(args.seed)
+    user_ids = seed_users(db, 5)
+    email_ids = sample_email_ids(db, 10000)
+    if not email_ids:
+        print(f"Populando {db_name}: {args.emails} emails")
+        seed_emails(db, user_ids, args.emails, rng)
+        email_ids = sample_email_ids(db, 10000)
+
+    results = {}
+    for name, sql, make_params in hot_statements(db, user_ids, email_ids):
+        measure(db, run_text, name, sql, make_params, args.warmup, args.seed)
+        measure(db, run_prepared, name, sql, make_params, args.warmup, args.seed)
+
+        text = measure(db, run_text, name, sql, make_params, args.iterations, args.seed)
+        prepared = measure(db, run_prepared, name, sql, make_params, args.iterations, args.seed)
+        saved = text['mean_us'] - prepared['mean_us']
+        results[name] = {
+            'text': text,
+            'prepared': prepared,
+            'saved_us': round(saved, 2),
+            'saved_pct': round(saved / text['mean_us'] * 100, 1) if text['mean_us'] else 0.0,
+        }
+        print(f"{name:20s} texto {text['mean_us']:9.1f} us  preparada {prepared['mean_us']:9.1f} us  "
+              f"economia {results[name]['saved_us']:8.1f} us ({results[name]['saved_pct']:5.1f}%)")
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'backend': db.backend.name,
+        'config': vars(args),
+        'results': results,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados gravados em {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""Avaliação da janela de entrada do classificador: acurácia vs latência.
+
+Treina o pipeline do EmailClassifier num corpus sintético e classifica, com a
+janela de entrada ligada e desligada:
+  - emails normais (o caso comum, onde a janela não deve mudar nada);
+  - emails legítimos longos (800 a 2000 palavras, cortados pela janela de tokens);
+  - os mesmos emails com --large-bytes de lixo anexado: logs colados, base64
+    e uma conversa citada de outra categoria.
+Para cada caso grava acurácia, latência p50/p99 por email e o tamanho do texto
+que chega ao TF-IDF.
+
+Uso:
+    python benchmarks/window_eval.py --large-bytes 1000000 --output window_output.json
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.api_bench import git_revision, percentile
+from synthetic_emails import generate_email, generate_emails
+
+LOG_LINE = "2024-05-10 12:00:{second:02d} ERROR [worker-{n}] java.lang.IllegalStateException at com.example.Service.run\n"
+
+
+def pad_logs(body, size, rng):
+    lines = [body, "\n\nSegue o log:\n"]
+    total = len(body)
+    while total < size:
+        line = LOG_LINE.format(second=rng.randint(0, 59), n=rng.randint(1, 64))
+        lines.append(line)
+        total += len(line)
+    return ''.join(lines)
+
+
+def pad_base64(body, size, rng):
+    blob = base64.encodebytes(rng.randbytes(size * 3 // 4)).decode('ascii')
+    return f"{body}\n\n--boundary\nContent-Transfer-Encoding: base64\n\n{blob}"
+
+
+def pad_quoted(body, size, rng, category_id):
+    # Conversa antiga de outra categoria, citada abaixo da resposta
+    other = rng.choice([cat for cat in range(1, 7) if cat != category_id])
+    lines = [body, "\n\nEm seg., 6 de mai. de 2024 às 09:12, Fulano <fulano@empresa.com> escreveu:\n"]
+    total = len(body)
+    while total < size:
+        _, _, quoted, _ = generate_email(rng, other)
+        line = f"> {quoted}\n"
+        lines.append(line)
+        total += len(line)
+    return ''.join(lines)
+
+
+# Janela desligada: o corpo inteiro chega ao preprocessamento, como antes
+WINDOW_DISABLED = {
+    'INPUT_MAX_BYTES': 0,
+    'INPUT_HEAD_TOKENS': 0,
+    'INPUT_TAIL_TOKENS': 0,
+    'INPUT_STRIP_QUOTES': False,
+    'INPUT_STRIP_SIGNATURE': False,
+}
+
+
+def set_window(values):
+    import ai_classifier
+
+    for name, value in values.items():
+        setattr(ai_classifier, name, value)
+
+
+def evaluate(classifier, emails):
+    """(acurácia, latências ordenadas, média de caracteres na entrada do modelo)"""
+    from ai_classifier import model_text
+
+    correct = 0
+    latencies = []
+    chars = 0
+    for _, subject, body, category_id in emails:
+        started = time.perf_counter()
+        predicted, _ = classifier.classify_batch([(subject, body)])[0]
+        latencies.append(time.perf_counter() - started)
+        correct += predicted == category_id
+        chars += len(model_text(subject, body))
+    latencies.sort()
+    return correct / len(emails), latencies, chars / len(emails)
+
+
+def summarize(accuracy, latencies, chars):
+    return {
+        'accuracy': round(accuracy, 4),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_input_chars': round(chars, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Acurácia e latência da janela de entrada do classificador")
+    parser.add_argument('--train', type=int, default=3000, help="emails de treino")
+    parser.add_argument('--test', type=int, default=1000, help="emails normais de teste")
+    parser.add_argument('--large', type=int, default=30, help="emails grandes por tipo de lixo")
+    parser.add_argument('--large-bytes', type=int, default=1000000, help="tamanho aproximado dos corpos grandes")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='window_output.json')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+
+    import ai_classifier
+    from ai_classifier import EmailClassifier, model_text, preprocess_text
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.naive_bayes import MultinomialNB
+    from sklearn.pipeline import Pipeline
+
+    defaults = {name: getattr(ai_classifier, name) for name in WINDOW_DISABLED}
+
+    # Mesmo pipeline do modelo inicial, treinado com a janela ligada (como em produção)
+    train = generate_emails(args.train, seed=args.seed)
+    classifier = EmailClassifier()
+    classifier.model = Pipeline([
+        ('tfidf', TfidfVectorizer(max_features=2000, ngram_range=(1, 3), min_df=1, max_df=0.95,
+                                  sublinear_tf=True, use_idf=True, smooth_idf=True)),
+        ('classifier', MultinomialNB(alpha=0.01, fit_prior=True)),
+    ])
+    classifier.model.fit([preprocess_text(model_text(subject, body)) for _, subject, body, _ in train],
+                         [category_id for _, _, _, category_id in train])
+
+    rng = random.Random(args.seed + 1)
+    normal = generate_emails(args.test, seed=args.seed + 1)
+    base = normal[:args.large]
+    cases = {
+        'normal': normal,
+        'long': generate_emails(args.large, seed=args.seed + 2, body_words=(800, 2000)),
+        'logs': [(s, subj, pad_logs(body, args.large_bytes, rng), cat) for s, subj, body, cat in base],
+        'base64': [(s, subj, pad_base64(body, args.large_bytes, rng), cat) for s, subj, body, cat in base],
+        'quoted': [(s, subj, pad_quoted(body, args.large_bytes, rng, cat), cat) for s, subj, body, cat in base],
+    }
+
+    results = {}
+    for name, emails in cases.items():
+        results[name] = {}
+        for mode, window in (('window', defaults), ('full', WINDOW_DISABLED)):
+            set_window(window)
+            results[name][mode] = summarize(*evaluate(classifier, emails))
+        set_window(defaults)
+        for mode in ('window', 'full'):
+            result = results[name][mode]
+            print(f"{name:8s} {mode:6s} acurácia {result['accuracy']:.3f}  p50 {result['p50_ms']:9.2f} ms  "
+                  f"p99 {result['p99_ms']:9.2f} ms  entrada média {result['mean_input_chars']:11.0f} caracteres")
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': vars(args),
+        'window': defaults,
+        'results': results,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados gravados em {output}")
+
+
+if __name__ == '__main__':
+    main()
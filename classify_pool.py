@@ -0,0 +1,145 @@
+"""Classificação em paralelo dos lotes grandes (upload em massa, classifyEmails, reclassificação).
+
+Um worker do gunicorn classifica com um único núcleo. Com CLASSIFY_WORKERS
+maior que 1, lotes a partir de CLASSIFY_PARALLEL_MIN_BATCH emails são
+divididos em blocos (até CLASSIFY_CHUNK_SIZE emails), classificados com
+classify_batch num pool de processos e remontados na ordem original. Cada
+processo do pool recebe uma cópia do modelo uma única vez, na criação; quando
+o modelo salvo muda (retreinamento), o pool é recriado com o modelo atual.
+Lotes menores continuam no próprio processo: copiar os textos para os filhos
+custaria mais do que a inferência.
+
+Os processos dos pools (este, o do treino e o da importação) são criados
+pelo forkserver (POOL_START_METHOD): um fork do worker herdaria as threads,
+os locks e as conexões abertas dele. Os filhos devolvem a duração de cada
+etapa com os resultados, e o processo pai a registra nas métricas.
+"""
+import math
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from ai_classifier import EmailClassifier
+from logs import get_logger
+from metrics import metrics, SIZE_BUCKETS
+
+# 0 ou 1 classifica no próprio processo
+CLASSIFY_WORKERS = int(os.getenv('CLASSIFY_WORKERS', 0))
+CLASSIFY_CHUNK_SIZE = int(os.getenv('CLASSIFY_CHUNK_SIZE', 500))
+CLASSIFY_PARALLEL_MIN_BATCH = int(os.getenv('CLASSIFY_PARALLEL_MIN_BATCH', 200))
+POOL_START_METHOD = os.getenv('POOL_START_METHOD', 'forkserver')
+
+logger = get_logger('classify_pool')
+
+# Classificador de cada processo do pool
+_worker_classifier = None
+
+
+def init_worker(model_data):
+    global _worker_classifier
+    _worker_classifier = EmailClassifier(model=pickle.loads(model_data))
+
+
+def classify_chunk(emails):
+    """(classify_batch de um bloco [(subject, body)], {etapa: segundos}); roda nos processos do pool"""
+    timings = {}
+    return _worker_classifier.classify_batch(emails, timings=timings), timings
+
+
+def mp_context():
+    """Contexto de multiprocessing dos pools de processos"""
+    return multiprocessing.get_context(POOL_START_METHOD)
+
+
+def model_version(classifier):
+    """Data de modificação do modelo salvo (muda a cada retreinamento)"""
+    try:
+        return os.stat(classifier.model_path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class ClassifierPool:
+    def __init__(self, classifier, workers=CLASSIFY_WORKERS, chunk_size=CLASSIFY_CHUNK_SIZE,
+                 min_batch=CLASSIFY_PARALLEL_MIN_BATCH):
+        self.classifier = classifier
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.min_batch = min_batch
+        self._executor = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        """Pool com o modelo atual; os processos são criados no primeiro lote grande"""
+        version = model_version(self.classifier)
+        with self._lock:
+            if self._executor is None or version != self._version:
+                if self._executor is not None:
+                    # Blocos já enviados ao pool antigo terminam com o modelo anterior
+                    self._executor.shutdown(wait=False)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=mp_context(), initializer=init_worker,
+                    initargs=(pickle.dumps(self.classifier.model),))
+                self._version = version
+            return self._executor
+
+    def chunks(self, emails):
+        # Blocos menores que chunk_size quando o lote não ocupa todos os processos
+        size = min(self.chunk_size, math.ceil(len(emails) / self.workers))
+        return [emails[start:start + size] for start in range(0, len(emails), size)]
+
+    def classify_batch(self, emails):
+        """Mesmo resultado de EmailClassifier.classify_batch, em paralelo nos lotes grandes"""
+        if self.workers <= 1 or len(emails) < self.min_batch or not self.classifier.model:
+            return self.classifier.classify_batch(emails)
+
+        start = time.perf_counter()
+        chunks = self.chunks(emails)
+        try:
+            results = []
+            for chunk_results, timings in self.executor().map(classify_chunk, chunks):
+                results.extend(chunk_results)
+                for stage, seconds in timings.items():
+                    metrics.observe('classifier_stage_duration_seconds', seconds, stage=stage)
+        except BrokenProcessPool as e:
+            # Um processo do pool morreu (ex.: falta de memória): o próximo lote cria outro pool
+            logger.error("Pool de classificação interrompido: %s", e)
+            metrics.inc('errors_total', component='classify_pool')
+            with self._lock:
+                self._executor = None
+            return self.classifier.classify_batch(emails)
+
+        metrics.observe('batch_size', len(chunks), buckets=SIZE_BUCKETS, operation='classify_pool_chunks')
+        metrics.observe('classifier_stage_duration_seconds', time.perf_counter() - start, stage='parallel')
+        return results
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+# Instância compartilhada pelo processo (None = classificação no próprio processo)
+pool = None
+
+
+def start_pool(classifier, workers=CLASSIFY_WORKERS):
+    """Configura o pool do classificador se workers for maior que 1"""
+    global pool
+    if workers <= 1 or not classifier or pool is not None:
+        return pool
+    pool = ClassifierPool(classifier, workers)
+    return pool
+
+
+def classify_batch(classifier, emails):
+    """[(categoria, confiança)] de [(subject, body)], pelo pool quando ele foi iniciado para este classificador"""
+    if pool is not None and pool.classifier is classifier:
+        return pool.classify_batch(emails)
+    return classifier.classify_batch(emails)
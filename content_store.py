@@ -0,0 +1,123 @@
+import os
+import re
+import zlib
+
+from search import SEARCH_MIN_TERM_LENGTH
+from storage import Error
+
+# Corpos maiores que este limite (em bytes) são gravados comprimidos; 0 desativa
+COMPRESS_MIN_BYTES = int(os.getenv('CONTENT_COMPRESS_MIN_BYTES', 8192))
+# Início do corpo comprimido mantido literal no texto pesquisável; do resto entram só as palavras novas
+SEARCH_TEXT_CHARS = 4096
+COMPRESS_LEVEL = 6
+
+
+def pack_body(body):
+    """Retorna (texto pesquisável, corpo comprimido ou None)"""
+    body = body or ""
+    raw = body.encode('utf-8')
+
+    if not COMPRESS_MIN_BYTES or len(raw) < COMPRESS_MIN_BYTES:
+        return body, None
+
+    compressed = zlib.compress(raw, COMPRESS_LEVEL)
+    if len(compressed) >= len(raw):
+        return body, None
+
+    return search_text(body), compressed
+
+
+def search_text(body):
+    """Texto indexado de um corpo comprimido: o início literal e cada palavra do corpo que não está nele
+
+    A busca é por termos (com prefixo), sem frases: toda palavra do corpo continua encontrável sem
+    guardar o corpo duas vezes. Repetições depois do início não contam na relevância.
+    """
+    head = body[:SEARCH_TEXT_CHARS]
+    seen = {word.lower() for word in re.findall(r'\w+', head)}
+    words = []
+    for word in re.findall(r'\w+', body):
+        key = word.lower()
+        if len(key) >= SEARCH_MIN_TERM_LENGTH and key not in seen:
+            seen.add(key)
+            words.append(word)
+    return f"{head}\n{' '.join(words)}" if words else head
+
+
+def unpack_body(body_text, body_compressed):
+    if body_compressed is not None:
+        return zlib.decompress(bytes(body_compressed)).decode('utf-8')
+    return body_text
+
+
+def save_content(db, cursor, email_id, body, suggested_response):
+    """Grava o conteúdo (frio) de um email já inserido em emails"""
+    body_text, body_compressed = pack_body(body)
+    # Instrução preparada na conexão principal (mesma transação do INSERT em emails)
+    db.execute_prepared('email_contents.insert', """
+        INSERT INTO email_contents (email_id, body, body_compressed, suggested_response)
+        VALUES (%s, %s, %s, %s)
+    """, (email_id, body_text, body_compressed, suggested_response))
+
+
+def save_contents(db, cursor, contents):
+    """Grava o conteúdo de vários emails [(email_id, body, suggested_response)] num só comando"""
+    rows = []
+    for email_id, body, suggested_response in contents:
+        body_text, body_compressed = pack_body(body)
+        rows.append((email_id, body_text, body_compressed, suggested_response))
+    if not rows:
+        return
+
+    # O conector do MySQL transforma o executemany de INSERT num INSERT multi-linha
+    db.executemany(cursor, 'email_contents.insert_batch', """
+        INSERT INTO email_contents (email_id, body, body_compressed, suggested_response)
+        VALUES (%s, %s, %s, %s)
+    """, rows)
+
+
+def load_contents(db, cursor, email_ids):
+    """Busca corpo e resposta sugerida de vários emails: {id: (body, suggested_response)}"""
+    email_ids = list(dict.fromkeys(email_ids))
+    if not email_ids:
+        return {}
+
+    placeholders = ', '.join(['%s'] * len(email_ids))
+    db.execute(cursor, 'email_contents.by_ids', f"""
+        SELECT email_id, body, body_compressed, suggested_response
+        FROM email_contents
+        WHERE email_id IN ({placeholders})
+    """, tuple(email_ids))
+
+    contents = {}
+    for email_id, body_text, body_compressed, suggested_response in cursor.fetchall():
+        contents[email_id] = (unpack_body(body_text, body_compressed), suggested_response)
+
+    # Linhas antigas que a migração ainda não moveu continuam em emails
+    missing = [email_id for email_id in email_ids if email_id not in contents]
+    if missing and db.legacy_content:
+        placeholders = ', '.join(['%s'] * len(missing))
+        try:
+            db.execute(cursor, 'emails.legacy_content', f"""
+                SELECT id, body, suggested_response FROM emails WHERE id IN ({placeholders})
+            """, tuple(missing))
+            for email_id, body, suggested_response in cursor.fetchall():
+                contents[email_id] = (body, suggested_response)
+        except Error as e:
+            # Colunas removidas depois que a migração terminou: todo conteúdo já está em email_contents
+            if not db.legacy_content_gone(e):
+                raise
+
+    # Emails arquivados mantêm o mesmo ID
+    missing = [email_id for email_id in email_ids if email_id not in contents]
+    if missing:
+        placeholders = ', '.join(['%s'] * len(missing))
+        db.execute(cursor, 'email_contents_archive.by_ids', f"""
+            SELECT email_id, body, body_compressed, suggested_response
+            FROM email_contents_archive
+            WHERE email_id IN ({placeholders})
+        """, tuple(missing))
+        for email_id, body_text, body_compressed, suggested_response in cursor.fetchall():
+            contents[email_id] = (unpack_body(body_text, body_compressed), suggested_response)
+
+    return contents
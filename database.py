@@ -1,118 +1,396 @@
-import mysql.connector
-from mysql.connector import Error
 import bcrypt
+import json
 import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from logs import event, get_logger
+from metrics import metrics
+from storage import Error, get_backend
+from replicas import ReplicaSet, ROUTE_MAX_LAG
+from response_templates import RESPONSE_TEMPLATES
+
+# Consultas acima deste tempo são registradas com o plano de execução
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+SLOW_QUERY_LOG_SIZE = int(os.getenv('SLOW_QUERY_LOG_SIZE', 100))
+# Conexões ociosas guardadas entre requisições (as excedentes são fechadas)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+
+# Comandos aceitos pelo EXPLAIN
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'WITH')
+
+logger = get_logger('db')
+
+def statement_shape(sql):
+    """Forma normalizada da consulta: literais e listas IN de tamanhos diferentes viram a mesma forma"""
+    shape = re.sub(r"'(?:[^'\\]|\\.)*'", '?', sql)
+    shape = re.sub(r'\b\d+\b', '?', shape)
+    shape = re.sub(r'IN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', 'IN (...)', shape, flags=re.IGNORECASE)
+    return ' '.join(shape.split())
 
 class Database:
     def __init__(self):
+        self.backend = get_backend()
+        self.replicas = ReplicaSet.from_env(self.backend)
+        self._last_writes = {}  # user_id -> hora da última escrita (leia o que escreveu)
+        self._local = threading.local()
+        self._idle = queue.LifoQueue(maxsize=DB_POOL_SIZE)
+        self._available = False
         self.connection = None
+        self.legacy_content = False
+        self.slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+        self._explained = set()
+        self._explained_lock = threading.Lock()
         self.connect()
         self.create_tables()
+        self.release_connection()
+    
+    @property
+    def connection(self):
+        """Conexão da thread atual (conexões não podem ser compartilhadas entre threads)"""
+        connection = getattr(self._local, 'connection', None)
+        
+        # A thread pega uma conexão ociosa ou abre outra, desde que o banco tenha respondido na inicialização
+        if connection is None and self._available:
+            connection = self._local.connection = self.checkout()
+        
+        return connection
+    
+    @connection.setter
+    def connection(self, connection):
+        self._local.connection = connection
     
     def connect(self):
         
         try:
-            # ALTERE AQUI SUAS CREDENCIAIS DO MYSQL
-            self.connection = mysql.connector.connect(
-                host=os.getenv('DB_HOST', 'localhost'),
-                database=os.getenv('DB_NAME', 'email_classifier_teste'),
-                user=os.getenv('DB_USER', 'dudu-e'),
-                password=os.getenv('DB_PASSWORD', 'dudu'),
-                port=os.getenv('DB_PORT', 3306)
-
-                  
-            )
+            self.connection = self.open_connection()
             if self.connection.is_connected():
-                print("Conectado ao MySQL")
+                self._available = True
+                logger.info("Conectado ao %s", self.backend.label)
         except Error as e:
-            print(f"Erro ao conectar com MySQL: {e}")
-            print("Verifique se:")
-            print("1. O MySQL está rodando")
-            print("2. As credenciais estão corretas")
-            print("3. O banco 'email_classifier_teste' existe")
+            logger.error("Erro ao conectar com %s: %s\nVerifique se:\n%s", self.backend.label, e,
+                         '\n'.join(self.backend.connection_help()))
     
-    def create_tables(self):
-        if not self.connection or not self.connection.is_connected():
-            print("Erro: Não há conexão com o banco de dados")
-            return
-            
-        cursor = self.connection.cursor()
+    def checkout(self):
+        """Conexão ociosa que ainda responde ou uma nova"""
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if connection.is_connected():
+                return connection
         
-        # Tabela de usuários
-        create_users_table = """
-        CREATE TABLE IF NOT EXISTS users (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            username VARCHAR(50) UNIQUE NOT NULL,
-            email VARCHAR(100) UNIQUE NOT NULL,
-            password_hash VARCHAR(255) NOT NULL,
-            is_admin BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """
+        try:
+            return self.open_connection()
+        except Error as e:
+            logger.error("Erro ao conectar com %s: %s", self.backend.label, e)
+            return None
+    
+    def release_connection(self):
+        """Fim da requisição: encerra a transação da thread e devolve a conexão às ociosas
         
-        # Tabela de categorias
-        create_categories_table = """
-        CREATE TABLE IF NOT EXISTS categories (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(100) NOT NULL,
-            description TEXT,
-            color VARCHAR(7) DEFAULT '#007bff',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
+        Sem o rollback, uma thread que só leu manteria o snapshot (REPEATABLE READ) da
+        primeira consulta até a próxima escrita.
         """
+        connection = getattr(self._local, 'connection', None)
+        self._local.connection = None
+        if connection is None:
+            return
         
-        # Tabela de emails
-        create_emails_table = """
-        CREATE TABLE IF NOT EXISTS emails (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            sender VARCHAR(255) NOT NULL,
-            subject VARCHAR(500) NOT NULL,
-            body TEXT NOT NULL,
-            category_id INT,
-            confidence_score FLOAT DEFAULT 0.0,
-            suggested_response TEXT,
-            user_id INT NOT NULL,
-            is_processed BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE SET NULL,
-            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-        )
-        """
+        try:
+            connection.rollback()
+            self._idle.put_nowait(connection)
+            return
+        except queue.Full:
+            pass
+        except Error as e:
+            logger.warning("Conexão descartada ao fim da requisição: %s", e)
         
-        # Tabela de feedback para treinamento
-        create_feedback_table = """
-        CREATE TABLE IF NOT EXISTS feedback (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            email_id INT NOT NULL,
-            user_id INT NOT NULL,
-            original_category_id INT,
-            corrected_category_id INT,
-            feedback_text TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (email_id) REFERENCES emails(id) ON DELETE CASCADE,
-            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-            FOREIGN KEY (original_category_id) REFERENCES categories(id) ON DELETE SET NULL,
-            FOREIGN KEY (corrected_category_id) REFERENCES categories(id) ON DELETE SET NULL
-        )
+        try:
+            connection.close()
+        except Error:
+            pass
+    
+    def discard_connection(self):
+        """Fecha e esquece a conexão da thread (perdida); o próximo acesso a self.connection pega outra"""
+        connection = getattr(self._local, 'connection', None)
+        self._local.connection = None
+        if connection is None:
+            return
+        
+        try:
+            connection.close()
+        except Error:
+            pass
+    
+    def open_connection(self):
+        """Abre uma nova conexão (tarefas em segundo plano não compartilham self.connection)"""
+        return self.backend.connect()
+    
+    def read_connection(self, route='replica', user_id=None):
+        """Conexão para leitura: réplica dentro do atraso aceito pela rota, senão o primário"""
+        if route == 'primary' or not self.replicas:
+            return self.connection
+        
+        max_lag = ROUTE_MAX_LAG[route]
+        # Leia o que escreveu: a réplica precisa conter a última escrita do usuário
+        last_write = self._last_writes.get(user_id) if user_id else None
+        if last_write:
+            max_lag = min(max_lag, time.time() - last_write)
+        
+        connection = self.replicas.connection(max_lag)
+        metrics.inc('db_reads_total', route=route, target='replica' if connection else 'primary')
+        return connection or self.connection
+    
+    def record_write(self, user_id):
+        """Marca uma escrita do usuário; as próximas leituras dele só vão a réplicas que já a receberam"""
+        if not self.replicas or not user_id:
+            return
+        
+        now = time.time()
+        if len(self._last_writes) > 10000:
+            horizon = now - max(ROUTE_MAX_LAG.values())
+            self._last_writes = {user: at for user, at in self._last_writes.items() if at > horizon}
+        self._last_writes[user_id] = now
+    
+    def execute(self, cursor, name, sql, params=None):
+        """Executa uma consulta identificada por um nome estável, medindo latência e linhas"""
+        start = time.perf_counter()
+        try:
+            cursor.execute(sql, params or ())
+        except Exception:
+            metrics.inc('db_query_errors_total', query=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.observe('db_query_duration_seconds', elapsed, query=name)
+        
+        self.record_query(name, sql, params, elapsed, cursor.rowcount)
+        return cursor
+    
+    def execute_prepared(self, name, sql, params=None, connection=None):
+        """Executa uma instrução do registro de instruções preparadas e devolve o cursor já lido
+        
+        Cada conexão prepara a instrução uma vez (protocolo binário no MySQL); depois de uma
+        reconexão ela é preparada de novo.
         """
+        connection = connection or self.connection
+        cursor = self.prepared_cursor(connection, name, sql)
+        try:
+            return self.execute(cursor, name, sql, params)
+        except Error as e:
+            if not self.backend.needs_reprepare(e):
+                raise
+            # Instruções preparadas não sobrevivem à conexão
+            connection.prepared_statements = {}
+            self.backend.reconnect(connection)
+            # Escrita perdida com a conexão não é repetida (a transação já não existe)
+            if getattr(e, 'errno', None) != 1243 and not sql.lstrip().upper().startswith('SELECT'):
+                raise
+            return self.execute(self.prepared_cursor(connection, name, sql), name, sql, params)
+    
+    def prepared_cursor(self, connection, name, sql):
+        """Cursor preparado de `name` nesta conexão (criado na primeira execução)"""
+        statements = getattr(connection, 'prepared_statements', None)
+        if statements is None:
+            statements = connection.prepared_statements = {}
+        
+        entry = statements.get(name)
+        if entry is None or entry[0] != sql:
+            metrics.inc('db_statement_prepares_total', query=name)
+            entry = statements[name] = (sql, self.backend.prepare(connection, sql))
+        return entry[1]
+    
+    def executemany(self, cursor, name, sql, seq_params):
+        """Versão de execute para lotes (INSERT com várias linhas)"""
+        start = time.perf_counter()
+        try:
+            cursor.executemany(sql, seq_params)
+        except Exception:
+            metrics.inc('db_query_errors_total', query=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.observe('db_query_duration_seconds', elapsed, query=name)
+        
+        # Plano de um lote não é capturado (os parâmetros são uma lista de linhas)
+        self.record_query(name, sql, None, elapsed, cursor.rowcount, explain=False)
+        return cursor
+    
+    def record_query(self, name, sql, params, elapsed, rows, explain=True):
+        if rows and rows > 0:
+            metrics.inc('db_query_rows_total', rows, query=name)
+        
+        if elapsed * 1000 < SLOW_QUERY_MS:
+            return
+        
+        metrics.inc('db_slow_queries_total', query=name)
+        
+        # EXPLAIN só na primeira ocorrência lenta de cada forma de consulta
+        shape = statement_shape(sql)
+        with self._explained_lock:
+            first = (name, shape) not in self._explained
+            self._explained.add((name, shape))
+        plan = self.explain(sql, params) if first and explain else None
+        
+        logger.warning("Consulta lenta %s: %.1f ms, %s linhas%s", name, elapsed * 1000, rows,
+                       f"; plano: {json.dumps(plan)}" if plan else "",
+                       extra=event('db.slow_query', query=name, duration_ms=round(elapsed * 1000, 2), rows=rows))
+        
+        self.slow_queries.append({
+            'query': name,
+            'duration_ms': round(elapsed * 1000, 2),
+            'rows': rows,
+            'at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'statement': shape,
+            'plan': plan,
+        })
+    
+    def explain(self, sql, params):
+        """Plano de execução da consulta, ou None se o comando não aceita EXPLAIN"""
+        statement = sql.lstrip()
+        connection = self.connection
+        if not connection or not statement.upper().startswith(EXPLAINABLE):
+            return None
+        
+        try:
+            return self.backend.explain(connection.cursor(), statement, params)
+        except Error + (ValueError,) as e:
+            logger.error("Erro ao obter plano de execução: %s", e)
+            return None
+    
+    def query_report(self, top=20):
+        """Consultas com maior tempo total (somando todos os workers) e as últimas lentas deste processo"""
+        stats = {}
+        
+        def entry(labels):
+            name = dict(tuple(label) for label in labels).get('query')
+            return stats.setdefault(name, {'query': name, 'calls': 0, 'total_ms': 0.0, 'rows': 0, 'slow': 0, 'errors': 0})
+        
+        for snapshot in metrics.collect():
+            for name, labels, state in snapshot['histograms']:
+                if name == 'db_query_duration_seconds':
+                    item = entry(labels)
+                    item['calls'] += state[-1]
+                    item['total_ms'] += state[-2] * 1000
+            for name, labels, value in snapshot['counters']:
+                if name == 'db_query_rows_total':
+                    entry(labels)['rows'] += value
+                elif name == 'db_slow_queries_total':
+                    entry(labels)['slow'] += value
+                elif name == 'db_query_errors_total':
+                    entry(labels)['errors'] += value
+        
+        ranked = sorted(stats.values(), key=lambda item: item['total_ms'], reverse=True)[:top]
+        for item in ranked:
+            item['avg_ms'] = round(item['total_ms'] / item['calls'], 3) if item['calls'] else 0.0
+            item['total_ms'] = round(item['total_ms'], 2)
+        
+        return {
+            'threshold_ms': SLOW_QUERY_MS,
+            'statements': ranked,
+            'slow_queries': list(reversed(self.slow_queries)),
+        }
+    
+    def create_tables(self):
+        if not self.connection or not self.connection.is_connected():
+            logger.error("Não há conexão com o banco de dados")
+            return
+            
+        cursor = self.connection.cursor()
         
         try:
-            cursor.execute(create_users_table)
-            cursor.execute(create_categories_table)
-            cursor.execute(create_emails_table)
-            cursor.execute(create_feedback_table)
+            for table, ddl in self.backend.tables:
+                self.execute(cursor, f'schema.create_{table}', ddl)
             self.connection.commit()
             
+            # Detectar tabela emails antiga (corpo ainda na própria tabela)
+            self.check_legacy_content()
+            
+            # Criar colunas e índices ausentes em tabelas já existentes
+            self.ensure_columns()
+            self.ensure_indexes()
+            
             # Inserir categorias padrão
             self.insert_default_categories()
             
+            # Inserir modelos de resposta padrão
+            self.insert_default_templates()
+            
             # Criar usuário admin padrão
             self.create_default_admin()
             
-            print("Tabelas criadas/verificadas com sucesso")
+            logger.info("Tabelas criadas/verificadas com sucesso")
             
         except Error as e:
-            print(f"Erro ao criar tabelas: {e}")
+            logger.error("Erro ao criar tabelas: %s", e)
+    
+    def column_info(self, table, column):
+        """Retorna (data_type, is_nullable) da coluna, ou None se ela não existe"""
+        return self.backend.column_info(self, self.connection.cursor(), table, column)
+    
+    def check_legacy_content(self):
+        """Verifica se emails ainda guarda body/suggested_response (migração pendente)"""
+        body_column = self.column_info('emails', 'body')
+        self.legacy_content = body_column is not None
+        
+        if not self.legacy_content:
+            return
+        
+        logger.warning("Tabela emails ainda contém o conteúdo; execute: python migrate_content.py")
+        
+        # Novas linhas gravam o conteúdo em email_contents, então body deixa de ser obrigatório
+        if body_column[1] == 'NO':
+            cursor = self.connection.cursor()
+            try:
+                self.execute(cursor, 'schema.body_nullable', "ALTER TABLE emails MODIFY body TEXT NULL, ALGORITHM=INPLACE, LOCK=NONE")
+            except Error as e:
+                logger.error("Erro ao ajustar coluna body: %s", e)
+    
+    def legacy_content_gone(self, error):
+        """True se `error` veio de emails.body removida com o processo no ar (migrate_content.py --drop-columns)
+        
+        Confere a coluna de novo e desliga legacy_content; quem chamou repete a consulta sem o conteúdo antigo.
+        """
+        if not self.legacy_content or not self.backend.is_unknown_column(error):
+            return False
+        
+        self.check_legacy_content()
+        if self.legacy_content:
+            return False
+        logger.info("Colunas antigas de emails removidas; conteúdo lido só de email_contents")
+        return True
+    
+    def ensure_columns(self):
+        """Adiciona colunas que tabelas criadas por versões anteriores não possuem"""
+        cursor = self.connection.cursor()
+        
+        for table, column, ddl in self.backend.columns:
+            if self.column_info(table, column):
+                continue
+            
+            try:
+                self.execute(cursor, f'schema.add_column_{column}', ddl)
+                logger.info("Coluna %s criada em %s", column, table)
+            except Error as e:
+                logger.error("Erro ao criar coluna %s: %s", column, e)
+    
+    def ensure_indexes(self):
+        """Cria índices que tabelas criadas por versões anteriores não possuem"""
+        cursor = self.connection.cursor()
+        
+        for table, index_name, ddl in self.backend.indexes:
+            if self.backend.index_exists(self, cursor, table, index_name):
+                continue
+            
+            try:
+                self.execute(cursor, f'schema.add_index_{index_name}', ddl)
+                logger.info("Índice %s criado em %s", index_name, table)
+            except Error as e:
+                logger.error("Erro ao criar índice %s: %s", index_name, e)
     
     def insert_default_categories(self):
         cursor = self.connection.cursor()
@@ -128,12 +406,43 @@ class Database:
         
         for name, description, color in categories:
             try:
-                cursor.execute(
+                self.execute(
+                    cursor, 'categories.insert_default',
                     "INSERT IGNORE INTO categories (name, description, color) VALUES (%s, %s, %s)",
                     (name, description, color)
                 )
             except Error as e:
-                print(f"Erro ao inserir categoria {name}: {e}")
+                logger.error("Erro ao inserir categoria %s: %s", name, e)
+        
+        self.connection.commit()
+    
+    def insert_default_templates(self):
+        """Grava a versão 1 dos modelos de resposta das categorias que ainda não têm modelo"""
+        cursor = self.connection.cursor()
+        
+        self.execute(cursor, 'templates.categories', "SELECT category_id FROM response_templates")
+        existing = {row[0] for row in cursor.fetchall()}
+        
+        self.execute(cursor, 'categories.ids', "SELECT id FROM categories")
+        category_ids = {row[0] for row in cursor.fetchall()}
+        
+        for category_id, body in RESPONSE_TEMPLATES.items():
+            if category_id in existing or category_id not in category_ids:
+                continue
+            
+            try:
+                self.execute(
+                    cursor, 'templates.insert',
+                    "INSERT INTO response_templates (category_id, current_version) VALUES (%s, %s)",
+                    (category_id, 1)
+                )
+                self.execute(
+                    cursor, 'templates.insert_version',
+                    "INSERT INTO response_template_versions (template_id, version, body) VALUES (%s, %s, %s)",
+                    (cursor.lastrowid, 1, body)
+                )
+            except Error as e:
+                logger.error("Erro ao inserir modelo de resposta da categoria %s: %s", category_id, e)
         
         self.connection.commit()
     
@@ -141,7 +450,7 @@ class Database:
         cursor = self.connection.cursor()
         
         # Verificar se admin já existe
-        cursor.execute("SELECT id FROM users WHERE username = 'admin'")
+        self.execute(cursor, 'users.find_admin', "SELECT id FROM users WHERE username = 'admin'")
         if cursor.fetchone():
             return  # Admin já existe
         
@@ -149,16 +458,23 @@ class Database:
         password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
         
         try:
-            cursor.execute(
+            self.execute(
+                cursor, 'users.insert_admin',
                 "INSERT INTO users (username, email, password_hash, is_admin) VALUES (%s, %s, %s, %s)",
                 ("admin", "admin@example.com", password_hash.decode('utf-8'), True)
             )
             self.connection.commit()
-            print("Usuário admin criado com sucesso (admin/admin123)")
+            logger.info("Usuário admin criado com sucesso (admin/admin123)")
         except Error as e:
-            print(f"Erro ao criar admin: {e}")
+            logger.error("Erro ao criar admin: %s", e)
     
     def close(self):
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-            print("Conexão MySQL fechada")
\ No newline at end of file
+        self.release_connection()
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if connection.is_connected():
+                connection.close()
+        logger.info("Conexões %s fechadas", self.backend.label)
\ No newline at end of file
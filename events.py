@@ -0,0 +1,236 @@
+"""Canal de eventos (Server-Sent Events) com os emails recém-classificados e a variação das estatísticas.
+
+Cada commit de ClassifyEmail, classifyEmails e /upload_emails publica um
+evento `emails` (linhas novas, sem o corpo) e um evento `stats` (quantidade
+por categoria e soma das confianças); o navegador aplica os dois sem reler
+a lista nem o /stats. Usuários recebem os próprios emails; admins, todos.
+
+Os eventos ficam num buffer circular de EVENTS_BUFFER_SIZE itens por
+processo e são numerados: uma conexão que cai retoma pelo Last-Event-ID. Se
+o ID não está mais no buffer (ou veio de outro processo), o cliente recebe
+`resync` e recarrega uma vez. Conexões ociosas não têm fila própria e só
+acordam com eventos do próprio usuário ou com o heartbeat.
+
+Com vários workers, defina EVENTS_REDIS_URL (requer o pacote redis): os
+eventos passam por um canal do Redis e cada worker os repassa às próprias
+conexões. Milhares de conexões por worker pedem um worker assíncrono
+(gunicorn -k gevent); com workers síncronos cada conexão ocupa uma thread.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+from logs import get_logger
+from metrics import metrics
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+EVENTS_BUFFER_SIZE = int(os.getenv('EVENTS_BUFFER_SIZE', 1000))
+EVENTS_HEARTBEAT = float(os.getenv('EVENTS_HEARTBEAT', 15))
+EVENTS_MAX_CONNECTIONS = int(os.getenv('EVENTS_MAX_CONNECTIONS', 5000))
+EVENTS_REDIS_URL = os.getenv('EVENTS_REDIS_URL')
+EVENTS_CHANNEL = 'email_classifier:events'
+# Intervalo sugerido ao EventSource para reconectar (ms)
+EVENTS_RETRY_MS = 3000
+
+ALL_USERS = '*'
+
+logger = get_logger('events')
+
+
+class Subscription:
+    __slots__ = ('user_id', 'is_admin', 'after', 'resync')
+
+    def __init__(self, user_id, is_admin, after, resync):
+        self.user_id = user_id
+        self.is_admin = is_admin
+        self.after = after
+        self.resync = resync
+
+
+class EventBroker:
+    """Buffer circular de eventos com uma condição por usuário (admins esperam na condição geral)"""
+
+    def __init__(self, size=EVENTS_BUFFER_SIZE, max_connections=EVENTS_MAX_CONNECTIONS):
+        self.boot = uuid.uuid4().hex[:8]  # distingue IDs de outro processo ou de antes de um restart
+        self.max_connections = max_connections
+        self.connections = 0
+        self._events = deque(maxlen=size)  # (seq, user_id, nome, JSON)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._conditions = {}  # user_id ou ALL_USERS -> [Condition, conexões]
+
+    def publish(self, user_id, name, data):
+        payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            self._seq += 1
+            self._events.append((self._seq, user_id, name, payload))
+            for key in (user_id, ALL_USERS):
+                waiting = self._conditions.get(key)
+                if waiting:
+                    waiting[0].notify_all()
+        metrics.inc('events_published_total', event=name)
+
+    def subscribe(self, user_id, is_admin, last_event_id=None):
+        """Subscription a partir do Last-Event-ID; None se o worker já atingiu o limite de conexões"""
+        with self._lock:
+            if self.connections >= self.max_connections:
+                return None
+            self.connections += 1
+
+            key = ALL_USERS if is_admin else user_id
+            waiting = self._conditions.setdefault(key, [threading.Condition(self._lock), 0])
+            waiting[1] += 1
+
+            after, resync = self._seq, False
+            if last_event_id:
+                boot, _, seq = last_event_id.partition(':')
+                oldest = self._events[0][0] if self._events else self._seq + 1
+                if boot == self.boot and seq.isdigit() and oldest - 1 <= int(seq) <= self._seq:
+                    after = int(seq)
+                else:
+                    resync = True
+        return Subscription(user_id, is_admin, after, resync)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.connections -= 1
+            key = ALL_USERS if subscription.is_admin else subscription.user_id
+            waiting = self._conditions[key]
+            waiting[1] -= 1
+            if not waiting[1]:
+                del self._conditions[key]
+
+    def wait(self, subscription, timeout):
+        """Eventos visíveis à subscription depois do último entregue (lista vazia no timeout)"""
+        key = ALL_USERS if subscription.is_admin else subscription.user_id
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                events = self._pending(subscription)
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    subscription.after = self._seq
+                    return events
+                self._conditions[key][0].wait(remaining)
+
+    def _pending(self, subscription):
+        # Do mais novo para o mais antigo, só até o último já entregue
+        events = []
+        for event in reversed(self._events):
+            if event[0] <= subscription.after:
+                break
+            if subscription.is_admin or event[1] == subscription.user_id:
+                events.append(event)
+        events.reverse()
+        return events
+
+    def stream(self, subscription):
+        """Corpo da resposta text/event-stream; libera a subscription quando o cliente desconecta"""
+        try:
+            yield f"retry: {EVENTS_RETRY_MS}\n\n"
+            if subscription.resync:
+                yield f"id: {self.boot}:{subscription.after}\nevent: resync\ndata: {{}}\n\n"
+            while True:
+                events = self.wait(subscription, EVENTS_HEARTBEAT)
+                if not events:
+                    yield ": ping\n\n"
+                    continue
+                yield ''.join(f"id: {self.boot}:{seq}\nevent: {name}\ndata: {payload}\n\n"
+                              for seq, _, name, payload in events)
+        finally:
+            self.unsubscribe(subscription)
+
+
+class RedisRelay(threading.Thread):
+    """Publica os eventos no Redis e repassa ao broker local os eventos de todos os workers"""
+
+    def __init__(self, broker, url):
+        super().__init__(name='events-relay', daemon=True)
+        self.broker = broker
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, user_id, name, data):
+        self.client.publish(EVENTS_CHANNEL, json.dumps({'user_id': user_id, 'name': name, 'data': data}))
+
+    def run(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(EVENTS_CHANNEL)
+                for message in pubsub.listen():
+                    event = json.loads(message['data'])
+                    self.broker.publish(event['user_id'], event['name'], event['data'])
+            except Exception as e:
+                logger.error("Erro no canal de eventos do Redis: %s", e)
+                metrics.inc('errors_total', component='events_relay')
+                time.sleep(1)
+
+
+# Instâncias compartilhadas pelo processo
+broker = EventBroker()
+relay = None
+
+
+def start_relay():
+    """Liga o repasse pelo Redis quando EVENTS_REDIS_URL está definido"""
+    global relay
+    if not EVENTS_REDIS_URL or relay is not None:
+        return relay
+    if redis is None:
+        logger.warning("EVENTS_REDIS_URL definido, mas o pacote redis não está instalado; eventos só neste processo")
+        return None
+    relay = RedisRelay(broker, EVENTS_REDIS_URL)
+    relay.start()
+    return relay
+
+
+def publish(user_id, name, data):
+    if relay is not None:
+        try:
+            relay.publish(user_id, name, data)
+            return
+        except Exception as e:
+            logger.error("Erro ao publicar evento no Redis: %s", e)
+            metrics.inc('errors_total', component='events_relay')
+    broker.publish(user_id, name, data)
+
+
+def publish_emails(user_id, emails):
+    """Publica os emails gravados [(id, remetente, assunto, category_id, categoria, confiança)] e o delta das estatísticas"""
+    if not emails:
+        return
+
+    created_at = datetime.now().isoformat(timespec='seconds')
+    by_category = {}
+    confidence_sum = 0.0
+    for _, _, _, _, category_name, confidence in emails:
+        by_category[category_name] = by_category.get(category_name, 0) + 1
+        confidence_sum += float(confidence or 0)
+
+    try:
+        publish(user_id, 'emails', [{
+            'id': email_id,
+            'sender': sender,
+            'subject': subject,
+            'categoryId': category_id,
+            'categoryName': category_name,
+            'confidenceScore': confidence,
+            'createdAt': created_at,
+        } for email_id, sender, subject, category_id, category_name, confidence in emails])
+        publish(user_id, 'stats', {
+            'total_emails': len(emails),
+            'confidence_sum': confidence_sum,
+            'emails_by_category': by_category,
+        })
+    except Exception as e:
+        # Os emails já foram gravados: o evento perdido só adia a atualização da tela
+        logger.exception("Erro ao publicar eventos: %s", e)
+        metrics.inc('errors_total', component='events')
@@ -0,0 +1,57 @@
+import os
+
+# Máximo de correções por chamada de addFeedbackBatch
+FEEDBACK_BATCH_MAX_SIZE = int(os.getenv('FEEDBACK_BATCH_MAX_SIZE', 500))
+
+
+def insert_feedback(db, cursor, user_id, is_admin, email_id, corrected_category_id, feedback_text):
+    """Grava o feedback num único INSERT ... SELECT; retorna o ID (None se o email não é visível ao usuário)
+
+    A categoria original é copiada do email no próprio comando, que também confere
+    o dono do email e a existência da categoria corrigida.
+    """
+    scope = "" if is_admin else "AND e.user_id = %s"
+    params = (user_id, feedback_text, corrected_category_id, email_id) + (() if is_admin else (user_id,))
+    db.execute(cursor, 'feedback.insert' if is_admin else 'feedback.insert_user', f"""
+        INSERT INTO feedback (email_id, user_id, original_category_id,
+                              corrected_category_id, feedback_text)
+        SELECT e.id, %s, e.category_id, c.id, %s
+        FROM emails e
+        JOIN categories c ON c.id = %s
+        WHERE e.id = %s {scope}
+    """, params)
+    return cursor.lastrowid if cursor.rowcount == 1 else None
+
+
+def insert_feedback_batch(db, cursor, user_id, is_admin, corrections):
+    """Grava várias correções [(email_id, corrected_category_id, feedback_text)] num só comando
+
+    Cada email recebe só a última correção do lote; emails de outros usuários ou
+    categorias inexistentes são ignorados. Retorna a quantidade gravada.
+    """
+    corrections = list({email_id: (email_id, category_id, text)
+                        for email_id, category_id, text in corrections}.values())
+    if not corrections:
+        return 0
+
+    rows = " UNION ALL ".join(["SELECT %s AS email_id, %s AS category_id, %s AS feedback_text"]
+                              + ["SELECT %s, %s, %s"] * (len(corrections) - 1))
+    params = [user_id]
+    for correction in corrections:
+        params.extend(correction)
+
+    scope = ""
+    if not is_admin:
+        scope = "WHERE e.user_id = %s"
+        params.append(user_id)
+
+    db.execute(cursor, 'feedback.insert_batch' if is_admin else 'feedback.insert_batch_user', f"""
+        INSERT INTO feedback (email_id, user_id, original_category_id,
+                              corrected_category_id, feedback_text)
+        SELECT e.id, %s, e.category_id, c.id, v.feedback_text
+        FROM ({rows}) v
+        JOIN emails e ON e.id = v.email_id
+        JOIN categories c ON c.id = v.category_id
+        {scope}
+    """, tuple(params))
+    return cursor.rowcount
@@ -0,0 +1,170 @@
+"""Group commit das classificações individuais (ClassifyEmail).
+
+Com GROUP_COMMIT_ENABLED=1, cada requisição entrega a linha já classificada a
+uma thread gravadora e espera. A gravadora junta o que chegar em até
+GROUP_COMMIT_MAX_DELAY_MS milissegundos (ou GROUP_COMMIT_MAX_ROWS linhas),
+grava tudo com insert_emails (um INSERT multi-linha por usuário) e faz um
+único commit. Só depois do commit cada requisição recebe o próprio ID: a
+resposta continua significando "gravado". Sob carga, um fsync passa a valer
+para dezenas de emails. Se o lote falhar, cada email é gravado de novo na
+própria transação: só a linha com problema recebe o erro.
+"""
+import os
+import queue
+import threading
+import time
+
+from ingest import insert_emails
+from logs import get_logger
+from metrics import metrics, SIZE_BUCKETS
+
+GROUP_COMMIT_ENABLED = os.getenv('GROUP_COMMIT_ENABLED', '0') == '1'
+GROUP_COMMIT_MAX_ROWS = int(os.getenv('GROUP_COMMIT_MAX_ROWS', 100))
+GROUP_COMMIT_MAX_DELAY = float(os.getenv('GROUP_COMMIT_MAX_DELAY_MS', 5)) / 1000
+# Espera máxima de quem enviou a linha; a gravação é idempotente (dedup_key) e pode ser repetida
+GROUP_COMMIT_TIMEOUT = float(os.getenv('GROUP_COMMIT_TIMEOUT', 30))
+
+logger = get_logger('group_commit')
+
+
+class PendingWrite:
+    __slots__ = ('user_id', 'row', 'done', 'result', 'error')
+
+    def __init__(self, user_id, row):
+        self.user_id = user_id
+        self.row = row
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class GroupCommitWriter(threading.Thread):
+    def __init__(self, db, max_rows=GROUP_COMMIT_MAX_ROWS, max_delay=GROUP_COMMIT_MAX_DELAY):
+        super().__init__(name='group-commit-writer', daemon=True)
+        self.db = db
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.queue = queue.Queue()
+        self.commits = 0
+        self.rows = 0
+
+    def submit(self, user_id, row):
+        """Grava uma linha no formato de insert_emails; retorna (email_id, criado) depois do commit"""
+        pending = PendingWrite(user_id, row)
+        self.queue.put(pending)
+        if not pending.done.wait(GROUP_COMMIT_TIMEOUT):
+            raise TimeoutError("Tempo esgotado aguardando a gravação em grupo")
+        if pending.error:
+            raise pending.error
+        return pending.result
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.flush(batch)
+
+    def flush(self, batch):
+        """Grava o lote numa transação ou, se ela falhar, um email por transação; a conexão é a desta thread"""
+        connection = self.db.connection
+
+        # Mesma chave enviada duas vezes no lote: a primeira grava, a outra recebe o mesmo ID
+        groups = {}
+        for pending in batch:
+            groups.setdefault((pending.user_id, pending.row[7]), []).append(pending)
+        groups = list(groups.values())
+
+        try:
+            try:
+                self.write(connection, groups)
+            except Exception as e:
+                logger.warning("Gravação em grupo de %d emails falhou (%s); gravando um a um", len(batch), e)
+                connection = self.recover(connection)
+                for waiting in groups:
+                    try:
+                        self.write(connection, [waiting])
+                    except Exception as e:
+                        logger.exception("Erro na gravação em grupo: %s", e)
+                        metrics.inc('errors_total', component='group_commit')
+                        connection = self.recover(connection)
+                        for pending in waiting:
+                            pending.error = e
+
+        finally:
+            for pending in batch:
+                pending.done.set()
+
+    def recover(self, connection):
+        """Desfaz a transação que falhou; se a conexão caiu (reinício do banco, wait_timeout), usa outra"""
+        if connection is not None:
+            rollback(connection)
+            if connection.is_connected():
+                return connection
+            logger.warning("Conexão da gravação em grupo perdida; abrindo outra")
+        self.db.discard_connection()
+        return self.db.connection
+
+    def write(self, connection, groups):
+        """Grava [[pendentes com a mesma chave]] com insert_emails e faz o commit"""
+        if connection is None:
+            raise RuntimeError("Banco de dados indisponível")
+        cursor = connection.cursor()
+        by_user = {}
+        for waiting in groups:
+            by_user.setdefault(waiting[0].user_id, []).append(waiting)
+
+        results = {}
+        for user_id, keyed in by_user.items():
+            saved = insert_emails(self.db, cursor, user_id, [waiting[0].row for waiting in keyed])
+            for waiting in keyed:
+                key = waiting[0].row[7]
+                if key not in saved:
+                    continue
+                email_id, created = saved[key]
+                results[waiting[0]] = (email_id, created)
+                for pending in waiting[1:]:
+                    results[pending] = (email_id, False)
+
+        connection.commit()
+        rows = sum(len(waiting) for waiting in groups)
+        self.commits += 1
+        self.rows += rows
+        metrics.inc('group_commits_total')
+        metrics.observe('batch_size', rows, buckets=SIZE_BUCKETS, operation='group_commit')
+
+        # Só depois do commit: também as repetidas, que apontam para a linha gravada nele
+        for waiting in groups:
+            for pending in waiting:
+                if pending in results:
+                    pending.result = results[pending]
+                else:
+                    pending.error = RuntimeError("Email não gravado")
+
+
+def rollback(connection):
+    try:
+        connection.rollback()
+    except Exception:
+        pass
+
+
+# Instância compartilhada pelo processo (None = cada requisição grava e faz o próprio commit)
+writer = None
+
+
+def start_writer(db):
+    """Inicia a thread gravadora se GROUP_COMMIT_ENABLED estiver ligado"""
+    global writer
+    if not GROUP_COMMIT_ENABLED or not db or writer is not None:
+        return writer
+    writer = GroupCommitWriter(db)
+    writer.start()
+    return writer
@@ -0,0 +1,141 @@
+"""Compressão das respostas, assets estáticos com hash no nome e respostas condicionais (ETag).
+
+As respostas de texto (JSON, HTML, JS, CSS) acima de COMPRESS_MIN_SIZE bytes
+saem com brotli (se o pacote estiver instalado e o cliente aceitar) ou gzip.
+Os arquivos de static/ são lidos e comprimidos uma vez na inicialização e
+servidos em /assets/<nome>.<hash>.<ext> com cache imutável de um ano; o
+template gera esses endereços com asset_url('script.js').
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import Response
+
+from metrics import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 500))
+# Níveis para respostas dinâmicas; os assets usam o nível máximo (comprimidos uma única vez)
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 5))
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/javascript', 'text/javascript',
+    'text/html', 'text/css', 'text/plain', 'image/svg+xml',
+}
+# Em ordem de preferência
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+
+def choose_encoding(accept_encodings, available=ENCODINGS):
+    """Primeira codificação de `available` aceita pelo cliente (None = sem compressão)"""
+    for encoding in available:
+        if accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding, best=False):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if best else BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=9 if best else GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response, accept_encodings):
+    """Comprime o corpo da resposta quando o tipo é texto, o tamanho compensa e o cliente aceita"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encodings)
+    if not encoding:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    compressed = compress(data, encoding)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    # O corpo comprimido não é idêntico byte a byte ao original: o ETag passa a ser fraco
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+    metrics.inc('http_response_bytes_total', len(data), encoding=encoding, stage='original')
+    metrics.inc('http_response_bytes_total', len(compressed), encoding=encoding, stage='compressed')
+    return response
+
+
+def conditional(response, request):
+    """ETag pelo conteúdo e 304 quando o cliente já tem a mesma versão (revalidada a cada uso)"""
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+class StaticAssets:
+    """Arquivos de um diretório com o hash do conteúdo no nome e versões pré-comprimidas"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.names = {}  # nome original -> nome com hash
+        self.files = {}  # nome com hash -> (mimetype, {codificação: corpo}, hash)
+        if folder and os.path.isdir(folder):
+            self.load()
+
+    def load(self):
+        for root, _, filenames in os.walk(self.folder):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.folder).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    data = f.read()
+
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                base, ext = os.path.splitext(name)
+                hashed = f"{base}.{digest}{ext}"
+                mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+                bodies = {None: data}
+                if mimetype in COMPRESSIBLE_TYPES:
+                    for encoding in ENCODINGS:
+                        compressed = compress(data, encoding, best=True)
+                        if len(compressed) < len(data):
+                            bodies[encoding] = compressed
+
+                self.names[name] = hashed
+                self.files[hashed] = (mimetype, bodies, digest)
+
+    def url(self, name):
+        """Endereço imutável do arquivo; arquivos desconhecidos continuam em /static"""
+        hashed = self.names.get(name)
+        return f"/assets/{hashed}" if hashed else f"/static/{name}"
+
+    def response(self, hashed, accept_encodings):
+        """Resposta com a melhor versão aceita pelo cliente; None se o arquivo não existe"""
+        asset = self.files.get(hashed)
+        if asset is None:
+            return None
+
+        mimetype, bodies, digest = asset
+        encoding = choose_encoding(accept_encodings, [encoding for encoding in ENCODINGS if encoding in bodies])
+        response = Response(bodies[encoding], mimetype=mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if len(bodies) > 1:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+        response.set_etag(digest, weak=bool(encoding))
+        return response
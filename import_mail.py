@@ -0,0 +1,247 @@
+"""Importa emails de arquivos mbox e diretórios Maildir para um usuário.
+
+Uso:
+    python import_mail.py --user admin caixa.mbox ~/Maildir [--batch-size 500] [--workers 4]
+
+As mensagens são lidas uma a uma (o arquivo nunca é carregado inteiro), o
+MIME é decodificado em --workers processos (remetente, assunto e o texto
+puro do corpo, com o charset de cada parte) e cada lote é classificado numa
+única chamada ao modelo e gravado com um INSERT multi-linha. O ponto de
+parada de cada fonte fica em system_state, na mesma transação do lote:
+uma importação interrompida continua de onde parou (--no-resume relê do início).
+Mensagens repetidas são ignoradas pela chave de idempotência (Message-ID).
+"""
+import argparse
+import email
+import email.policy
+import hashlib
+import html
+import json
+import mailbox
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from email.utils import parseaddr
+
+import classify_pool
+from ai_classifier import EmailClassifier
+from database import Database
+from ingest import dedup_key, find_existing, classify_and_insert
+from metrics import metrics, SIZE_BUCKETS
+
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 500))
+IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', os.cpu_count() or 1))
+
+# Limites das colunas de emails
+SENDER_MAX_CHARS = 255
+SUBJECT_MAX_CHARS = 500
+
+_TAG = re.compile(r'<[^>]+>')
+_SCRIPT = re.compile(r'<(script|style)[^>]*>.*?</\1>', re.IGNORECASE | re.DOTALL)
+_SPACES = re.compile(r'[ \t]+')
+
+
+def html_to_text(value):
+    """Texto aproximado de um corpo HTML (para mensagens sem parte text/plain)"""
+    value = _SCRIPT.sub(' ', value)
+    value = re.sub(r'<br\s*/?>|</p>|</div>', '\n', value, flags=re.IGNORECASE)
+    return _SPACES.sub(' ', html.unescape(_TAG.sub(' ', value))).strip()
+
+
+def part_text(part):
+    """Conteúdo de uma parte de texto decodificado; charsets desconhecidos viram UTF-8 com substituição"""
+    try:
+        return part.get_content()
+    except (LookupError, UnicodeDecodeError, AssertionError):
+        payload = part.get_payload(decode=True) or b''
+        return payload.decode('utf-8', errors='replace')
+
+
+def parse_message(raw):
+    """(message_id, sender, subject, body) de uma mensagem RFC 822; None se não há o que importar"""
+    try:
+        message = email.message_from_bytes(raw, policy=email.policy.default)
+
+        part = message.get_body(preferencelist=('plain', 'html'))
+        body = ''
+        if part is not None:
+            body = part_text(part)
+            if part.get_content_subtype() == 'html':
+                body = html_to_text(body)
+        body = body.strip()
+
+        subject = ' '.join(str(message.get('Subject', '') or '').split())
+        sender_header = str(message.get('From', '') or '')
+        sender = parseaddr(sender_header)[1] or sender_header.strip()
+        message_id = str(message.get('Message-ID', '') or '').strip() or None
+    except Exception:
+        return None
+
+    if not subject and not body:
+        return None
+    return (message_id,
+            (sender or 'desconhecido')[:SENDER_MAX_CHARS],
+            (subject or '(sem assunto)')[:SUBJECT_MAX_CHARS],
+            body or subject)
+
+
+def parse_chunk(chunk):
+    """parse_message de cada mensagem do bloco; roda nos processos do pool"""
+    return [parse_message(raw) for raw in chunk]
+
+
+def open_source(path):
+    """Maildir para diretórios, mbox para arquivos"""
+    if os.path.isdir(path):
+        return mailbox.Maildir(path, factory=None, create=False)
+    return mailbox.mbox(path, factory=None, create=False)
+
+
+def iter_raw_messages(path, skip=0):
+    """Bytes de cada mensagem da fonte, em ordem estável, a partir da posição `skip`"""
+    source = open_source(path)
+    # Maildir não tem ordem própria: os nomes dos arquivos começam pelo horário de entrega
+    keys = sorted(source.iterkeys()) if isinstance(source, mailbox.Maildir) else source.iterkeys()
+    try:
+        for position, key in enumerate(keys):
+            if position < skip:
+                continue
+            yield source.get_bytes(key)
+    finally:
+        source.close()
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def parse_chunks(chunks, workers=IMPORT_WORKERS):
+    """parse_chunk de cada bloco, na ordem, com no máximo 2 blocos por processo em andamento"""
+    if workers <= 1:
+        for chunk in chunks:
+            yield parse_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=classify_pool.mp_context()) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(parse_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def checkpoint_name(path):
+    # system_state.name tem 100 caracteres; o caminho completo vai no valor
+    return f"import:{hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()}"
+
+
+def load_checkpoint(db, cursor, path):
+    """Quantidade de mensagens da fonte já importadas"""
+    db.execute(cursor, 'system_state.import_checkpoint', "SELECT value FROM system_state WHERE name = %s",
+               (checkpoint_name(path),))
+    row = cursor.fetchone()
+    return json.loads(row[0])['position'] if row and row[0] else 0
+
+
+def save_checkpoint(db, cursor, path, position):
+    db.execute(cursor, 'system_state.set_import_checkpoint', """
+        INSERT INTO system_state (name, value) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE value = VALUES(value)
+    """, (checkpoint_name(path), json.dumps({'position': position})))
+
+
+def import_batch(db, classifier, user_id, records):
+    """Classifica e grava um lote de mensagens já decodificadas; retorna (importadas, repetidas)"""
+    cursor = db.connection.cursor()
+
+    items = {}
+    for record in records:
+        if record is None:
+            continue
+        message_id, sender, subject, body = record
+        key = dedup_key(user_id, sender, subject, body, message_id)
+        items.setdefault(key, (sender, subject, body, key))
+
+    existing = find_existing(db, cursor, list(items))
+    pending = [item for key, item in items.items() if key not in existing]
+
+    metrics.observe('batch_size', len(pending), buckets=SIZE_BUCKETS, operation='import_mail')
+    _, saved = classify_and_insert(db, cursor, classifier, user_id, pending)
+    created = sum(1 for _, was_created in saved.values() if was_created)
+    return created, sum(1 for record in records if record is not None) - created
+
+
+def import_source(db, classifier, user_id, path, batch_size=IMPORT_BATCH_SIZE, workers=IMPORT_WORKERS, resume=True):
+    """Importa uma fonte lote a lote; cada lote e o ponto de parada são gravados na mesma transação"""
+    cursor = db.connection.cursor()
+    position = load_checkpoint(db, cursor, path) if resume else 0
+    if position:
+        print(f"{path}: retomando após {position} mensagens")
+
+    imported = duplicates = skipped = 0
+    started = time.time()
+
+    for records in parse_chunks(chunked(iter_raw_messages(path, position), batch_size), workers):
+        try:
+            created, repeated = import_batch(db, classifier, user_id, records)
+            position += len(records)
+            save_checkpoint(db, cursor, path, position)
+            db.connection.commit()
+        except Exception:
+            db.connection.rollback()
+            raise
+
+        imported += created
+        duplicates += repeated
+        skipped += sum(1 for record in records if record is None)
+        elapsed = time.time() - started
+        print(f"{path}: {position} mensagens lidas, {imported} importadas, {duplicates} repetidas, "
+              f"{skipped} ignoradas ({(imported + duplicates + skipped) / max(elapsed, 1e-6):.0f} mensagens/s)")
+
+    return imported, duplicates, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa arquivos mbox e diretórios Maildir")
+    parser.add_argument('paths', nargs='+', help="arquivos mbox ou diretórios Maildir")
+    parser.add_argument('--user', required=True, help="usuário dono dos emails importados")
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=IMPORT_WORKERS, help="processos de decodificação (1 = sem pool)")
+    parser.add_argument('--no-resume', dest='resume', action='store_false',
+                        help="ignora o ponto de parada e relê as fontes do início")
+    args = parser.parse_args()
+
+    db = Database()
+    if not db.connection or not db.connection.is_connected():
+        raise SystemExit(1)
+
+    cursor = db.connection.cursor()
+    db.execute(cursor, 'import.user', "SELECT id FROM users WHERE username = %s", (args.user,))
+    row = cursor.fetchone()
+    if not row:
+        print(f"Usuário {args.user} não encontrado")
+        raise SystemExit(1)
+
+    classifier = EmailClassifier()
+    classify_pool.start_pool(classifier)
+    for path in args.paths:
+        imported, duplicates, skipped = import_source(
+            db, classifier, row[0], path, args.batch_size, args.workers, args.resume)
+        print(f"{path}: importação concluída ({imported} importadas, {duplicates} repetidas, {skipped} ignoradas)")
+
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import hashlib
+import os
+
+import classify_pool
+from content_store import save_content, save_contents
+from response_templates import templates
+
+# Máximo de emails por chamada de classifyEmails
+CLASSIFY_BATCH_MAX_SIZE = int(os.getenv('CLASSIFY_BATCH_MAX_SIZE', 100))
+
+
+def dedup_key(user_id, sender, subject, body, message_id=None):
+    """Chave de idempotência: ID da mensagem enviado pelo cliente ou hash do conteúdo"""
+    if message_id:
+        source = f"msg\x00{user_id}\x00{message_id}"
+    else:
+        source = f"hash\x00{user_id}\x00{sender}\x00{subject}\x00{body}"
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def find_existing(db, cursor, keys, lock=False):
+    """{dedup_key: email_id} das chaves que já foram gravadas (busca nos índices únicos de emails e do arquivo)
+
+    Com lock=True a leitura trava as linhas e enxerga também o que outras transações
+    gravaram depois do início desta; só emails é lida (uso de insert_emails, para achar
+    os IDs que acabou de gravar).
+    """
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+
+    placeholders = ', '.join(['%s'] * len(keys))
+    if lock:
+        db.execute(cursor, 'emails.find_dedup_locked',
+                   f"SELECT dedup_key, id FROM emails WHERE dedup_key IN ({placeholders}) FOR UPDATE",
+                   tuple(keys))
+    else:
+        # Emails arquivados mantêm a chave: reimportar um email antigo não o duplica
+        db.execute(cursor, 'emails.find_dedup', f"""
+            SELECT dedup_key, id FROM emails WHERE dedup_key IN ({placeholders})
+            UNION ALL
+            SELECT dedup_key, id FROM emails_archive WHERE dedup_key IN ({placeholders})
+        """, tuple(keys) * 2)
+    return {key: email_id for key, email_id in cursor.fetchall()}
+
+
+def suggested_response_for(db, classifier, category_id, subject, body):
+    """(response_template_id, texto): o texto só é gerado se a categoria não tem modelo"""
+    response_template_id = templates.template_id_for(db, category_id)
+    if response_template_id:
+        return response_template_id, None
+    return None, classifier.generate_response(category_id, subject, body)
+
+
+def insert_email(db, cursor, user_id, sender, subject, body, category_id, confidence,
+                 response_template_id, suggested_response, key):
+    """Grava metadados e conteúdo; retorna (email_id, criado) sem duplicar retentativas"""
+    email_id, created = db.backend.insert_unique(db, cursor, 'emails.insert', """
+        INSERT INTO emails (sender, subject, category_id, confidence_score, user_id,
+                          is_processed, response_template_id, dedup_key)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, (sender, subject, category_id, confidence, user_id, True, response_template_id, key), 'emails', key)
+
+    if created:
+        save_content(db, cursor, email_id, body, suggested_response)
+
+    return email_id, created
+
+
+def insert_emails(db, cursor, user_id, rows):
+    """Grava vários emails num único INSERT multi-linha, na transação do chamador
+
+    rows: [(sender, subject, body, category_id, confidence, response_template_id,
+    suggested_response, dedup_key)] com chaves distintas. Retorna {dedup_key: (email_id, criado)};
+    chaves ausentes não foram gravadas.
+    """
+    if not rows:
+        return {}
+
+    values = []
+    for sender, subject, body, category_id, confidence, response_template_id, suggested_response, key in rows:
+        values.extend((sender, subject, category_id, confidence, user_id, True, response_template_id, key))
+
+    placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s)'] * len(rows))
+    db.execute(cursor, 'emails.insert_batch', f"""
+        INSERT IGNORE INTO emails (sender, subject, category_id, confidence_score, user_id,
+                                   is_processed, response_template_id, dedup_key)
+        VALUES {placeholders}
+    """, tuple(values))
+    inserted = cursor.rowcount
+
+    # IDs pela chave de idempotência (o INSERT multi-linha não devolve um ID por linha)
+    keys = [row[7] for row in rows]
+    ids = find_existing(db, cursor, keys, lock=True)
+
+    # Linhas ignoradas: outra requisição gravou a mesma chave no meio tempo, e o
+    # conteúdo dela foi gravado na mesma transação
+    duplicates = set()
+    if inserted < len(rows) and ids:
+        placeholders = ', '.join(['%s'] * len(ids))
+        db.execute(cursor, 'email_contents.exists',
+                   f"SELECT email_id FROM email_contents WHERE email_id IN ({placeholders}) FOR UPDATE",
+                   tuple(ids.values()))
+        duplicates = {row[0] for row in cursor.fetchall()}
+
+    save_contents(db, cursor, [(ids[row[7]], row[2], row[6]) for row in rows
+                               if row[7] in ids and ids[row[7]] not in duplicates])
+
+    return {key: (email_id, email_id not in duplicates) for key, email_id in ids.items()}
+
+
+def classify_and_insert(db, cursor, classifier, user_id, items, predictions=None):
+    """Classifica [(sender, subject, body, dedup_key)] numa única passada do modelo e grava com insert_emails
+
+    `predictions` já calculadas (na ordem de items) dispensam a classificação aqui.
+    Retorna (linhas gravadas no formato de insert_emails, {dedup_key: (email_id, criado)}).
+    """
+    if predictions is None:
+        predictions = classify_pool.classify_batch(classifier, [(subject, body) for _, subject, body, _ in items])
+
+    rows = []
+    for (sender, subject, body, key), (category_id, confidence) in zip(items, predictions):
+        response_template_id, suggested_response = suggested_response_for(
+            db, classifier, category_id, subject, body)
+        rows.append((sender, subject, body, category_id, confidence,
+                     response_template_id, suggested_response, key))
+
+    return rows, insert_emails(db, cursor, user_id, rows)
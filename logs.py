@@ -0,0 +1,135 @@
+"""Logs com níveis, amostragem por evento e escrita numa thread separada.
+
+get_logger('classifier') devolve um logger da aplicação. Os registros vão para
+uma fila e uma thread (QueueListener) escreve no stdout: quem registra nunca
+espera por I/O. Com a fila cheia (LOG_QUEUE_SIZE), o registro é descartado e
+contado em log_records_dropped_total.
+
+LOG_LEVEL (padrão INFO) vale para todos os loggers e LOG_LEVELS ajusta cada
+um ("classifier=DEBUG,db=WARNING"). LOG_FORMAT=json grava uma linha JSON por
+registro, com os campos passados em extra=event(...). Eventos frequentes têm
+nome e podem ser amostrados com LOG_SAMPLE ("db.slow_query=0.1"): só essa
+fração dos registros do evento é gravada.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+LOG_SAMPLE = os.getenv('LOG_SAMPLE', '')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+
+ROOT_LOGGER = 'email_classifier'
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+
+def parse_pairs(value):
+    """{nome: valor} de "nome=valor,nome=valor" """
+    pairs = {}
+    for item in value.split(','):
+        name, _, setting = item.strip().partition('=')
+        if name and setting:
+            pairs[name.strip()] = setting.strip()
+    return pairs
+
+
+def event(name, **fields):
+    """extra= de um registro: nome do evento (para amostragem) e campos estruturados"""
+    return {'event': name, 'fields': fields}
+
+
+class SamplingFilter(logging.Filter):
+    """Grava só a fração configurada de cada evento (roda na thread de quem registra)"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, 'event', None))
+        return rate is None or random.random() < rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Entrega o registro à fila sem esperar; com a fila cheia, descarta"""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            from metrics import metrics
+            metrics.inc('log_records_dropped_total')
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'event', None):
+            entry['event'] = record.event
+        entry.update(getattr(record, 'fields', None) or {})
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+_listener = None
+_handler = None
+
+
+def setup():
+    """Configura os loggers da aplicação e inicia a thread de escrita (uma vez por processo)"""
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+    for name, level in parse_pairs(LOG_LEVELS).items():
+        logging.getLogger(f'{ROOT_LOGGER}.{name}').setLevel(level.upper())
+
+    records = queue.Queue(LOG_QUEUE_SIZE)
+    _handler = NonBlockingQueueHandler(records)
+    _handler.addFilter(SamplingFilter({name: float(rate) for name, rate in parse_pairs(LOG_SAMPLE).items()}))
+    root.addHandler(_handler)
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT))
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+
+
+def stop():
+    """Grava o que ainda está na fila (saída do processo)"""
+    if _listener is not None:
+        _listener.stop()
+
+
+def _after_fork():
+    # A fila herdada pode estar com o lock de uma thread do pai, que não existe no filho:
+    # o filho monta fila, handler e thread próprios (o que ficou na fila o pai grava)
+    global _listener, _handler
+    if _listener is None:
+        return
+    logging.getLogger(ROOT_LOGGER).removeHandler(_handler)
+    _listener = _handler = None
+    setup()
+
+
+atexit.register(stop)
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def get_logger(name):
+    setup()
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
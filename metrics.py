@@ -0,0 +1,369 @@
+"""Métricas no formato de exposição do Prometheus, sem dependências externas.
+
+Cada thread atualiza o próprio "shard" (sem lock no caminho quente); a leitura
+soma os shards. Com gunicorn, defina METRICS_MULTIPROC_DIR: cada worker grava
+periodicamente um snapshot nesse diretório e /metrics soma todos os workers.
+Os valores de um worker que termina (ou morre, detectado na leitura; ou cujo
+PID foi reaproveitado, detectado pelo novo dono na primeira gravação) são
+somados a metrics-retired.json, como faz o prometheus_client: contadores e
+histogramas nunca diminuem por causa da troca de workers.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from logs import get_logger
+
+logger = get_logger('metrics')
+
+METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+RETIRED_SNAPSHOT = 'metrics-retired.json'
+
+# Limites (segundos) dos histogramas de latência
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+HELP = {
+    'http_requests_total': ('counter', 'Requisições HTTP por rota, método e status'),
+    'http_request_duration_seconds': ('histogram', 'Latência das requisições HTTP por rota'),
+    'http_response_bytes_total': ('counter', 'Bytes das respostas comprimidas, antes (original) e depois (compressed)'),
+    'graphql_operations_total': ('counter', 'Operações GraphQL por nome e tipo'),
+    'graphql_operation_duration_seconds': ('histogram', 'Latência das operações GraphQL'),
+    'graphql_resolver_duration_seconds': ('histogram', 'Latência dos resolvers e mutations de nível superior'),
+    'db_query_duration_seconds': ('histogram', 'Latência das consultas SQL por nome'),
+    'db_query_rows_total': ('counter', 'Linhas retornadas ou afetadas por consulta SQL'),
+    'db_query_errors_total': ('counter', 'Consultas SQL que falharam'),
+    'db_slow_queries_total': ('counter', 'Consultas SQL acima de SLOW_QUERY_MS'),
+    'db_statement_prepares_total': ('counter', 'Instruções preparadas por conexão (inclui re-preparo após reconexão)'),
+    'db_reads_total': ('counter', 'Leituras roteadas por rota e destino (réplica ou primário)'),
+    'db_replica_lag_seconds': ('histogram', 'Atraso medido das réplicas de leitura'),
+    'classifier_stage_duration_seconds': ('histogram', 'Tempo de cada etapa do classificador'),
+    'batch_size': ('histogram', 'Tamanho dos lotes processados'),
+    'reclassified_emails_total': ('counter', 'Emails relidos pela reclassificação em massa (alterados ou não)'),
+    'cache_requests_total': ('counter', 'Consultas a caches internos (hit/miss)'),
+    'requests_shed_total': ('counter', 'Requisições recusadas com 429 por classe e motivo (rate_limit ou concurrency)'),
+    'events_published_total': ('counter', 'Eventos publicados no canal /events por tipo'),
+    'events_connections_total': ('counter', 'Conexões ao /events aceitas ou recusadas pelo limite do worker'),
+    'group_commits_total': ('counter', 'Commits da gravação em grupo (cada um confirma um lote de classificações)'),
+    'model_promotions_total': ('counter', 'Modelos retreinados aprovados ou recusados pelo portão de regressão'),
+    'log_records_dropped_total': ('counter', 'Registros de log descartados com a fila de log cheia'),
+    'errors_total': ('counter', 'Erros tratados por componente'),
+}
+
+
+class _Shard:
+    __slots__ = ('counters', 'histograms', 'owner')
+
+    def __init__(self, owner=None):
+        self.counters = {}    # (nome, labels) -> valor
+        self.histograms = {}  # (nome, labels) -> [contagem por bucket..., soma, total]
+        self.owner = owner
+
+    @staticmethod
+    def copy(shard):
+        snapshot = _Shard()
+        snapshot.counters = dict(shard.counters)
+        snapshot.histograms = {key: list(state) for key, state in list(shard.histograms.items())}
+        return snapshot
+
+    def merge(self, other):
+        for key, value in other.counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, state in other.histograms.items():
+            total = self.histograms.get(key)
+            self.histograms[key] = list(state) if total is None else [a + b for a, b in zip(total, state)]
+
+
+class Registry:
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard()  # valores de threads que já terminaram
+        self._shards_lock = threading.Lock()
+        self._buckets = {}
+        self._flusher = None
+        self._flush_lock = threading.Lock()
+        self._flushed_pid = None  # processo que já gravou o próprio arquivo
+        self._closed = False
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = _Shard(threading.current_thread())
+            with self._shards_lock:
+                # Servidores com uma thread por requisição: consolida shards de threads encerradas
+                alive = []
+                for existing in self._shards:
+                    if existing.owner.is_alive():
+                        alive.append(existing)
+                    else:
+                        self._retired.merge(existing)
+                alive.append(shard)
+                self._shards = alive
+            self._local.shard = shard
+            self._start_flusher()
+        return shard
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        counters = self._shard().counters
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histograms = self._shard().histograms
+        state = histograms.get(key)
+        if state is None:
+            self._buckets.setdefault(name, buckets)
+            state = histograms[key] = [0] * (len(buckets) + 2)
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                state[index] += 1
+                break
+        state[-2] += value
+        state[-1] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        """Soma dos shards deste processo, em formato serializável"""
+        total = _Shard()
+        with self._shards_lock:
+            total.merge(self._retired)
+            shards = list(self._shards)
+
+        for shard in shards:
+            # Cópia atômica (sob o GIL) do dicionário que a thread dona continua atualizando
+            total.merge(_Shard.copy(shard))
+
+        return _serialize(total.counters, total.histograms, self._buckets)
+
+    # Modo multiprocesso
+
+    def _snapshot_path(self, pid=None):
+        return os.path.join(METRICS_MULTIPROC_DIR, f"metrics-{pid or os.getpid()}.json")
+
+    def flush(self):
+        if not METRICS_MULTIPROC_DIR:
+            return
+        with self._flush_lock:
+            if self._closed:
+                return
+            pid = os.getpid()
+            if self._flushed_pid != pid:
+                # Arquivo com o nosso PID antes da primeira gravação: é de um processo morto
+                self._retire(pid)
+                self._flushed_pid = pid
+            _write_json(self._snapshot_path(), self.snapshot())
+
+    def _start_flusher(self):
+        if not METRICS_MULTIPROC_DIR or (self._flusher and self._flusher.is_alive() and self._flusher.pid == os.getpid()):
+            return
+
+        def loop():
+            while True:
+                time.sleep(METRICS_FLUSH_INTERVAL)
+                try:
+                    self.flush()
+                except OSError as e:
+                    logger.error("Erro ao gravar métricas: %s", e)
+
+        # Após o fork do gunicorn a thread do processo pai não existe no filho
+        self._flusher = threading.Thread(target=loop, name='metrics-flusher', daemon=True)
+        self._flusher.pid = os.getpid()
+        self._flusher.start()
+        atexit.register(self._retire_own, os.getpid())
+
+    def _retire_own(self, pid):
+        # Handlers do atexit são herdados no fork: cada processo só aposenta o próprio arquivo
+        if pid != os.getpid():
+            return
+        try:
+            self.flush()
+            with self._flush_lock:
+                self._closed = True
+                self._retire(pid)
+        except OSError as e:
+            logger.error("Erro ao gravar métricas: %s", e)
+
+    def _retire(self, pid):
+        """Soma o snapshot de um processo encerrado ao arquivo dos aposentados e apaga o snapshot"""
+        path = self._snapshot_path(pid)
+        with _directory_lock():
+            # Conferido sob o lock: outra leitura pode ter aposentado o arquivo ou o PID ter sido reaproveitado
+            if pid != os.getpid() and _process_alive(pid):
+                return
+            try:
+                with open(path, encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except FileNotFoundError:
+                return
+            except ValueError:
+                snapshot = None
+
+            if snapshot:
+                retired_path = os.path.join(METRICS_MULTIPROC_DIR, RETIRED_SNAPSHOT)
+                snapshots = [snapshot]
+                try:
+                    with open(retired_path, encoding='utf-8') as f:
+                        snapshots.append(json.load(f))
+                except FileNotFoundError:
+                    pass
+                _write_json(retired_path, _serialize(*_combine(snapshots)))
+            os.remove(path)
+
+    def collect(self):
+        """Snapshots de todos os processos (este processo sempre com valores atuais)"""
+        snapshots = [self.snapshot()]
+        if not METRICS_MULTIPROC_DIR:
+            return snapshots
+
+        own = os.path.basename(self._snapshot_path())
+        filenames = [filename for filename in os.listdir(METRICS_MULTIPROC_DIR)
+                     if filename.startswith('metrics-') and filename.endswith('.json') and filename != own]
+
+        # Primeiro aposenta os workers mortos, depois lê: os valores deles entram uma vez, pelo arquivo dos aposentados
+        for filename in filenames:
+            try:
+                pid = int(filename[len('metrics-'):-len('.json')])
+            except ValueError:
+                continue
+            if not _process_alive(pid):
+                try:
+                    self._retire(pid)
+                except OSError as e:
+                    logger.error("Erro ao aposentar métricas do processo %d: %s", pid, e)
+
+        for filename in os.listdir(METRICS_MULTIPROC_DIR):
+            if not filename.startswith('metrics-') or not filename.endswith('.json') or filename == own:
+                continue
+            try:
+                with open(os.path.join(METRICS_MULTIPROC_DIR, filename), encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        """Texto no formato de exposição do Prometheus"""
+        counters, histograms, buckets = _combine(self.collect())
+
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name in described:
+                return
+            described.add(name)
+            kind, text = HELP.get(name, ('untyped', name))
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            describe(name)
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for (name, labels), state in sorted(histograms.items()):
+            describe(name)
+            cumulative = 0
+            for bound, count in zip(buckets.get(name, LATENCY_BUCKETS), state):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {state[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(state[-2])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {state[-1]}")
+
+        return '\n'.join(lines) + '\n'
+
+
+def _combine(snapshots):
+    """Soma snapshots serializados: (contadores, histogramas, buckets) por (nome, labels)"""
+    counters = {}
+    histograms = {}
+    buckets = {}
+    for snapshot in snapshots:
+        buckets.update(snapshot['buckets'])
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, state in snapshot['histograms']:
+            key = (name, tuple(tuple(label) for label in labels))
+            total = histograms.get(key)
+            histograms[key] = list(state) if total is None else [a + b for a, b in zip(total, state)]
+    return counters, histograms, buckets
+
+
+def _serialize(counters, histograms, buckets):
+    return {
+        'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, list(labels), state] for (name, labels), state in histograms.items()],
+        'buckets': {name: list(bounds) for name, bounds in buckets.items()},
+    }
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _directory_lock():
+    """Lock entre processos para atualizar o arquivo dos aposentados"""
+    import fcntl  # só Unix, como o gunicorn
+
+    with open(os.path.join(METRICS_MULTIPROC_DIR, 'metrics.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+# Registro do processo
+metrics = Registry()
+
+
+def _after_fork():
+    # O fork pode ter acontecido com a thread de gravação do pai segurando o lock
+    metrics._flush_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,168 @@
+"""Move body/suggested_response de emails para email_contents em lotes pequenos.
+
+Uso:
+    python migrate_content.py [--batch-size 1000] [--sleep 0.05] [--drop-columns]
+    python migrate_content.py --reindex
+
+Pode ser executado com a aplicação no ar: cada lote é uma transação curta,
+linhas já migradas são ignoradas e a execução pode ser interrompida e retomada.
+Com --drop-columns, ao final remove as colunas antigas de emails (DDL online).
+Com --reindex, refaz o texto pesquisável dos corpos comprimidos gravados por
+versões que indexavam só os primeiros SEARCH_TEXT_CHARS caracteres.
+"""
+import argparse
+import time
+
+from database import Database
+from content_store import pack_body, search_text, unpack_body
+
+
+def migrate(db, batch_size, pause):
+    cursor = db.connection.cursor()
+
+    db.execute(cursor, 'migrate.id_range', "SELECT MIN(id), MAX(id) FROM emails")
+    min_id, max_id = cursor.fetchone()
+    if min_id is None:
+        print("Nenhum email para migrar")
+        return 0
+
+    moved = 0
+    started = time.time()
+    start_id = min_id
+
+    while start_id <= max_id:
+        end_id = start_id + batch_size - 1
+
+        db.execute(cursor, 'migrate.select_batch', """
+            SELECT e.id, e.body, e.suggested_response
+            FROM emails e
+            LEFT JOIN email_contents ec ON ec.email_id = e.id
+            WHERE e.id BETWEEN %s AND %s AND ec.email_id IS NULL
+        """, (start_id, end_id))
+        rows = cursor.fetchall()
+
+        if rows:
+            values = []
+            for email_id, body, suggested_response in rows:
+                body_text, body_compressed = pack_body(body)
+                values.append((email_id, body_text, body_compressed, suggested_response))
+
+            db.executemany(cursor, 'migrate.insert_contents', """
+                INSERT IGNORE INTO email_contents (email_id, body, body_compressed, suggested_response)
+                VALUES (%s, %s, %s, %s)
+            """, values)
+            db.connection.commit()
+            moved += len(rows)
+
+        elapsed = time.time() - started
+        print(f"Lote {start_id}-{end_id}: {len(rows)} linhas ({moved} no total, {moved / max(elapsed, 1e-6):.0f} linhas/s)")
+
+        start_id = end_id + 1
+        if pause:
+            time.sleep(pause)
+
+    return moved
+
+
+def reindex_search_text(db, batch_size, pause):
+    """Regrava email_contents.body dos corpos comprimidos com search_text; retorna quantos mudaram"""
+    cursor = db.connection.cursor()
+
+    db.execute(cursor, 'migrate.compressed_range', """
+        SELECT MIN(email_id), MAX(email_id) FROM email_contents WHERE body_compressed IS NOT NULL
+    """)
+    min_id, max_id = cursor.fetchone()
+    if min_id is None:
+        return 0
+
+    updated = 0
+    start_id = min_id
+    while start_id <= max_id:
+        end_id = start_id + batch_size - 1
+
+        db.execute(cursor, 'migrate.select_compressed', """
+            SELECT email_id, body, body_compressed
+            FROM email_contents
+            WHERE email_id BETWEEN %s AND %s AND body_compressed IS NOT NULL
+        """, (start_id, end_id))
+        values = []
+        for email_id, body_text, body_compressed in cursor.fetchall():
+            text = search_text(unpack_body(body_text, body_compressed))
+            if text != body_text:
+                values.append((text, email_id))
+
+        if values:
+            db.executemany(cursor, 'migrate.update_search_text', """
+                UPDATE email_contents SET body = %s WHERE email_id = %s
+            """, values)
+            db.connection.commit()
+            updated += len(values)
+        print(f"Lote {start_id}-{end_id}: {len(values)} linhas ({updated} no total)")
+
+        start_id = end_id + 1
+        if pause:
+            time.sleep(pause)
+
+    return updated
+
+
+def drop_legacy_columns(db):
+    cursor = db.connection.cursor()
+
+    # Linhas inseridas por versões antigas durante a migração
+    db.execute(cursor, 'migrate.pending', """
+        SELECT COUNT(*) FROM emails e
+        LEFT JOIN email_contents ec ON ec.email_id = e.id
+        WHERE ec.email_id IS NULL
+    """)
+    pending = cursor.fetchone()[0]
+    if pending:
+        print(f"{pending} emails ainda sem conteúdo migrado; execute novamente antes de remover as colunas")
+        return False
+
+    statements = []
+    if db.backend.index_exists(db, cursor, 'emails', 'ft_emails_subject_body'):
+        statements.append("DROP INDEX ft_emails_subject_body")
+    statements.append("DROP COLUMN body")
+    if db.column_info('emails', 'suggested_response'):
+        statements.append("DROP COLUMN suggested_response")
+
+    db.execute(cursor, 'migrate.drop_columns', f"ALTER TABLE emails {', '.join(statements)}, ALGORITHM=INPLACE, LOCK=NONE")
+    db.connection.commit()
+    print("Colunas antigas removidas de emails")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra o conteúdo dos emails para email_contents")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--sleep', type=float, default=0.05, help="pausa entre lotes (segundos)")
+    parser.add_argument('--drop-columns', action='store_true', help="remove body/suggested_response de emails ao final")
+    parser.add_argument('--reindex', action='store_true', help="refaz o texto pesquisável dos corpos comprimidos")
+    args = parser.parse_args()
+
+    db = Database()
+    if not db.connection or not db.connection.is_connected():
+        raise SystemExit(1)
+
+    if args.reindex:
+        updated = reindex_search_text(db, args.batch_size, args.sleep)
+        print(f"Texto pesquisável refeito em {updated} emails")
+        db.close()
+        return
+
+    if not db.legacy_content:
+        print("Nada a migrar: emails já não possui a coluna body")
+        return
+
+    moved = migrate(db, args.batch_size, args.sleep)
+    print(f"Migração concluída: {moved} emails movidos")
+
+    if args.drop_columns:
+        drop_legacy_columns(db)
+
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""Avaliação do classificador num corpus rotulado e portão de regressão do retreinamento.
+
+evaluate() mede um pipeline como ele é usado em produção (EmailClassifier):
+acurácia e F1 macro no corpus, latência p50/p99 de um email por vez, vazão
+em lotes de EVAL_BATCH_SIZE, tamanho do modelo serializado e tempo de carga.
+
+O corpus é o arquivo JSONL de EVAL_CORPUS_PATH (uma linha por email, com
+subject, body e category_id), separado dos dados de treino. Sem ele, os
+benchmarks usam EVAL_SIZE emails sintéticos de synthetic_emails.py.
+
+gate() compara o candidato de um retreinamento com o modelo em uso no mesmo
+corpus (o de EVAL_CORPUS_PATH ou, sem ele, o sintético) e o recusa se a
+acurácia, o F1 macro, a latência p50 ou o tamanho serializado piorarem além
+do limite (MODEL_GATE_*). A latência é medida em GATE_LATENCY_SAMPLES emails
+fixos, alternando os dois modelos para que a carga do worker pese igual nos
+dois, e com folga de MODEL_GATE_TIME_SLACK_MS. Vazão, p99 e tempo de carga
+ficam só nos benchmarks. Com MODEL_GATE_ENABLED=0 todo candidato é promovido.
+"""
+import json
+import os
+import pickle
+import time
+from functools import lru_cache
+
+from sklearn.metrics import accuracy_score, f1_score
+
+from ai_classifier import EmailClassifier
+from logs import get_logger
+from metrics import metrics
+from synthetic_emails import generate_emails
+
+MODEL_GATE_ENABLED = os.getenv('MODEL_GATE_ENABLED', '1') == '1'
+EVAL_CORPUS_PATH = os.getenv('EVAL_CORPUS_PATH')
+EVAL_SIZE = int(os.getenv('EVAL_SIZE', 1000))
+EVAL_SEED = 20240501  # diferente das sementes de treino dos benchmarks
+# Emails sintéticos curtos e com muitas palavras de outras categorias: um corpus fácil satura em 100%
+EVAL_SYNTHETIC = {'body_words': (5, 20), 'noise': 0.7}
+EVAL_BATCH_SIZE = int(os.getenv('EVAL_BATCH_SIZE', 500))
+# Emails classificados um a um para medir a latência
+EVAL_LATENCY_SAMPLES = int(os.getenv('EVAL_LATENCY_SAMPLES', 200))
+# Amostra fixa (os primeiros emails do corpus) da latência medida no portão
+GATE_LATENCY_SAMPLES = int(os.getenv('MODEL_GATE_LATENCY_SAMPLES', 50))
+
+# Piora máxima aceita: pontos absolutos para acurácia e F1; frações para tempo e tamanho
+GATE_THRESHOLDS = {
+    'accuracy': float(os.getenv('MODEL_GATE_MAX_ACCURACY_DROP', 0.01)),
+    'macro_f1': float(os.getenv('MODEL_GATE_MAX_F1_DROP', 0.01)),
+    'slowdown': float(os.getenv('MODEL_GATE_MAX_SLOWDOWN', 0.25)),
+    'size_growth': float(os.getenv('MODEL_GATE_MAX_SIZE_GROWTH', 0.5)),
+}
+# Diferenças de tempo abaixo disto (ms) são ruído de medição
+GATE_TIME_SLACK_MS = float(os.getenv('MODEL_GATE_TIME_SLACK_MS', 0.5))
+
+logger = get_logger('model_eval')
+
+
+@lru_cache(maxsize=4)
+def load_corpus(path=EVAL_CORPUS_PATH, size=EVAL_SIZE, seed=EVAL_SEED):
+    """Tupla de (subject, body, category_id) do arquivo JSONL ou do gerador sintético"""
+    if path:
+        with open(path, encoding='utf-8') as f:
+            return tuple((item['subject'], item['body'], int(item['category_id']))
+                         for item in map(json.loads, f) if item)
+
+    return tuple((subject, body, category_id)
+                 for _, subject, body, category_id in generate_emails(size, seed=seed, **EVAL_SYNTHETIC))
+
+
+def percentile(sorted_values, fraction):
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def evaluate(model, corpus, batch_size=EVAL_BATCH_SIZE, latency_samples=EVAL_LATENCY_SAMPLES, timings=True):
+    """Medidas do pipeline no corpus [(subject, body, category_id)]; timings=False mede só a qualidade"""
+    classifier = EmailClassifier(model=model)
+    emails = [(subject, body) for subject, body, _ in corpus]
+    labels = [category_id for _, _, category_id in corpus]
+
+    predictions = []
+    started = time.perf_counter()
+    for start in range(0, len(emails), batch_size):
+        predictions.extend(category_id for category_id, _ in classifier.classify_batch(emails[start:start + batch_size]))
+    elapsed = time.perf_counter() - started
+
+    quality = {
+        'emails': len(emails),
+        'accuracy': round(accuracy_score(labels, predictions), 4),
+        'macro_f1': round(f1_score(labels, predictions, average='macro', zero_division=0), 4),
+    }
+    if not timings:
+        return quality
+
+    latencies = []
+    for subject, body in emails[:latency_samples]:
+        started = time.perf_counter()
+        classifier.classify_email(subject, body)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+
+    data = pickle.dumps(model)
+    load_seconds = []
+    for _ in range(3):
+        started = time.perf_counter()
+        pickle.loads(data)
+        load_seconds.append(time.perf_counter() - started)
+
+    return {
+        **quality,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'batch_emails_per_second': round(len(emails) / elapsed, 1) if elapsed else 0.0,
+        'model_bytes': len(data),
+        'load_ms': round(min(load_seconds) * 1000, 3),
+    }
+
+
+def paired_latency(models, emails):
+    """Latência p50 (ms) de cada modelo, classificando cada email com um modelo depois do outro"""
+    classifiers = [EmailClassifier(model=model) for model in models]
+    for classifier in classifiers:
+        classifier.classify_email(*emails[0])  # aquecimento
+
+    latencies = [[] for _ in classifiers]
+    for subject, body in emails:
+        for classifier, measured in zip(classifiers, latencies):
+            started = time.perf_counter()
+            classifier.classify_email(subject, body)
+            measured.append(time.perf_counter() - started)
+    return [round(percentile(sorted(measured), 0.50) * 1000, 3) for measured in latencies]
+
+
+def regressions(baseline, candidate, thresholds=GATE_THRESHOLDS, slack_ms=GATE_TIME_SLACK_MS):
+    """Medidas em que o candidato piorou além do limite, em texto (lista vazia = aprovado); só as presentes nos dois"""
+    problems = []
+    for name in ('accuracy', 'macro_f1'):
+        if baseline[name] - candidate[name] > thresholds[name]:
+            problems.append(f"{name} {baseline[name]:.4f} -> {candidate[name]:.4f}")
+
+    for name in ('p50_ms', 'p99_ms', 'load_ms'):
+        if name in candidate and candidate[name] > baseline[name] * (1 + thresholds['slowdown']) + slack_ms:
+            problems.append(f"{name} {baseline[name]:.3f} -> {candidate[name]:.3f}")
+
+    name = 'batch_emails_per_second'
+    if name in candidate and candidate[name] * (1 + thresholds['slowdown']) < baseline[name]:
+        problems.append(f"{name} {baseline[name]:.1f} -> {candidate[name]:.1f}")
+
+    name = 'model_bytes'
+    if name in candidate and candidate[name] > baseline[name] * (1 + thresholds['size_growth']):
+        problems.append(f"{name} {baseline[name]} -> {candidate[name]}")
+    return problems
+
+
+def gate(current, candidate, corpus=None):
+    """Relatório {approved, regressions, baseline, candidate}; None se o portão está desligado ou sem modelo em uso"""
+    if not MODEL_GATE_ENABLED or current is None:
+        return None
+
+    corpus = corpus or load_corpus()
+    baseline = evaluate(current, corpus, timings=False)
+    result = evaluate(candidate, corpus, timings=False)
+    baseline['model_bytes'] = len(pickle.dumps(current))
+    result['model_bytes'] = len(pickle.dumps(candidate))
+    emails = [(subject, body) for subject, body, _ in corpus[:GATE_LATENCY_SAMPLES]]
+    baseline['p50_ms'], result['p50_ms'] = paired_latency([current, candidate], emails)
+    problems = regressions(baseline, result)
+
+    metrics.inc('model_promotions_total', result='rejected' if problems else 'approved')
+    logger.info("Portão do modelo: acurácia %.4f -> %.4f, F1 macro %.4f -> %.4f, p50 %.3f -> %.3f ms, %d -> %d bytes",
+                baseline['accuracy'], result['accuracy'], baseline['macro_f1'], result['macro_f1'],
+                baseline['p50_ms'], result['p50_ms'], baseline['model_bytes'], result['model_bytes'])
+    return {
+        'approved': not problems,
+        'regressions': problems,
+        'baseline': baseline,
+        'candidate': result,
+    }
@@ -0,0 +1,189 @@
+"""Perfil de requisições sob demanda.
+
+Com PROFILING_ENABLED=1, um admin pode perfilar uma requisição enviando o
+cabeçalho `X-Profile: cprofile` (cProfile + amostragem de pilhas) ou
+`X-Profile: sample` (só amostragem, menor overhead). PROFILE_SAMPLE_RATE
+(0 a 1) perfila também uma fração do tráfego. Cada perfil é gravado em
+PROFILE_DIR como dump do cProfile (.prof) e pilhas colapsadas (.folded,
+formato do flamegraph.pl / speedscope), e lido pelos endpoints /admin/profiles.
+
+Desligado, nenhum hook é registrado na aplicação.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_SAMPLE_MODE = os.getenv('PROFILE_SAMPLE_MODE', 'sample')
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL_MS', 5)) / 1000
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', 50))
+
+PROFILE_HEADER = 'X-Profile'
+
+_PROFILE_ID = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$')
+
+
+def requested_mode(header_value):
+    """Modo pedido pelo cabeçalho ('1' equivale a cprofile); None se inválido"""
+    value = (header_value or '').strip().lower()
+    if value in ('1', 'true', 'cprofile'):
+        return 'cprofile'
+    if value == 'sample':
+        return 'sample'
+    return None
+
+
+def sampled():
+    """Sorteio da fração de tráfego perfilada automaticamente"""
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+class StackSampler(threading.Thread):
+    """Amostra periodicamente a pilha de uma thread e conta as pilhas colapsadas"""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+
+            stack = ';'.join(reversed(names))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+
+class ProfileSession:
+    """Perfil de uma requisição, do before_request ao after_request"""
+
+    def __init__(self, mode, trigger):
+        self.mode = mode
+        self.trigger = trigger
+        self.profile_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.profiler = None
+        self.sampler = StackSampler(threading.get_ident())
+        self.started = None
+        self.elapsed = None
+
+    def start(self):
+        if self.mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # Outro profiler já ativo no interpretador: fica só a amostragem
+                self.profiler = None
+        self.sampler.start()
+        self.started = time.perf_counter()
+
+    def stop(self):
+        if self.elapsed is not None:
+            return
+        self.elapsed = time.perf_counter() - self.started
+        if self.profiler:
+            self.profiler.disable()
+        self.sampler.stop()
+
+    def save(self, **details):
+        """Grava .prof, .folded e os metadados em PROFILE_DIR"""
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, self.profile_id)
+
+        if self.profiler:
+            self.profiler.dump_stats(f"{base}.prof")
+        with open(f"{base}.folded", 'w', encoding='utf-8') as f:
+            f.write(self.sampler.collapsed())
+
+        meta = {
+            'id': self.profile_id,
+            'mode': 'cprofile' if self.profiler else 'sample',
+            'trigger': self.trigger,
+            'duration_ms': round(self.elapsed * 1000, 2),
+            'samples': self.sampler.samples,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            **details,
+        }
+        with open(f"{base}.json", 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+        prune()
+        return meta
+
+
+def prune(max_files=PROFILE_MAX_FILES):
+    """Mantém apenas os perfis mais recentes"""
+    profiles = list_profiles()
+    for meta in profiles[max_files:]:
+        for kind in ('prof', 'folded', 'json'):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, f"{meta['id']}.{kind}"))
+            except OSError:
+                pass
+
+
+def list_profiles():
+    """Metadados dos perfis gravados, do mais recente ao mais antigo"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+
+    profiles = []
+    for filename in os.listdir(PROFILE_DIR):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, filename), encoding='utf-8') as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(profiles, key=lambda meta: meta['id'], reverse=True)
+
+
+def profile_path(profile_id, kind):
+    """Caminho do arquivo do perfil, ou None se o ID/tipo for inválido ou não existir"""
+    if not _PROFILE_ID.match(profile_id) or kind not in ('prof', 'folded'):
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.{kind}")
+    return path if os.path.exists(path) else None
+
+
+def summary(profile_id, limit=40):
+    """Funções com maior tempo acumulado (texto do pstats), ou None sem dump do cProfile"""
+    path = profile_path(profile_id, 'prof')
+    if not path:
+        return None
+
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
@@ -0,0 +1,258 @@
+"""Controle de admissão das operações caras: limite de taxa por usuário e de inferências simultâneas.
+
+Cada operação pertence a uma classe (auth, classify, bulk, admin) com um
+orçamento próprio, um token bucket por usuário (ou por IP, sem login):
+RATE_LIMIT_<CLASSE>="requisições/segundos", por exemplo RATE_LIMIT_CLASSIFY=120/60
+(rajada de até 120, reposição de 2 por segundo); "0" desliga a classe.
+Os buckets ficam na memória do processo; com RATE_LIMIT_REDIS_URL (e o pacote
+redis instalado) passam a ser compartilhados entre workers e servidores.
+
+INFERENCE_MAX_CONCURRENCY limita as chamadas ao classificador em andamento ao
+mesmo tempo neste processo. A vaga cobre só a inferência (inference()), não a
+gravação nem a espera do group commit; sem vaga em INFERENCE_QUEUE_WAIT
+segundos, a requisição é recusada.
+"""
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+
+from graphql import parse
+from graphql.language.ast import Field, OperationDefinition
+
+from logs import get_logger
+from metrics import metrics
+
+logger = get_logger('ratelimit')
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1') == '1'
+RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL')
+INFERENCE_MAX_CONCURRENCY = int(os.getenv('INFERENCE_MAX_CONCURRENCY', os.cpu_count() or 1))
+INFERENCE_QUEUE_WAIT = float(os.getenv('INFERENCE_QUEUE_WAIT', 0.5))
+# Retry-After sugerido quando todas as vagas de inferência estão ocupadas
+INFERENCE_RETRY_AFTER = 1
+
+DEFAULT_LIMITS = {
+    'auth': '10/60',       # login e cadastro, por IP
+    'classify': '120/60',  # classificação de um email
+    'bulk': '10/60',       # upload em lote, classifyEmails, addFeedbackBatch
+    'admin': '30/60',      # retreino, reclassificação e estatísticas
+}
+
+# Operação -> classe
+ROUTE_OPERATIONS = {
+    '/upload_emails': 'bulk',
+    '/retrain': 'admin',
+    '/stats': 'admin',
+}
+GRAPHQL_OPERATIONS = {
+    'loginUser': 'auth',
+    'registerUser': 'auth',
+    'classifyEmail': 'classify',
+    'classifyEmails': 'bulk',
+    'addFeedbackBatch': 'bulk',
+    'reclassifyEmails': 'admin',
+}
+
+
+def parse_limit(value):
+    """(capacidade, reposição por segundo) de "requisições/segundos"; None se desligado"""
+    requests, _, seconds = value.partition('/')
+    requests = float(requests)
+    seconds = float(seconds or 1)
+    if requests <= 0 or seconds <= 0:
+        return None
+    return requests, requests / seconds
+
+
+def load_limits():
+    limits = {}
+    for operation_class, default in DEFAULT_LIMITS.items():
+        limit = parse_limit(os.getenv(f'RATE_LIMIT_{operation_class.upper()}', default))
+        if limit:
+            limits[operation_class] = limit
+    return limits
+
+
+@lru_cache(maxsize=512)
+def graphql_fields(query, operation_name=None):
+    """Campos de nível superior (com repetições) da operação pedida; () se a consulta não é válida"""
+    try:
+        document = parse(query)
+    except Exception:
+        return ()
+
+    operations = [d for d in document.definitions if isinstance(d, OperationDefinition)]
+    if operation_name:
+        operations = [o for o in operations if o.name and o.name.value == operation_name]
+    if len(operations) != 1:
+        return ()
+    return tuple(s.name.value for s in operations[0].selection_set.selections if isinstance(s, Field))
+
+
+def classify_operations(route, query=None, operation_name=None):
+    """{classe: custo} de uma requisição"""
+    if route == '/graphql':
+        operations = [GRAPHQL_OPERATIONS[field] for field in graphql_fields(query, operation_name)
+                      if field in GRAPHQL_OPERATIONS] if query else []
+    else:
+        operations = [ROUTE_OPERATIONS[route]] if route in ROUTE_OPERATIONS else []
+
+    costs = {}
+    for operation_class in operations:
+        costs[operation_class] = costs.get(operation_class, 0) + 1
+    return costs
+
+
+class LocalBuckets:
+    """Buckets na memória do processo"""
+
+    # Acima disso, os buckets já cheios de novo são descartados
+    MAX_KEYS = 10000
+
+    def __init__(self):
+        self._buckets = {}  # chave -> [tokens, atualizado em, cheio em]
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, cost):
+        """Consome `cost` tokens; retorna 0 ou os segundos até haver tokens suficientes"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.MAX_KEYS:
+                    self._prune(now)
+                bucket = self._buckets[key] = [capacity, now, now]
+
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            wait = 0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            bucket[:] = [tokens, now, now + (capacity - tokens) / rate]
+            return wait
+
+    def _prune(self, now):
+        # Um bucket cheio equivale a um bucket que não existe
+        for key in [key for key, bucket in self._buckets.items() if bucket[2] <= now]:
+            del self._buckets[key]
+
+
+class RedisBuckets:
+    """Buckets compartilhados num Redis; o script roda atomicamente com o relógio do servidor"""
+
+    SCRIPT = """
+        local capacity = tonumber(ARGV[1])
+        local rate = tonumber(ARGV[2])
+        local cost = tonumber(ARGV[3])
+        local clock = redis.call('TIME')
+        local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(state[1]) or capacity
+        local updated = tonumber(state[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+        local wait = 0
+        if tokens >= cost then
+            tokens = tokens - cost
+        else
+            wait = (cost - tokens) / rate
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+        return tostring(wait)
+    """
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.25)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def take(self, key, capacity, rate, cost):
+        return float(self.script(keys=[f'ratelimit:{key}'], args=[capacity, rate, cost]))
+
+
+class Shed(Exception):
+    """Requisição recusada pelo controle de admissão"""
+
+    def __init__(self, operation_class, reason, retry_after):
+        super().__init__(f"{operation_class}: {reason}")
+        self.operation_class = operation_class
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AdmissionControl:
+    def __init__(self, limits, max_inference=INFERENCE_MAX_CONCURRENCY, redis_url=RATE_LIMIT_REDIS_URL):
+        self.limits = limits
+        self.buckets = LocalBuckets()
+        self.shared = None
+        if redis_url:
+            if redis is None:
+                logger.warning("RATE_LIMIT_REDIS_URL definido, mas o pacote redis não está instalado; usando buckets locais")
+            else:
+                self.shared = RedisBuckets(redis_url)
+        self.inference_slots = threading.BoundedSemaphore(max_inference) if max_inference > 0 else None
+
+    def _take(self, key, capacity, rate, cost):
+        if self.shared:
+            try:
+                return self.shared.take(key, capacity, rate, cost)
+            except Exception as e:
+                # Redis fora do ar: o limite continua valendo por processo
+                logger.error("Erro no limite de taxa compartilhado: %s", e)
+                metrics.inc('errors_total', component='ratelimit')
+        return self.buckets.take(key, capacity, rate, cost)
+
+    def check_rate(self, costs, key):
+        """Consome o orçamento de cada classe; Shed se alguma estiver esgotada"""
+        for operation_class, cost in costs.items():
+            limit = self.limits.get(operation_class)
+            if not limit:
+                continue
+            capacity, rate = limit
+            wait = self._take(f'{operation_class}:{key}', capacity, rate, cost)
+            if wait:
+                metrics.inc('requests_shed_total', operation_class=operation_class, reason='rate_limit')
+                raise Shed(operation_class, 'rate_limit', wait)
+
+    def acquire_inference(self, operation_class):
+        """Ocupa uma vaga de inferência (devolva com release_inference); Shed se não houver"""
+        if self.inference_slots is None:
+            return False
+        if INFERENCE_QUEUE_WAIT > 0:
+            acquired = self.inference_slots.acquire(timeout=INFERENCE_QUEUE_WAIT)
+        else:
+            acquired = self.inference_slots.acquire(blocking=False)
+        if not acquired:
+            metrics.inc('requests_shed_total', operation_class=operation_class, reason='concurrency')
+            raise Shed(operation_class, 'concurrency', INFERENCE_RETRY_AFTER)
+        return True
+
+    def release_inference(self):
+        self.inference_slots.release()
+
+    @contextmanager
+    def inference(self, operation_class):
+        """Vaga de inferência durante o bloco; Shed se não houver"""
+        acquired = self.acquire_inference(operation_class)
+        try:
+            yield
+        finally:
+            if acquired:
+                self.release_inference()
+
+
+# Instância compartilhada pelo processo
+admission = AdmissionControl(load_limits()) if RATE_LIMIT_ENABLED else None
+
+
+def inference(operation_class):
+    """Envolve a chamada ao classificador (sem efeito com o controle de admissão desligado)"""
+    return admission.inference(operation_class) if admission else nullcontext()
@@ -0,0 +1,317 @@
+"""Reclassificação em massa dos emails gravados, depois de uma atualização do modelo.
+
+Uso:
+    python reclassify.py [--batch-size 1000] [--sleep 0.05] [--max-rate 2000] [--restart] [--workers 8]
+
+Percorre emails pela chave primária em lotes; cada lote é classificado numa
+única chamada ao modelo e só as linhas que mudaram são gravadas, com um
+UPDATE ... JOIN contra uma tabela temporária. Cada lote é uma transação curta
+que também grava o ponto de parada em system_state: uma execução interrompida
+continua de onde parou, desde que o modelo seja o mesmo. Admins também podem
+iniciar pela mutation reclassifyEmails e acompanhar por reclassifyStatus.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import classify_pool
+from ai_classifier import EmailClassifier
+from content_store import unpack_body
+from database import Database
+from logs import event, get_logger
+from metrics import metrics
+from response_templates import templates
+from storage import Error
+
+logger = get_logger('reclassify')
+
+RECLASSIFY_BATCH_SIZE = int(os.getenv('RECLASSIFY_BATCH_SIZE', 1000))
+RECLASSIFY_PAUSE = float(os.getenv('RECLASSIFY_PAUSE', 0.05))
+# Linhas por segundo (0 = sem limite), para não disputar o banco com o tráfego
+RECLASSIFY_MAX_RATE = float(os.getenv('RECLASSIFY_MAX_RATE', 0))
+RECLASSIFY_LOCK_NAME = 'email_reclassifier'
+CHECKPOINT_NAME = 'reclassify_checkpoint'
+
+STAGING_TABLE = 'reclassify_staging'
+STAGED_COLUMNS = ['category_id', 'confidence_score', 'response_template_id']
+# confidence_score é FLOAT: diferenças menores que isto não são regravadas
+CONFIDENCE_TOLERANCE = 1e-4
+
+
+class Progress:
+    """Andamento da execução atual (ou da última) neste processo"""
+
+    def __init__(self):
+        self.running = False
+        self.processed = 0
+        self.changed = 0
+        self.first_id = 0
+        self.last_id = 0
+        self.max_id = 0
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+
+    def start(self, first_id, max_id):
+        self.__init__()
+        self.running = True
+        self.first_id = self.last_id = first_id
+        self.max_id = max_id
+        self.started_at = time.time()
+
+    def rows_per_second(self):
+        if not self.started_at:
+            return 0.0
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def percent(self):
+        """Estimativa pelo intervalo de IDs percorrido"""
+        total = self.max_id - self.first_id
+        if total <= 0:
+            return 100.0
+        return min(100.0, (self.last_id - self.first_id) * 100.0 / total)
+
+    def as_dict(self):
+        return {
+            'running': self.running,
+            'processed': self.processed,
+            'changed': self.changed,
+            'last_id': self.last_id,
+            'max_id': self.max_id,
+            'percent': round(self.percent(), 1),
+            'rows_per_second': round(self.rows_per_second(), 1),
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat(timespec='seconds') if self.started_at else None,
+            'finished_at': datetime.fromtimestamp(self.finished_at).isoformat(timespec='seconds') if self.finished_at else None,
+            'error': self.error,
+        }
+
+
+# Instância compartilhada pelo processo
+progress = Progress()
+_start_lock = threading.Lock()
+
+
+def model_version(classifier):
+    """Identifica o modelo salvo; o ponto de parada só vale para o mesmo modelo"""
+    try:
+        return str(int(os.path.getmtime(classifier.model_path)))
+    except OSError:
+        return None
+
+
+def load_checkpoint(db, cursor, version):
+    """Último ID já reclassificado com este modelo (0 para começar do início)"""
+    db.execute(cursor, 'system_state.reclassify_checkpoint', "SELECT value FROM system_state WHERE name = %s",
+               (CHECKPOINT_NAME,))
+    row = cursor.fetchone()
+    if not row or not row[0]:
+        return 0
+    checkpoint = json.loads(row[0])
+    return checkpoint['last_id'] if checkpoint.get('model') == version else 0
+
+
+def save_checkpoint(db, cursor, version, last_id):
+    db.execute(cursor, 'system_state.set_reclassify_checkpoint', """
+        INSERT INTO system_state (name, value) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE value = VALUES(value)
+    """, (CHECKPOINT_NAME, json.dumps({'model': version, 'last_id': last_id})))
+
+
+def reclassify_batch(db, connection, classifier, after_id, max_id, version, batch_size=RECLASSIFY_BATCH_SIZE):
+    """Reclassifica os próximos batch_size emails após after_id; retorna (lidos, alterados, último ID)"""
+    cursor = connection.cursor()
+
+    def select():
+        legacy_body = "e.body" if db.legacy_content else "NULL"
+        db.execute(cursor, 'reclassify.select_batch', f"""
+            SELECT e.id, e.subject, ec.body, ec.body_compressed, {legacy_body},
+                   e.category_id, e.confidence_score
+            FROM emails e
+            LEFT JOIN email_contents ec ON ec.email_id = e.id
+            WHERE e.id > %s AND e.id <= %s
+            ORDER BY e.id
+            LIMIT %s
+        """, (after_id, max_id, batch_size))
+        return cursor.fetchall()
+
+    try:
+        try:
+            rows = select()
+        except Error as e:
+            if not db.legacy_content_gone(e):
+                raise
+            rows = select()
+
+        if not rows:
+            connection.rollback()
+            return 0, 0, after_id
+
+        # Uma única inferência para o lote inteiro (dividida entre os processos do pool, se houver)
+        predictions = classify_pool.classify_batch(classifier, [
+            (subject, unpack_body(body_text, body_compressed) if body_text is not None else legacy)
+            for _, subject, body_text, body_compressed, legacy, _, _ in rows
+        ])
+
+        staged = []
+        for row, (category_id, confidence) in zip(rows, predictions):
+            email_id, old_category_id, old_confidence = row[0], row[5], row[6]
+            if (category_id != old_category_id or old_confidence is None
+                    or abs(float(old_confidence) - confidence) > CONFIDENCE_TOLERANCE):
+                staged.append((email_id, category_id, confidence, templates.template_id_for(db, category_id)))
+
+        if staged:
+            db.executemany(cursor, 'reclassify.stage', f"""
+                INSERT INTO {STAGING_TABLE} (id, {', '.join(STAGED_COLUMNS)}) VALUES (%s, %s, %s, %s)
+            """, staged)
+            db.backend.update_from(db, cursor, 'reclassify.apply', 'emails', STAGING_TABLE, STAGED_COLUMNS)
+            db.execute(cursor, 'reclassify.clear_staging', f"DELETE FROM {STAGING_TABLE}")
+
+        last_id = rows[-1][0]
+        save_checkpoint(db, cursor, version, last_id)
+        connection.commit()
+        return len(rows), len(staged), last_id
+
+    except Exception:
+        connection.rollback()
+        raise
+
+
+def run_reclassify(db, connection, classifier, batch_size=RECLASSIFY_BATCH_SIZE, pause=RECLASSIFY_PAUSE,
+                   max_rate=RECLASSIFY_MAX_RATE, restart=False):
+    """Reclassifica os emails existentes lote a lote, com pausa entre lotes e limite de vazão"""
+    cursor = connection.cursor()
+    version = model_version(classifier)
+    after_id = 0 if restart else load_checkpoint(db, cursor, version)
+
+    # Emails gravados depois do início já foram classificados pelo modelo atual
+    db.execute(cursor, 'reclassify.max_id', "SELECT MAX(id) FROM emails")
+    max_id = cursor.fetchone()[0] or 0
+
+    db.execute(cursor, 'reclassify.create_staging', f"""
+        CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} (
+            id INT PRIMARY KEY,
+            category_id INT,
+            confidence_score FLOAT,
+            response_template_id INT
+        )
+    """)
+    connection.commit()
+
+    progress.start(after_id, max_id)
+    if after_id:
+        logger.info("Reclassificação: retomando após o email %s", after_id)
+
+    while True:
+        started = time.time()
+        rows, changed, after_id = reclassify_batch(db, connection, classifier, after_id, max_id, version, batch_size)
+
+        progress.processed += rows
+        progress.changed += changed
+        progress.last_id = after_id
+        metrics.inc('reclassified_emails_total', changed, result='changed')
+        metrics.inc('reclassified_emails_total', rows - changed, result='unchanged')
+        if rows:
+            logger.info("Lote até o email %s: %d linhas, %d alteradas (%d no total, %.0f linhas/s, %.1f%%)",
+                        after_id, rows, changed, progress.processed, progress.rows_per_second(), progress.percent(),
+                        extra=event('reclassify.batch', last_id=after_id, rows=rows, changed=changed))
+
+        if rows < batch_size:
+            break
+
+        wait = pause
+        if max_rate:
+            wait = max(wait, rows / max_rate - (time.time() - started))
+        if wait > 0:
+            time.sleep(wait)
+
+    # Execução completa: a próxima começa do início
+    db.execute(cursor, 'system_state.clear_reclassify_checkpoint', "DELETE FROM system_state WHERE name = %s",
+               (CHECKPOINT_NAME,))
+    connection.commit()
+
+    progress.running = False
+    progress.finished_at = time.time()
+    return progress.processed, progress.changed
+
+
+def reclassify_with_lock(db, classifier, **options):
+    """run_reclassify com conexão própria e trava entre processos; False se outra execução está ativa"""
+    connection = db.open_connection()
+    try:
+        cursor = connection.cursor()
+        if not db.backend.try_lock(db, cursor, RECLASSIFY_LOCK_NAME):
+            return False
+        try:
+            run_reclassify(db, connection, classifier, **options)
+        finally:
+            db.backend.release_lock(db, cursor, RECLASSIFY_LOCK_NAME)
+        return True
+    finally:
+        if connection.is_connected():
+            connection.close()
+
+
+class Reclassifier(threading.Thread):
+    """Executa a reclassificação em segundo plano (iniciada pela mutation de admin)"""
+
+    def __init__(self, db, classifier, restart=False):
+        super().__init__(name='email-reclassifier', daemon=True)
+        self.db = db
+        self.classifier = classifier
+        self.restart = restart
+
+    def run(self):
+        try:
+            if not reclassify_with_lock(self.db, self.classifier, restart=self.restart):
+                progress.error = "Outra reclassificação está em andamento"
+        except Exception as e:
+            logger.exception("Erro na reclassificação: %s", e)
+            metrics.inc('errors_total', component='reclassify')
+            progress.error = str(e)
+        finally:
+            progress.running = False
+
+
+def start_reclassifier(db, classifier, restart=False):
+    """Inicia a reclassificação em segundo plano; None se já há uma em andamento neste processo"""
+    with _start_lock:
+        if progress.running:
+            return None
+        progress.start(0, 0)
+        reclassifier = Reclassifier(db, classifier, restart)
+        reclassifier.start()
+        return reclassifier
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reclassifica os emails gravados com o modelo atual")
+    parser.add_argument('--batch-size', type=int, default=RECLASSIFY_BATCH_SIZE)
+    parser.add_argument('--sleep', type=float, default=RECLASSIFY_PAUSE, help="pausa entre lotes (segundos)")
+    parser.add_argument('--max-rate', type=float, default=RECLASSIFY_MAX_RATE, help="máximo de linhas/s (0 = sem limite)")
+    parser.add_argument('--restart', action='store_true', help="ignora o ponto de parada e começa do início")
+    parser.add_argument('--workers', type=int, default=classify_pool.CLASSIFY_WORKERS,
+                        help="processos de classificação (1 = sem pool)")
+    args = parser.parse_args()
+
+    db = Database()
+    if not db.connection or not db.connection.is_connected():
+        raise SystemExit(1)
+
+    classifier = EmailClassifier()
+    classify_pool.start_pool(classifier, args.workers)
+    if not reclassify_with_lock(db, classifier, batch_size=args.batch_size, pause=args.sleep,
+                                max_rate=args.max_rate, restart=args.restart):
+        print("Outra reclassificação está em andamento")
+        raise SystemExit(1)
+
+    print(f"Reclassificação concluída: {progress.processed} emails, {progress.changed} alterados, "
+          f"{progress.rows_per_second():.0f} linhas/s")
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Réplicas de leitura do MySQL.
+
+DB_REPLICAS lista as réplicas ("host[:porta],host[:porta]"); usuário e senha
+são os do primário, a menos que DB_REPLICA_USER/DB_REPLICA_PASSWORD sejam
+definidos. O atraso de cada réplica é medido com SHOW REPLICA STATUS a cada
+DB_REPLICA_CHECK_INTERVAL segundos; réplicas fora do ar, com a replicação
+parada ou atrasadas demais para a rota pedida não recebem leituras.
+"""
+import os
+import threading
+import time
+
+from logs import get_logger
+from metrics import metrics
+from storage import Error
+
+logger = get_logger('db.replicas')
+
+DB_REPLICAS = os.getenv('DB_REPLICAS', '')
+# Atraso máximo aceito por rota de leitura (segundos)
+REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', 5))
+ANALYTICS_MAX_LAG = float(os.getenv('DB_ANALYTICS_MAX_LAG', 300))
+REPLICA_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_CHECK_INTERVAL', 5))
+
+ROUTE_MAX_LAG = {
+    'replica': REPLICA_MAX_LAG,      # leituras da aplicação
+    'analytics': ANALYTICS_MAX_LAG,  # painel, estatísticas e exportações
+}
+
+
+def parse_replicas(value):
+    """[(host, porta)] a partir de "host[:porta],..." """
+    replicas = []
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.partition(':')
+        replicas.append((host, int(port or 3306)))
+    return replicas
+
+
+class Replica:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.lag = None         # segundos; None = desconhecido/indisponível
+        self.checked_at = 0
+        self.monitor = None     # conexão usada só para medir o atraso
+
+    @property
+    def name(self):
+        return f"{self.host}:{self.port}"
+
+
+class ReplicaSet:
+    """Escolhe, por thread, uma réplica saudável para cada leitura"""
+
+    def __init__(self, backend, replicas):
+        self.backend = backend
+        self.replicas = [Replica(host, port) for host, port in replicas]
+        self.user = os.getenv('DB_REPLICA_USER')
+        self.password = os.getenv('DB_REPLICA_PASSWORD')
+        self._local = threading.local()
+        self._check_lock = threading.Lock()
+        self._checked_at = 0
+        self._next = 0
+
+    @classmethod
+    def from_env(cls, backend):
+        """None se não há réplicas configuradas (ou o backend não as suporta)"""
+        replicas = parse_replicas(DB_REPLICAS)
+        if not replicas or backend.name != 'mysql':
+            return None
+        return cls(backend, replicas)
+
+    def open_connection(self, replica):
+        # Autocommit: cada leitura vê o estado atual da réplica. Numa transação aberta, o REPEATABLE READ
+        # manteria o snapshot da primeira consulta da thread, mais antigo que o atraso medido
+        return self.backend.connect(host=replica.host, port=replica.port,
+                                    user=self.user, password=self.password, autocommit=True)
+
+    def measure_lag(self, replica):
+        """Seconds_Behind_Source da réplica (None se parada ou inacessível)"""
+        try:
+            if replica.monitor is None or not replica.monitor.is_connected():
+                replica.monitor = self.open_connection(replica)
+            cursor = replica.monitor.cursor()
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except Error:
+                # MySQL anterior ao 8.0.22
+                cursor.execute("SHOW SLAVE STATUS")
+            row = cursor.fetchone()
+            if not row:
+                return None
+            status = dict(zip([column[0] for column in cursor.description], row))
+            lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+            return float(lag) if lag is not None else None
+        except Error as e:
+            logger.error("Erro ao medir atraso da réplica %s: %s", replica.name, e)
+            replica.monitor = None
+            return None
+
+    def refresh(self):
+        """Atualiza o atraso das réplicas, no máximo uma vez por intervalo e sem bloquear leitores"""
+        if time.time() - self._checked_at < REPLICA_CHECK_INTERVAL:
+            return
+        if not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            for replica in self.replicas:
+                replica.lag = self.measure_lag(replica)
+                replica.checked_at = time.time()
+                if replica.lag is not None:
+                    metrics.observe('db_replica_lag_seconds', replica.lag, replica=replica.name)
+            self._checked_at = time.time()
+        finally:
+            self._check_lock.release()
+
+    def eligible(self, replica, max_lag):
+        if replica.lag is None:
+            return False
+        # A medição envelhece: o atraso real pode ter crescido desde a última verificação
+        return replica.lag + (time.time() - replica.checked_at) <= max_lag
+
+    def connection(self, max_lag):
+        """Conexão desta thread com uma réplica dentro de max_lag, ou None"""
+        self.refresh()
+
+        current = getattr(self._local, 'replica', None)
+        if current and self.eligible(current, max_lag):
+            connection = self._local.connection
+            if connection.is_connected():
+                return connection
+
+        candidates = [replica for replica in self.replicas if self.eligible(replica, max_lag)]
+        if not candidates:
+            return None
+
+        # Distribui as threads entre as réplicas saudáveis
+        self._next = (self._next + 1) % len(candidates)
+        replica = candidates[self._next]
+        try:
+            connection = self.open_connection(replica)
+        except Error as e:
+            logger.error("Erro ao conectar com a réplica %s: %s", replica.name, e)
+            replica.lag = None
+            return None
+
+        previous = getattr(self._local, 'connection', None)
+        if previous and previous.is_connected():
+            previous.close()
+        self._local.replica = replica
+        self._local.connection = connection
+        return connection
@@ -0,0 +1,130 @@
+import threading
+import time
+
+from metrics import metrics
+
+# Modelos de resposta por categoria ({subject} é substituído pelo assunto)
+RESPONSE_TEMPLATES = {
+    1: "Obrigado por entrar em contato sobre '{subject}'. Nossa equipe de suporte técnico analisará sua solicitação e retornará em até 24 horas com uma solução.",
+    2: "Agradecemos seu interesse em nossos produtos/serviços. Um consultor comercial entrará em contato em breve para apresentar uma proposta personalizada sobre '{subject}'.",
+    3: "Obrigado pelo seu interesse em nossa campanha. Acompanhe nossas redes sociais e newsletter para mais novidades sobre '{subject}'.",
+    4: "Recebemos sua mensagem sobre '{subject}'. O setor de RH analisará sua solicitação e retornará o contato conforme necessário.",
+    5: "Sua solicitação financeira sobre '{subject}' foi recebida. O departamento financeiro processará a informação e retornará em até 2 dias úteis.",
+    6: "Obrigado por entrar em contato sobre '{subject}'. Analisaremos sua mensagem e retornaremos o contato conforme apropriado."
+}
+
+def render_response(template, subject):
+    """Substitui {subject} sem interpretar outras chaves do texto"""
+    return template.replace('{subject}', subject or '')
+
+# Tempo máximo que um worker usa a cópia local dos modelos antes de recarregar
+TEMPLATE_CACHE_TTL = 60
+
+
+class ResponseTemplates:
+    """Modelos de resposta versionados, guardados uma vez no banco e cacheados por processo"""
+
+    def __init__(self, ttl=TEMPLATE_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = 0
+        self._by_id = {}        # template_id -> (category_id, version, body)
+        self._by_category = {}  # category_id -> template_id
+
+    def _load(self, db):
+        cursor = db.connection.cursor()
+        db.execute(cursor, 'templates.load', """
+            SELECT t.id, t.category_id, t.current_version, v.body
+            FROM response_templates t
+            JOIN response_template_versions v
+              ON v.template_id = t.id AND v.version = t.current_version
+        """)
+
+        by_id = {}
+        by_category = {}
+        for template_id, category_id, version, body in cursor.fetchall():
+            by_id[template_id] = (category_id, version, body)
+            by_category[category_id] = template_id
+
+        with self._lock:
+            self._by_id = by_id
+            self._by_category = by_category
+            self._loaded_at = time.time()
+
+    def _ensure_loaded(self, db):
+        if time.time() - self._loaded_at > self.ttl:
+            metrics.inc('cache_requests_total', cache='response_templates', result='miss')
+            self._load(db)
+        else:
+            metrics.inc('cache_requests_total', cache='response_templates', result='hit')
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = 0
+
+    def template_id_for(self, db, category_id):
+        """ID do modelo ativo da categoria (None se não houver)"""
+        self._ensure_loaded(db)
+        return self._by_category.get(category_id)
+
+    def render(self, db, template_id, subject):
+        self._ensure_loaded(db)
+        template = self._by_id.get(template_id)
+        if not template:
+            # Modelo criado por outro worker depois do último carregamento
+            self._load(db)
+            template = self._by_id.get(template_id)
+        if not template:
+            return None
+        return render_response(template[2], subject)
+
+    def list(self, db):
+        self._ensure_loaded(db)
+        return [(template_id,) + template for template_id, template in sorted(self._by_id.items())]
+
+    def update(self, db, category_id, body):
+        """Cria uma nova versão do modelo da categoria; emails existentes passam a usá-la sem reescrita"""
+        cursor = db.connection.cursor()
+
+        try:
+            db.execute(cursor, 'templates.lock', "SELECT id FROM response_templates WHERE category_id = %s FOR UPDATE", (category_id,))
+            row = cursor.fetchone()
+
+            if row:
+                template_id = row[0]
+                db.execute(
+                    cursor, 'templates.next_version',
+                    "SELECT COALESCE(MAX(version), 0) + 1 FROM response_template_versions WHERE template_id = %s",
+                    (template_id,)
+                )
+                version = cursor.fetchone()[0]
+            else:
+                db.execute(
+                    cursor, 'templates.insert',
+                    "INSERT INTO response_templates (category_id, current_version) VALUES (%s, %s)",
+                    (category_id, 1)
+                )
+                template_id = cursor.lastrowid
+                version = 1
+
+            db.execute(
+                cursor, 'templates.insert_version',
+                "INSERT INTO response_template_versions (template_id, version, body) VALUES (%s, %s, %s)",
+                (template_id, version, body)
+            )
+            db.execute(
+                cursor, 'templates.set_version',
+                "UPDATE response_templates SET current_version = %s WHERE id = %s",
+                (version, template_id)
+            )
+            db.connection.commit()
+        except Exception:
+            db.connection.rollback()
+            raise
+
+        self.invalidate()
+        return template_id, version
+
+
+# Instância compartilhada pelo processo
+templates = ResponseTemplates()
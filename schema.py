@@ -4,6 +4,25 @@ from graphene import ObjectType, String, Int, Float, Boolean, List, Field
 import jwt
 from datetime import datetime, timedelta
 import bcrypt
+from graphql.language.ast import FragmentSpread, InlineFragment
+from content_store import load_contents
+from ingest import (dedup_key, find_existing, suggested_response_for, insert_email, classify_and_insert,
+                    CLASSIFY_BATCH_MAX_SIZE)
+from response_templates import templates
+from feedback import insert_feedback, insert_feedback_batch, FEEDBACK_BATCH_MAX_SIZE
+import reclassify
+import events
+import group_commit
+from archive import parse_date, reaches_archive, archive_horizon
+from logs import get_logger
+from metrics import metrics, SIZE_BUCKETS
+from ratelimit import inference, Shed
+import classify_pool
+from search import (extract_terms, encode_cursor, decode_cursor, legacy_search_source,
+                    make_snippet, SEARCH_MAX_PAGE_SIZE, SEARCH_MAX_RESULTS)
+from storage import Error
+
+logger = get_logger('graphql')
 
 # Models
 class User(ObjectType):
@@ -29,9 +48,22 @@ class Email(ObjectType):
     category_name = String()
     confidence_score = Float()
     suggested_response = String()
+    response_template_id = Int()
     user_id = Int()
     is_processed = Boolean()
     created_at = String()
+    
+    def resolve_suggested_response(self, info):
+        # Texto gravado (linhas antigas ou personalizadas) tem prioridade sobre o modelo
+        if self.suggested_response is not None or not self.response_template_id:
+            return self.suggested_response
+        return templates.render(info.context.db, self.response_template_id, self.subject)
+
+class ResponseTemplate(ObjectType):
+    id = Int()
+    category_id = Int()
+    version = Int()
+    body = String()
 
 class Feedback(ObjectType):
     id = Int()
@@ -42,11 +74,146 @@ class Feedback(ObjectType):
     feedback_text = String()
     created_at = String()
 
+class SearchHit(ObjectType):
+    email = Field(Email)
+    score = Float()
+    snippet = String()
+    cursor = String()
+
+class SearchResults(ObjectType):
+    hits = List(SearchHit)
+    end_cursor = String()
+    has_next_page = Boolean()
+
+class ClassifyEmailResult(ObjectType):
+    index = Int()
+    email = Field(Email)
+    duplicate = Boolean()
+    error = String()
+
+class EmailInput(graphene.InputObjectType):
+    sender = String(required=True)
+    subject = String(required=True)
+    body = String(required=True)
+    message_id = String()
+
+class ReclassifyStatus(ObjectType):
+    running = Boolean()
+    processed = Int()
+    changed = Int()
+    last_id = Int()
+    max_id = Int()
+    percent = Float()
+    rows_per_second = Float()
+    started_at = String()
+    finished_at = String()
+    error = String()
+
+class FeedbackInput(graphene.InputObjectType):
+    email_id = Int(required=True)
+    corrected_category_id = Int(required=True)
+    feedback_text = String()
+
 class AuthPayload(ObjectType):
     token = String()
     user = Field(User)
     message = String()
 
+# Leitura de emails
+EMAIL_COLUMNS = """e.id, e.sender, e.subject, e.category_id, c.name,
+                   e.confidence_score, e.user_id, e.is_processed, e.created_at,
+                   e.response_template_id"""
+
+# Busca por ID, uma instrução preparada por tabela (ver Database.execute_prepared)
+EMAIL_BY_ID_SQL = {table: f"""
+    SELECT {EMAIL_COLUMNS}
+    FROM {table} e
+    LEFT JOIN categories c ON e.category_id = c.id
+    WHERE e.id = %s
+""" for table in ('emails', 'emails_archive')}
+
+EMAIL_BY_ID_USER_SQL = {table: f"{sql.rstrip()} AND e.user_id = %s\n"
+                        for table, sql in EMAIL_BY_ID_SQL.items()}
+
+def email_from_row(row):
+    """Monta um Email a partir das colunas de EMAIL_COLUMNS (sem conteúdo)"""
+    return Email(
+        id=row[0],
+        sender=row[1],
+        subject=row[2],
+        category_id=row[3],
+        category_name=row[4] or "Desconhecida",
+        confidence_score=row[5] or 0.0,
+        user_id=row[6],
+        is_processed=row[7],
+        created_at=str(row[8]),
+        response_template_id=row[9]
+    )
+
+def attach_contents(db, cursor, emails):
+    """Preenche body e suggested_response a partir de email_contents"""
+    contents = load_contents(db, cursor, [email.id for email in emails])
+    for email in emails:
+        email.body, email.suggested_response = contents.get(email.id, (None, None))
+
+def attach_requested_contents(db, cursor, info, emails):
+    """Lê email_contents só quando o cliente pede body, ou suggestedResponse sem modelo"""
+    fields = requested_fields(info)
+    if 'body' in fields:
+        attach_contents(db, cursor, emails)
+    elif 'suggestedResponse' in fields:
+        attach_contents(db, cursor, [email for email in emails if not email.response_template_id])
+
+def fetch_email(db, cursor, email_id):
+    """Email completo (com conteúdo) pela chave primária, em emails ou no arquivo"""
+    for table in ('emails', 'emails_archive'):
+        row = db.execute_prepared(f'{table}.by_id', EMAIL_BY_ID_SQL[table], (email_id,)).fetchone()
+        if row:
+            break
+    else:
+        return None
+    
+    email = email_from_row(row)
+    attach_contents(db, cursor, [email])
+    return email
+
+def fetch_emails(db, cursor, info, email_ids):
+    """{id: Email} de vários emails pela chave primária, com o conteúdo pedido pelo cliente"""
+    email_ids = list(dict.fromkeys(email_ids))
+    if not email_ids:
+        return {}
+    
+    placeholders = ', '.join(['%s'] * len(email_ids))
+    db.execute(cursor, 'emails.by_ids', f"""
+        SELECT {EMAIL_COLUMNS}
+        FROM emails e
+        LEFT JOIN categories c ON e.category_id = c.id
+        WHERE e.id IN ({placeholders})
+    """, tuple(email_ids))
+    emails = [email_from_row(row) for row in cursor.fetchall()]
+    attach_requested_contents(db, cursor, info, emails)
+    return {email.id: email for email in emails}
+
+def requested_fields(info):
+    """Nomes (camelCase) de todos os campos selecionados abaixo do campo atual"""
+    names = set()
+    
+    def walk(selection_set):
+        if not selection_set:
+            return
+        for selection in selection_set.selections:
+            if isinstance(selection, FragmentSpread):
+                walk(info.fragments[selection.name.value].selection_set)
+            elif isinstance(selection, InlineFragment):
+                walk(selection.selection_set)
+            else:
+                names.add(selection.name.value)
+                walk(selection.selection_set)
+    
+    for field_ast in info.field_asts:
+        walk(field_ast.selection_set)
+    return names
+
 # Mutations
 class RegisterUser(graphene.Mutation):
     class Arguments:
@@ -67,7 +234,7 @@ class RegisterUser(graphene.Mutation):
         
         try:
             # Verificar se usuário já existe
-            cursor.execute("SELECT id FROM users WHERE username = %s OR email = %s", (username, email))
+            db.execute(cursor, 'users.exists', "SELECT id FROM users WHERE username = %s OR email = %s", (username, email))
             if cursor.fetchone():
                 return RegisterUser(message="Usuário ou email já existe")
             
@@ -75,14 +242,15 @@ class RegisterUser(graphene.Mutation):
             password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
             
             # Inserir usuário
-            cursor.execute(
+            db.execute(
+                cursor, 'users.insert',
                 "INSERT INTO users (username, email, password_hash) VALUES (%s, %s, %s)",
                 (username, email, password_hash.decode('utf-8'))
             )
             db.connection.commit()
             
             # Buscar usuário criado
-            cursor.execute("SELECT id, username, email, is_admin, created_at FROM users WHERE username = %s", (username,))
+            db.execute(cursor, 'users.by_username', "SELECT id, username, email, is_admin, created_at FROM users WHERE username = %s", (username,))
             user_data = cursor.fetchone()
             
             user = User(
@@ -96,7 +264,8 @@ class RegisterUser(graphene.Mutation):
             return RegisterUser(user=user, message="Usuário criado com sucesso")
             
         except Exception as e:
-            print(f"Erro no registro: {e}")
+            logger.exception("Erro no registro: %s", e)
+            metrics.inc('errors_total', component='register_user')
             db.connection.rollback()
             return RegisterUser(message="Erro ao criar usuário")
 
@@ -117,7 +286,7 @@ class LoginUser(graphene.Mutation):
         
         try:
             # Buscar usuário
-            cursor.execute("SELECT id, username, email, password_hash, is_admin FROM users WHERE username = %s", (username,))
+            db.execute(cursor, 'users.login', "SELECT id, username, email, password_hash, is_admin FROM users WHERE username = %s", (username,))
             user_data = cursor.fetchone()
             
             if not user_data:
@@ -144,7 +313,8 @@ class LoginUser(graphene.Mutation):
             return LoginUser(auth_payload=AuthPayload(token=token, user=user, message="Login realizado com sucesso"))
             
         except Exception as e:
-            print(f"Erro no login: {e}")
+            logger.exception("Erro no login: %s", e)
+            metrics.inc('errors_total', component='login_user')
             return LoginUser(auth_payload=AuthPayload(message="Erro interno"))
 
 class ClassifyEmail(graphene.Mutation):
@@ -152,11 +322,12 @@ class ClassifyEmail(graphene.Mutation):
         sender = String(required=True)
         subject = String(required=True)
         body = String(required=True)
+        message_id = String()
     
     email = Field(Email)
     message = String()
     
-    def mutate(self, info, sender, subject, body):
+    def mutate(self, info, sender, subject, body, message_id=None):
         db = info.context.db
         classifier = info.context.classifier
         user_id = info.context.user_id
@@ -168,28 +339,47 @@ class ClassifyEmail(graphene.Mutation):
             return ClassifyEmail(message="Sistema não inicializado")
         
         try:
-            # Classificar email
-            category_id, confidence = classifier.classify_email(subject, body)
-            
-            # Gerar resposta sugerida
-            suggested_response = classifier.generate_response(category_id, subject, body)
-            
-            # Salvar no banco
             cursor = db.connection.cursor()
-            cursor.execute("""
-                INSERT INTO emails (sender, subject, body, category_id, confidence_score, 
-                                  suggested_response, user_id, is_processed)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """, (sender, subject, body, category_id, confidence, suggested_response, user_id, True))
             
-            email_id = cursor.lastrowid
-            db.connection.commit()
+            # Retentativas: uma busca no índice de idempotência, sem reclassificar
+            key = dedup_key(user_id, sender, subject, body, message_id)
+            existing_id = find_existing(db, cursor, [key]).get(key)
+            if existing_id:
+                return ClassifyEmail(email=fetch_email(db, cursor, existing_id), message="Email já processado")
+            
+            # Classificar email (a vaga de inferência cobre só o modelo, não a gravação)
+            with inference('classify'):
+                category_id, confidence = classifier.classify_email(subject, body)
+            
+            # Resposta sugerida: referência ao modelo da categoria (texto só sem modelo)
+            response_template_id, suggested_response = suggested_response_for(
+                db, classifier, category_id, subject, body)
+            
+            # Salvar no banco (com group commit, junto com as requisições concorrentes)
+            if group_commit.writer:
+                # Encerra a leitura desta conexão para enxergar o que a gravadora confirmar
+                db.connection.commit()
+                email_id, created = group_commit.writer.submit(user_id, (
+                    sender, subject, body, category_id, confidence, response_template_id, suggested_response, key))
+            else:
+                email_id, created = insert_email(
+                    db, cursor, user_id, sender, subject, body, category_id, confidence,
+                    response_template_id, suggested_response, key)
+                db.connection.commit()
+            db.record_write(user_id)
+            
+            # Outra requisição gravou o mesmo email enquanto este era classificado
+            if not created:
+                return ClassifyEmail(email=fetch_email(db, cursor, email_id), message="Email já processado")
             
             # Buscar nome da categoria
-            cursor.execute("SELECT name FROM categories WHERE id = %s", (category_id,))
-            category_result = cursor.fetchone()
+            category_result = db.execute_prepared(
+                'categories.name', "SELECT name FROM categories WHERE id = %s", (category_id,)
+            ).fetchone()
             category_name = category_result[0] if category_result else "Desconhecida"
             
+            events.publish_emails(user_id, [(email_id, sender, subject, category_id, category_name, confidence)])
+            
             email = Email(
                 id=email_id,
                 sender=sender,
@@ -199,16 +389,130 @@ class ClassifyEmail(graphene.Mutation):
                 category_name=category_name,
                 confidence_score=confidence,
                 suggested_response=suggested_response,
+                response_template_id=response_template_id,
                 user_id=user_id,
                 is_processed=True
             )
             
             return ClassifyEmail(email=email, message="Email classificado com sucesso")
             
+        except Shed:
+            raise
         except Exception as e:
-            print(f"Erro na classificação: {e}")
+            logger.exception("Erro na classificação: %s", e)
+            metrics.inc('errors_total', component='classify_email')
+            db.connection.rollback()
             return ClassifyEmail(message="Erro ao classificar email")
 
+class ClassifyEmails(graphene.Mutation):
+    """Classifica um lote numa única passada do modelo e grava tudo numa transação"""
+    class Arguments:
+        emails = List(graphene.NonNull(EmailInput), required=True)
+    
+    results = List(ClassifyEmailResult)
+    message = String()
+    
+    def mutate(self, info, emails):
+        db = info.context.db
+        classifier = info.context.classifier
+        user_id = info.context.user_id
+        
+        if not user_id:
+            return ClassifyEmails(message="Usuário não autenticado")
+        
+        if not db or not classifier:
+            return ClassifyEmails(message="Sistema não inicializado")
+        
+        if len(emails) > CLASSIFY_BATCH_MAX_SIZE:
+            return ClassifyEmails(message=f"Lote com {len(emails)} emails; o máximo é {CLASSIFY_BATCH_MAX_SIZE}")
+        
+        metrics.observe('batch_size', len(emails), buckets=SIZE_BUCKETS, operation='classify_emails')
+        results = [ClassifyEmailResult(index=index, duplicate=False) for index in range(len(emails))]
+        
+        try:
+            cursor = db.connection.cursor()
+            
+            # Chaves de idempotência do lote inteiro, verificadas numa única consulta
+            keys = []
+            for index, item in enumerate(emails):
+                if not all([item.sender, item.subject, item.body]):
+                    results[index].error = "Remetente, assunto e corpo são obrigatórios"
+                    keys.append(None)
+                    continue
+                keys.append(dedup_key(user_id, item.sender, item.subject, item.body, item.message_id))
+            
+            email_ids = find_existing(db, cursor, [key for key in keys if key])
+            
+            # Só a primeira ocorrência de cada chave nova é classificada
+            first = {}
+            for index, key in enumerate(keys):
+                if key and key not in email_ids and key not in first:
+                    first[key] = index
+            
+            items = [(emails[index].sender, emails[index].subject, emails[index].body, key)
+                     for key, index in first.items()]
+            with inference('bulk'):
+                predictions = classify_pool.classify_batch(classifier, [(subject, body) for _, subject, body, _ in items])
+            rows, saved = classify_and_insert(db, cursor, classifier, user_id, items, predictions)
+            db.connection.commit()
+            if saved:
+                db.record_write(user_id)
+            
+            db.execute(cursor, 'categories.list', "SELECT id, name FROM categories")
+            category_names = dict(cursor.fetchall())
+            
+            created = {}
+            for sender, subject, body, category_id, confidence, response_template_id, suggested_response, key in rows:
+                if key not in saved:
+                    continue
+                email_id, was_created = saved[key]
+                email_ids[key] = email_id
+                if was_created:
+                    created[key] = Email(
+                        id=email_id,
+                        sender=sender,
+                        subject=subject,
+                        body=body,
+                        category_id=category_id,
+                        category_name=category_names.get(category_id, "Desconhecida"),
+                        confidence_score=confidence,
+                        suggested_response=suggested_response,
+                        response_template_id=response_template_id,
+                        user_id=user_id,
+                        is_processed=True
+                    )
+            
+            events.publish_emails(user_id, [
+                (email.id, email.sender, email.subject, email.category_id, email.category_name, email.confidence_score)
+                for email in created.values()])
+            
+            # Retentativas e emails gravados por outra requisição são lidos do banco
+            stored = fetch_emails(db, cursor, info, [email_ids[key] for key in email_ids if key not in created])
+            
+            for index, key in enumerate(keys):
+                if not key:
+                    continue
+                if key not in email_ids:
+                    results[index].error = "Erro ao gravar email"
+                elif key in created:
+                    results[index].email = created[key]
+                    results[index].duplicate = first.get(key) != index
+                else:
+                    results[index].email = stored.get(email_ids[key])
+                    results[index].duplicate = True
+            
+            failed = sum(1 for result in results if result.error)
+            return ClassifyEmails(results=results,
+                                  message=f"{len(emails) - failed} emails processados, {failed} com erro")
+            
+        except Shed:
+            raise
+        except Exception as e:
+            logger.exception("Erro na classificação em lote: %s", e)
+            metrics.inc('errors_total', component='classify_emails')
+            db.connection.rollback()
+            return ClassifyEmails(message="Erro ao classificar emails")
+
 class AddFeedback(graphene.Mutation):
     class Arguments:
         email_id = Int(required=True)
@@ -221,6 +525,7 @@ class AddFeedback(graphene.Mutation):
     def mutate(self, info, email_id, corrected_category_id, feedback_text=""):
         db = info.context.db
         user_id = info.context.user_id
+        is_admin = info.context.is_admin
         
         if not user_id:
             return AddFeedback(message="Usuário não autenticado")
@@ -231,24 +536,20 @@ class AddFeedback(graphene.Mutation):
         cursor = db.connection.cursor()
         
         try:
-            # Buscar email e categoria original
-            cursor.execute("SELECT category_id FROM emails WHERE id = %s", (email_id,))
-            email_data = cursor.fetchone()
-            
-            if not email_data:
-                return AddFeedback(message="Email não encontrado")
-            
-            original_category_id = email_data[0]
+            feedback_id = insert_feedback(db, cursor, user_id, is_admin, email_id,
+                                          corrected_category_id, feedback_text)
+            if not feedback_id:
+                return AddFeedback(message="Email ou categoria não encontrados")
             
-            # Inserir feedback
-            cursor.execute("""
-                INSERT INTO feedback (email_id, user_id, original_category_id, 
-                                    corrected_category_id, feedback_text)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (email_id, user_id, original_category_id, corrected_category_id, feedback_text))
-            
-            feedback_id = cursor.lastrowid
             db.connection.commit()
+            db.record_write(user_id)
+            
+            # A categoria original foi copiada pelo INSERT; só é lida se o cliente pedir
+            original_category_id = None
+            if 'originalCategoryId' in requested_fields(info):
+                db.execute(cursor, 'feedback.original_category',
+                           "SELECT original_category_id FROM feedback WHERE id = %s", (feedback_id,))
+                original_category_id = cursor.fetchone()[0]
             
             feedback = Feedback(
                 id=feedback_id,
@@ -262,16 +563,114 @@ class AddFeedback(graphene.Mutation):
             return AddFeedback(feedback=feedback, message="Feedback adicionado com sucesso")
             
         except Exception as e:
-            print(f"Erro ao adicionar feedback: {e}")
+            logger.exception("Erro ao adicionar feedback: %s", e)
+            metrics.inc('errors_total', component='add_feedback')
             db.connection.rollback()
             return AddFeedback(message="Erro ao adicionar feedback")
 
+class AddFeedbackBatch(graphene.Mutation):
+    """Aplica várias correções num único comando e numa única transação"""
+    class Arguments:
+        feedback = List(graphene.NonNull(FeedbackInput), required=True)
+    
+    applied = Int()
+    ignored = Int()
+    message = String()
+    
+    def mutate(self, info, feedback):
+        db = info.context.db
+        user_id = info.context.user_id
+        
+        if not user_id:
+            return AddFeedbackBatch(message="Usuário não autenticado")
+        
+        if not db:
+            return AddFeedbackBatch(message="Sistema não inicializado")
+        
+        if len(feedback) > FEEDBACK_BATCH_MAX_SIZE:
+            return AddFeedbackBatch(message=f"Lote com {len(feedback)} correções; o máximo é {FEEDBACK_BATCH_MAX_SIZE}")
+        
+        metrics.observe('batch_size', len(feedback), buckets=SIZE_BUCKETS, operation='add_feedback_batch')
+        cursor = db.connection.cursor()
+        
+        try:
+            applied = insert_feedback_batch(
+                db, cursor, user_id, info.context.is_admin,
+                [(item.email_id, item.corrected_category_id, item.feedback_text or "") for item in feedback])
+            db.connection.commit()
+            if applied:
+                db.record_write(user_id)
+            
+            return AddFeedbackBatch(applied=applied, ignored=len(feedback) - applied,
+                                    message=f"{applied} de {len(feedback)} correções aplicadas")
+            
+        except Exception as e:
+            logger.exception("Erro ao adicionar feedback em lote: %s", e)
+            metrics.inc('errors_total', component='add_feedback_batch')
+            db.connection.rollback()
+            return AddFeedbackBatch(message="Erro ao adicionar feedback")
+
+class UpdateResponseTemplate(graphene.Mutation):
+    class Arguments:
+        category_id = Int(required=True)
+        body = String(required=True)
+    
+    template = Field(ResponseTemplate)
+    message = String()
+    
+    def mutate(self, info, category_id, body):
+        db = info.context.db
+        
+        if not info.context.user_id or not info.context.is_admin:
+            return UpdateResponseTemplate(message="Acesso negado")
+        
+        if not db:
+            return UpdateResponseTemplate(message="Sistema não inicializado")
+        
+        try:
+            template_id, version = templates.update(db, category_id, body)
+            db.record_write(info.context.user_id)
+            template = ResponseTemplate(id=template_id, category_id=category_id, version=version, body=body)
+            return UpdateResponseTemplate(template=template, message="Modelo de resposta atualizado")
+        except Exception as e:
+            logger.exception("Erro ao atualizar modelo de resposta: %s", e)
+            metrics.inc('errors_total', component='update_response_template')
+            return UpdateResponseTemplate(message="Erro ao atualizar modelo de resposta")
+
+class ReclassifyEmails(graphene.Mutation):
+    """Reclassifica em segundo plano os emails gravados com o modelo atual (admin)"""
+    class Arguments:
+        restart = Boolean(default_value=False)
+    
+    status = Field(ReclassifyStatus)
+    message = String()
+    
+    def mutate(self, info, restart=False):
+        db = info.context.db
+        classifier = info.context.classifier
+        
+        if not info.context.user_id or not info.context.is_admin:
+            return ReclassifyEmails(message="Acesso negado")
+        
+        if not db or not classifier:
+            return ReclassifyEmails(message="Sistema não inicializado")
+        
+        if not reclassify.start_reclassifier(db, classifier, restart):
+            return ReclassifyEmails(status=ReclassifyStatus(**reclassify.progress.as_dict()),
+                                    message="Reclassificação já em andamento")
+        
+        return ReclassifyEmails(status=ReclassifyStatus(**reclassify.progress.as_dict()),
+                                message="Reclassificação iniciada")
+
 # Queries
 class Query(ObjectType):
     users = List(User)
     categories = List(Category)
-    emails = List(Email)
+    emails = List(Email, since=String(), until=String())
     email = Field(Email, id=Int(required=True))
+    response_templates = List(ResponseTemplate)
+    search_emails = Field(SearchResults, query=String(required=True), first=Int(default_value=20), after=String())
+    reclassify_status = Field(ReclassifyStatus)
     
     def resolve_users(self, info):
         db = info.context.db
@@ -282,8 +681,8 @@ class Query(ObjectType):
             return []
         
         try:
-            cursor = db.connection.cursor()
-            cursor.execute("SELECT id, username, email, is_admin, created_at FROM users")
+            cursor = db.read_connection('replica', user_id).cursor()
+            db.execute(cursor, 'users.list', "SELECT id, username, email, is_admin, created_at FROM users")
             users_data = cursor.fetchall()
             
             return [User(
@@ -294,7 +693,8 @@ class Query(ObjectType):
                 created_at=str(user[4])
             ) for user in users_data]
         except Exception as e:
-            print(f"Erro ao buscar usuários: {e}")
+            logger.exception("Erro ao buscar usuários: %s", e)
+            metrics.inc('errors_total', component='users')
             return []
     
     def resolve_categories(self, info):
@@ -304,8 +704,10 @@ class Query(ObjectType):
             return []
         
         try:
-            cursor = db.connection.cursor()
-            cursor.execute("SELECT id, name, description, color, created_at FROM categories")
+            cursor = db.execute_prepared(
+                'categories.list', "SELECT id, name, description, color, created_at FROM categories",
+                connection=db.read_connection('replica')
+            )
             categories_data = cursor.fetchall()
             
             return [Category(
@@ -316,10 +718,30 @@ class Query(ObjectType):
                 created_at=str(cat[4])
             ) for cat in categories_data]
         except Exception as e:
-            print(f"Erro ao buscar categorias: {e}")
+            logger.exception("Erro ao buscar categorias: %s", e)
+            metrics.inc('errors_total', component='categories')
+            return []
+    
+    def resolve_response_templates(self, info):
+        db = info.context.db
+        
+        if not info.context.user_id or not info.context.is_admin or not db:
+            return []
+        
+        try:
+            return [ResponseTemplate(id=template_id, category_id=category_id, version=version, body=body)
+                    for template_id, category_id, version, body in templates.list(db)]
+        except Exception as e:
+            logger.exception("Erro ao buscar modelos de resposta: %s", e)
+            metrics.inc('errors_total', component='response_templates')
             return []
     
-    def resolve_emails(self, info):
+    def resolve_reclassify_status(self, info):
+        if not info.context.user_id or not info.context.is_admin:
+            return None
+        return ReclassifyStatus(**reclassify.progress.as_dict())
+    
+    def resolve_emails(self, info, since=None, until=None):
         db = info.context.db
         user_id = info.context.user_id
         is_admin = info.context.is_admin
@@ -328,50 +750,59 @@ class Query(ObjectType):
             return []
         
         try:
-            cursor = db.connection.cursor()
-            
-            if is_admin:
-                query = """
-                    SELECT e.id, e.sender, e.subject, e.body, e.category_id, c.name,
-                           e.confidence_score, e.suggested_response, e.user_id, 
-                           e.is_processed, e.created_at
-                    FROM emails e
-                    LEFT JOIN categories c ON e.category_id = c.id
-                    ORDER BY e.created_at DESC
-                    LIMIT 100
-                """
-                cursor.execute(query)
-            else:
-                query = """
-                    SELECT e.id, e.sender, e.subject, e.body, e.category_id, c.name,
-                           e.confidence_score, e.suggested_response, e.user_id, 
-                           e.is_processed, e.created_at
-                    FROM emails e
+            since = parse_date(since)
+            until = parse_date(until)
+        except ValueError:
+            logger.warning("Intervalo de datas inválido: %s - %s", since, until)
+            return []
+        
+        try:
+            # Listagem do painel: tolera réplicas mais atrasadas
+            cursor = db.read_connection('analytics', user_id).cursor()
+            
+            conditions = []
+            params = []
+            if not is_admin:
+                conditions.append("e.user_id = %s")
+                params.append(user_id)
+            if since:
+                conditions.append("e.created_at >= %s")
+                params.append(since)
+            if until:
+                conditions.append("e.created_at < %s")
+                params.append(until)
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            
+            tables = ['emails']
+            # O arquivo só é consultado quando o intervalo pedido chega até ele
+            if (since or until) and reaches_archive(db, since):
+                tables.append('emails_archive')
+            
+            emails = []
+            for table in tables:
+                query = f"""
+                    SELECT {EMAIL_COLUMNS}
+                    FROM {table} e
                     LEFT JOIN categories c ON e.category_id = c.id
-                    WHERE e.user_id = %s
+                    {where}
                     ORDER BY e.created_at DESC
                     LIMIT 100
                 """
-                cursor.execute(query, (user_id,))
-            
-            emails_data = cursor.fetchall()
-            
-            return [Email(
-                id=email[0],
-                sender=email[1],
-                subject=email[2],
-                body=email[3],
-                category_id=email[4],
-                category_name=email[5] or "Desconhecida",
-                confidence_score=email[6] or 0.0,
-                suggested_response=email[7],
-                user_id=email[8],
-                is_processed=email[9],
-                created_at=str(email[10])
-            ) for email in emails_data]
+                db.execute(cursor, f'{table}.list', query, tuple(params))
+                emails.extend(email_from_row(email) for email in cursor.fetchall())
+            
+            if len(tables) > 1:
+                emails.sort(key=lambda email: email.created_at, reverse=True)
+                emails = emails[:100]
+            
+            # Conteúdo só é lido quando o cliente pede body ou suggestedResponse
+            attach_requested_contents(db, cursor, info, emails)
+            
+            return emails
             
         except Exception as e:
-            print(f"Erro ao buscar emails: {e}")
+            logger.exception("Erro ao buscar emails: %s", e)
+            metrics.inc('errors_total', component='emails')
             return []
     
     def resolve_email(self, info, id):
@@ -383,56 +814,131 @@ class Query(ObjectType):
             return None
         
         try:
-            cursor = db.connection.cursor()
-            
-            if is_admin:
-                query = """
-                    SELECT e.id, e.sender, e.subject, e.body, e.category_id, c.name,
-                           e.confidence_score, e.suggested_response, e.user_id, 
-                           e.is_processed, e.created_at
-                    FROM emails e
-                    LEFT JOIN categories c ON e.category_id = c.id
-                    WHERE e.id = %s
-                """
-                cursor.execute(query, (id,))
-            else:
-                query = """
-                    SELECT e.id, e.sender, e.subject, e.body, e.category_id, c.name,
-                           e.confidence_score, e.suggested_response, e.user_id, 
-                           e.is_processed, e.created_at
-                    FROM emails e
-                    LEFT JOIN categories c ON e.category_id = c.id
-                    WHERE e.id = %s AND e.user_id = %s
-                """
-                cursor.execute(query, (id, user_id))
-            
-            email_data = cursor.fetchone()
+            connection = db.read_connection('replica', user_id)
+            
+            # Busca pela chave primária; o arquivo só é lido se o email não está em emails
+            email_data = None
+            for table in ('emails', 'emails_archive'):
+                if is_admin:
+                    found = db.execute_prepared(f'{table}.by_id', EMAIL_BY_ID_SQL[table], (id,), connection)
+                else:
+                    found = db.execute_prepared(f'{table}.by_id_user', EMAIL_BY_ID_USER_SQL[table],
+                                                (id, user_id), connection)
+                
+                email_data = found.fetchone()
+                if email_data or not archive_horizon(db):
+                    break
             
             if email_data:
-                return Email(
-                    id=email_data[0],
-                    sender=email_data[1],
-                    subject=email_data[2],
-                    body=email_data[3],
-                    category_id=email_data[4],
-                    category_name=email_data[5] or "Desconhecida",
-                    confidence_score=email_data[6] or 0.0,
-                    suggested_response=email_data[7],
-                    user_id=email_data[8],
-                    is_processed=email_data[9],
-                    created_at=str(email_data[10])
-                )
+                email = email_from_row(email_data)
+                attach_requested_contents(db, connection.cursor(), info, [email])
+                return email
             
             return None
             
         except Exception as e:
-            print(f"Erro ao buscar email: {e}")
+            logger.exception("Erro ao buscar email: %s", e)
+            metrics.inc('errors_total', component='email')
             return None
+    
+    def resolve_search_emails(self, info, query, first=20, after=None):
+        db = info.context.db
+        user_id = info.context.user_id
+        is_admin = info.context.is_admin
+        
+        empty = SearchResults(hits=[], end_cursor=None, has_next_page=False)
+        
+        if not user_id or not db:
+            return empty
+        
+        terms = extract_terms(query)
+        if not terms:
+            return empty
+        
+        first = max(1, min(first, SEARCH_MAX_PAGE_SIZE))
+        offset = decode_cursor(after)
+        
+        # A busca só percorre os índices textuais e nunca passa de SEARCH_MAX_RESULTS
+        if offset >= SEARCH_MAX_RESULTS:
+            return empty
+        limit = min(first, SEARCH_MAX_RESULTS - offset)
+        
+        try:
+            cursor = db.read_connection('replica', user_id).cursor()
+            
+            def rank():
+                # Índices textuais do backend (FULLTEXT no MySQL, FTS5 no SQLite)
+                source, params = db.backend.search_source(terms, None if is_admin else user_id)
+                if db.legacy_content:
+                    # Corpo de emails ainda não migrados para email_contents
+                    legacy_source, legacy_params = legacy_search_source(terms, None if is_admin else user_id)
+                    source, params = f"{source} UNION ALL {legacy_source}", params + legacy_params
+                db.execute(cursor, 'search.ranked' if is_admin else 'search.ranked_user', f"""
+                    SELECT m.email_id, SUM(m.score) AS score
+                    FROM ({source}) m
+                    GROUP BY m.email_id
+                    ORDER BY score DESC, m.email_id DESC
+                    LIMIT %s OFFSET %s
+                """, params + (limit + 1, offset))
+            
+            try:
+                rank()
+            except Error as e:
+                if not db.legacy_content_gone(e):
+                    raise
+                rank()
+            
+            ranked = cursor.fetchall()
+            has_next_page = len(ranked) > limit and offset + limit < SEARCH_MAX_RESULTS
+            ranked = ranked[:limit]
+            
+            if not ranked:
+                return empty
+            
+            ids = [row[0] for row in ranked]
+            placeholders = ', '.join(['%s'] * len(ids))
+            db.execute(cursor, 'search.emails', f"""
+                SELECT {EMAIL_COLUMNS}
+                FROM emails e
+                LEFT JOIN categories c ON e.category_id = c.id
+                WHERE e.id IN ({placeholders})
+            """, tuple(ids))
+            emails = {row[0]: email_from_row(row) for row in cursor.fetchall()}
+            
+            # O snippet precisa do corpo, então o conteúdo é sempre carregado aqui
+            attach_contents(db, cursor, list(emails.values()))
+            
+            hits = []
+            for position, (email_id, score) in enumerate(ranked):
+                email = emails.get(email_id)
+                if not email:
+                    continue
+                hits.append(SearchHit(
+                    email=email,
+                    score=float(score or 0.0),
+                    snippet=make_snippet(email.body, terms),
+                    cursor=encode_cursor(offset + position + 1)
+                ))
+            
+            return SearchResults(
+                hits=hits,
+                end_cursor=encode_cursor(offset + len(ranked)),
+                has_next_page=has_next_page
+            )
+            
+        except Exception as e:
+            logger.exception("Erro na busca de emails: %s", e)
+            metrics.inc('errors_total', component='search_emails')
+            return empty
 
 class Mutation(ObjectType):
     register_user = RegisterUser.Field()
     login_user = LoginUser.Field()
     classify_email = ClassifyEmail.Field()
+    classify_emails = ClassifyEmails.Field()
     add_feedback = AddFeedback.Field()
+    add_feedback_batch = AddFeedbackBatch.Field()
+    update_response_template = UpdateResponseTemplate.Field()
+    reclassify_emails = ReclassifyEmails.Field()
 
 schema = graphene.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
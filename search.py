@@ -0,0 +1,99 @@
+import base64
+import html
+import re
+
+# Limites da busca textual
+SEARCH_MAX_PAGE_SIZE = 50
+SEARCH_MAX_RESULTS = 1000
+SEARCH_MAX_TERMS = 10
+SEARCH_MIN_TERM_LENGTH = 3  # innodb_ft_min_token_size padrão
+SNIPPET_RADIUS = 80
+
+
+def extract_terms(query):
+    """Extrai os termos pesquisáveis de uma consulta livre"""
+    if not query:
+        return []
+
+    terms = []
+    for token in re.findall(r'\w+', query.lower()):
+        if len(token) >= SEARCH_MIN_TERM_LENGTH and token not in terms:
+            terms.append(token)
+
+    return terms[:SEARCH_MAX_TERMS]
+
+
+def build_boolean_query(terms):
+    """Monta a expressão BOOLEAN MODE (prefixo em cada termo, sem operadores do usuário)"""
+    return ' '.join(f"{term}*" for term in terms)
+
+
+def legacy_search_source(terms, user_id=None):
+    """(SQL, parâmetros) de (email_id, score) sobre emails.body das linhas que a migração ainda não moveu
+
+    A coluna antiga não tem índice textual: LIKE por termo (varredura), com o número de termos
+    encontrados como relevância. Só é usada enquanto Database.legacy_content for verdadeiro.
+    """
+    # Termos só têm \w: '_' é o único curinga do LIKE que pode aparecer
+    patterns = tuple(f"%{term.replace('_', '!_')}%" for term in terms)
+    matches = ["e.body LIKE %s ESCAPE '!'"] * len(terms)
+    user_filter = "AND e.user_id = %s" if user_id is not None else ""
+    sql = f"""
+        SELECT e.id AS email_id, ({' + '.join(f'({match})' for match in matches)}) AS score
+        FROM emails e
+        WHERE e.body IS NOT NULL AND ({' OR '.join(matches)}) {user_filter}
+          AND NOT EXISTS (SELECT 1 FROM email_contents ec WHERE ec.email_id = e.id)
+    """
+    return sql, patterns + patterns + ((user_id,) if user_id is not None else ())
+
+
+def encode_cursor(offset):
+    return base64.urlsafe_b64encode(f"offset:{offset}".encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Converte o cursor opaco em deslocamento (0 se inválido)"""
+    if not cursor:
+        return 0
+
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        prefix, offset = value.split(':', 1)
+        if prefix != 'offset':
+            return 0
+        return max(int(offset), 0)
+    except (ValueError, UnicodeError):
+        return 0
+
+
+def make_snippet(text, terms, radius=SNIPPET_RADIUS):
+    """Recorta o trecho em volta do primeiro termo encontrado e destaca os termos com <mark>"""
+    if not text:
+        return ""
+
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(term) for term in terms) + r')\w*', re.IGNORECASE) if terms else None
+    match = pattern.search(text) if pattern else None
+
+    if match:
+        start = max(match.start() - radius, 0)
+        end = min(match.end() + radius, len(text))
+    else:
+        start, end = 0, min(len(text), radius * 2)
+
+    fragment = text[start:end]
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if end < len(text) else ''
+
+    if not pattern:
+        return prefix + html.escape(fragment) + suffix
+
+    # Escapar HTML pedaço a pedaço para não quebrar as marcações
+    parts = []
+    last = 0
+    for found in pattern.finditer(fragment):
+        parts.append(html.escape(fragment[last:found.start()]))
+        parts.append(f"<mark>{html.escape(found.group(0))}</mark>")
+        last = found.end()
+    parts.append(html.escape(fragment[last:]))
+
+    return prefix + ''.join(parts) + suffix
@@ -3,6 +3,9 @@ let currentUser = null;
 let authToken = null;
 let categories = [];
 let currentEmailId = null;
+let dashboardStats = null;   // último /stats, atualizado pelos eventos
+let emailsLoaded = false;
+let eventSource = null;
 
 // URLs da API
 const API_BASE = 'http://localhost:5000';
@@ -30,8 +33,8 @@ document.getElementById(loaderId).classList.add('hidden');
 document.getElementById(textId).classList.remove('hidden');
 }
 
-// Requisições GraphQL
-async function graphqlRequest(query, variables = {}) {
+// Requisições GraphQL (GET para consultas cacheáveis: o navegador revalida com ETag)
+async function graphqlRequest(query, variables = {}, method = 'POST') {
 try {
     const headers = {
         'Content-Type': 'application/json'
@@ -41,11 +44,18 @@ try {
         headers['Authorization'] = `Bearer ${authToken}`;
     }
 
-    const response = await fetch(GRAPHQL_URL, {
-        method: 'POST',
-        headers,
-        body: JSON.stringify({ query, variables })
-    });
+    let response;
+    if (method === 'GET') {
+        delete headers['Content-Type'];  // sem corpo
+        const params = new URLSearchParams({ query, variables: JSON.stringify(variables) });
+        response = await fetch(`${GRAPHQL_URL}?${params}`, { headers });
+    } else {
+        response = await fetch(GRAPHQL_URL, {
+            method: 'POST',
+            headers,
+            body: JSON.stringify({ query, variables })
+        });
+    }
 
     const result = await response.json();
     
@@ -141,6 +151,7 @@ return data.registerUser.message;
 }
 
 function logout() {
+disconnectEvents();
 authToken = null;
 currentUser = null;
 localStorage.removeItem('authToken');
@@ -159,6 +170,7 @@ document.getElementById('loginModal').classList.remove('show');
 document.getElementById('mainApp').classList.remove('hidden');
 updateUserInfo();
 loadDashboard();
+connectEvents();
 }
 
 function updateUserInfo() {
@@ -210,13 +222,13 @@ if (contentId) {
 // Carregar dados específicos da tab
 switch(activeTabId) {
     case 'dashboardTab':
-        loadDashboard();
+        if (!dashboardStats) loadDashboard();
         break;
     case 'classifyTab':
         loadCategories();
         break;
     case 'emailsTab':
-        loadEmails();
+        if (!emailsLoaded) loadEmails();
         break;
     case 'adminTab':
         loadAdminData();
@@ -227,8 +239,15 @@ switch(activeTabId) {
 // Dashboard
 async function loadDashboard() {
 try {
-    const stats = await restRequest('/stats');
-    
+    dashboardStats = await restRequest('/stats');
+    renderDashboard(dashboardStats);
+} catch (error) {
+    showNotification('Erro ao carregar dashboard: ' + error.message, 'error');
+}
+}
+
+function renderDashboard(stats) {
+try {
     document.getElementById('totalEmails').textContent = stats.total_emails;
     document.getElementById('totalUsers').textContent = stats.total_users;
     document.getElementById('totalFeedback').textContent = stats.total_feedback;
@@ -277,7 +296,7 @@ try {
         }
     `;
 
-    const data = await graphqlRequest(query);
+    const data = await graphqlRequest(query, {}, 'GET');
     categories = data.categories;
     
     // Atualizar select de feedback
@@ -409,33 +428,101 @@ try {
     const tbody = document.getElementById('emailsTableBody');
     tbody.innerHTML = '';
     
-    emails.forEach(email => {
-        const row = document.createElement('tr');
-        row.className = 'hover:bg-gray-50';
-        
-        const confidence = Math.round(email.confidenceScore * 100);
-        const date = new Date(email.createdAt).toLocaleDateString('pt-BR');
-        
-        row.innerHTML = `
-            <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">${email.sender}</td>
-            <td class="px-6 py-4 text-sm text-gray-900">
-                <div class="max-w-xs truncate" title="${email.subject}">${email.subject}</div>
-            </td>
-            <td class="px-6 py-4 whitespace-nowrap">
-                <span class="category-badge" style="background-color: #3b82f6;">${email.categoryName}</span>
-            </td>
-            <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">${confidence}%</td>
-            <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-500">${date}</td>
-        `;
-        
-        tbody.appendChild(row);
-    });
+    emails.forEach(email => tbody.appendChild(emailRow(email)));
+    emailsLoaded = true;
     
 } catch (error) {
     showNotification('Erro ao carregar emails: ' + error.message, 'error');
 }
 }
 
+function emailRow(email) {
+    const row = document.createElement('tr');
+    row.className = 'hover:bg-gray-50';
+    
+    const confidence = Math.round(email.confidenceScore * 100);
+    const date = new Date(email.createdAt).toLocaleDateString('pt-BR');
+    
+    row.innerHTML = `
+        <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">${email.sender}</td>
+        <td class="px-6 py-4 text-sm text-gray-900">
+            <div class="max-w-xs truncate" title="${email.subject}">${email.subject}</div>
+        </td>
+        <td class="px-6 py-4 whitespace-nowrap">
+            <span class="category-badge" style="background-color: #3b82f6;">${email.categoryName}</span>
+        </td>
+        <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">${confidence}%</td>
+        <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-500">${date}</td>
+    `;
+    row.dataset.emailId = email.id;
+    
+    return row;
+}
+
+// Eventos do servidor: emails novos e variação das estatísticas, sem reconsultar tudo
+function connectEvents() {
+if (!authToken || !window.EventSource || eventSource) {
+    return;
+}
+
+eventSource = new EventSource(`${API_BASE}/events?token=${encodeURIComponent(authToken)}`);
+
+eventSource.addEventListener('emails', event => {
+    if (!emailsLoaded) {
+        return;
+    }
+    const tbody = document.getElementById('emailsTableBody');
+    JSON.parse(event.data).forEach(email => {
+        if (!tbody.querySelector(`tr[data-email-id="${email.id}"]`)) {
+            tbody.insertBefore(emailRow(email), tbody.firstChild);
+        }
+    });
+    // A lista mostra os 100 mais recentes, como a consulta emails
+    while (tbody.rows.length > 100) {
+        tbody.deleteRow(-1);
+    }
+});
+
+eventSource.addEventListener('stats', event => {
+    if (!dashboardStats) {
+        return;
+    }
+    const delta = JSON.parse(event.data);
+    const total = dashboardStats.total_emails + delta.total_emails;
+    if (total > 0) {
+        dashboardStats.avg_confidence =
+            (dashboardStats.avg_confidence * dashboardStats.total_emails + delta.confidence_sum) / total;
+    }
+    dashboardStats.total_emails = total;
+    
+    Object.entries(delta.emails_by_category).forEach(([category, count]) => {
+        const item = dashboardStats.emails_by_category.find(entry => entry.category === category);
+        if (item) {
+            item.count += count;
+        } else {
+            dashboardStats.emails_by_category.push({ category, count });
+        }
+    });
+    dashboardStats.emails_by_category.sort((a, b) => b.count - a.count);
+    renderDashboard(dashboardStats);
+});
+
+// Eventos perdidos (reinício do servidor, desconexão longa): recarrega uma vez
+eventSource.addEventListener('resync', () => {
+    if (dashboardStats) loadDashboard();
+    if (emailsLoaded) loadEmails();
+});
+}
+
+function disconnectEvents() {
+if (eventSource) {
+    eventSource.close();
+    eventSource = null;
+}
+dashboardStats = null;
+emailsLoaded = false;
+}
+
 // Upload em lote
 async function processEmailBatch(emailsData) {
 try {
@@ -0,0 +1,737 @@
+"""Backends de armazenamento: MySQL (padrão) e SQLite embutido.
+
+Todas as consultas passam por Database.execute com SQL no dialeto do MySQL
+(placeholders %s). O backend SQLite traduz esse SQL no cursor e fornece DDL,
+busca textual (FTS5), travas e introspecção próprios; o resto da aplicação
+não sabe qual banco está em uso.
+
+    DB_BACKEND=mysql   (padrão) DB_HOST, DB_NAME, DB_USER, DB_PASSWORD, DB_PORT
+    DB_BACKEND=sqlite  DB_PATH (padrão email_classifier.db), modo WAL
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+from functools import lru_cache
+
+import mysql.connector
+
+from search import build_boolean_query
+
+try:
+    import fcntl
+except ImportError:  # Windows: um único processo, a trava do processo basta
+    fcntl = None
+
+# Erros de qualquer backend
+Error = (mysql.connector.Error, sqlite3.Error)
+
+
+# Tabelas do MySQL, na ordem de criação (chaves estrangeiras)
+MYSQL_TABLES = [
+    # Tabela de usuários
+    ('users', """
+    CREATE TABLE IF NOT EXISTS users (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        username VARCHAR(50) UNIQUE NOT NULL,
+        email VARCHAR(100) UNIQUE NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        is_admin BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """),
+    # Tabela de categorias
+    ('categories', """
+    CREATE TABLE IF NOT EXISTS categories (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        description TEXT,
+        color VARCHAR(7) DEFAULT '#007bff',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """),
+    # Modelos de resposta (um por categoria) e suas versões
+    ('response_templates', """
+    CREATE TABLE IF NOT EXISTS response_templates (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        category_id INT NOT NULL UNIQUE,
+        current_version INT NOT NULL DEFAULT 1,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE
+    )
+    """),
+    ('response_template_versions', """
+    CREATE TABLE IF NOT EXISTS response_template_versions (
+        template_id INT NOT NULL,
+        version INT NOT NULL,
+        body TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (template_id, version),
+        FOREIGN KEY (template_id) REFERENCES response_templates(id) ON DELETE CASCADE
+    )
+    """),
+    # Tabela de emails (metadados "quentes"; o conteúdo fica em email_contents)
+    ('emails', """
+    CREATE TABLE IF NOT EXISTS emails (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        sender VARCHAR(255) NOT NULL,
+        subject VARCHAR(500) NOT NULL,
+        category_id INT,
+        confidence_score FLOAT DEFAULT 0.0,
+        user_id INT NOT NULL,
+        is_processed BOOLEAN DEFAULT FALSE,
+        response_template_id INT NULL,
+        dedup_key CHAR(64) NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE INDEX uq_emails_dedup_key (dedup_key),
+        INDEX idx_emails_created (created_at),
+        FULLTEXT INDEX ft_emails_subject (subject),
+        FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE SET NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+        FOREIGN KEY (response_template_id) REFERENCES response_templates(id) ON DELETE SET NULL
+    )
+    """),
+    # Tabela de conteúdo dos emails ("fria"), lida só quando corpo/resposta são pedidos
+    ('email_contents', """
+    CREATE TABLE IF NOT EXISTS email_contents (
+        email_id INT PRIMARY KEY,
+        body MEDIUMTEXT NOT NULL,
+        body_compressed MEDIUMBLOB NULL,
+        suggested_response TEXT,
+        FULLTEXT INDEX ft_email_contents_body (body),
+        FOREIGN KEY (email_id) REFERENCES emails(id) ON DELETE CASCADE
+    )
+    """),
+    # Tabela de feedback para treinamento
+    ('feedback', """
+    CREATE TABLE IF NOT EXISTS feedback (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        email_id INT NOT NULL,
+        user_id INT NOT NULL,
+        original_category_id INT,
+        corrected_category_id INT,
+        feedback_text TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (email_id) REFERENCES emails(id) ON DELETE CASCADE,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+        FOREIGN KEY (original_category_id) REFERENCES categories(id) ON DELETE SET NULL,
+        FOREIGN KEY (corrected_category_id) REFERENCES categories(id) ON DELETE SET NULL
+    )
+    """),
+    # Emails arquivados (mesmas colunas de emails, sem chaves estrangeiras, comprimidos)
+    ('emails_archive', """
+    CREATE TABLE IF NOT EXISTS emails_archive (
+        id INT PRIMARY KEY,
+        sender VARCHAR(255) NOT NULL,
+        subject VARCHAR(500) NOT NULL,
+        category_id INT,
+        confidence_score FLOAT DEFAULT 0.0,
+        user_id INT NOT NULL,
+        is_processed BOOLEAN DEFAULT FALSE,
+        response_template_id INT NULL,
+        dedup_key CHAR(64) NULL,
+        created_at TIMESTAMP NULL,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE INDEX uq_emails_archive_dedup_key (dedup_key),
+        INDEX idx_emails_archive_created (created_at),
+        INDEX idx_emails_archive_user_created (user_id, created_at)
+    ) ROW_FORMAT=COMPRESSED
+    """),
+    ('email_contents_archive', """
+    CREATE TABLE IF NOT EXISTS email_contents_archive (
+        email_id INT PRIMARY KEY,
+        body MEDIUMTEXT NOT NULL,
+        body_compressed MEDIUMBLOB NULL,
+        suggested_response TEXT
+    ) ROW_FORMAT=COMPRESSED
+    """),
+    # Totais pré-agregados do arquivo (linhas arquivadas não mudam mais)
+    ('email_archive_totals', """
+    CREATE TABLE IF NOT EXISTS email_archive_totals (
+        user_id INT NOT NULL,
+        category_id INT NOT NULL DEFAULT 0,
+        email_count INT NOT NULL DEFAULT 0,
+        confidence_sum DOUBLE NOT NULL DEFAULT 0,
+        confidence_count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, category_id)
+    )
+    """),
+    # Estado interno (marcas d'água, horizonte do arquivo etc.)
+    ('system_state', """
+    CREATE TABLE IF NOT EXISTS system_state (
+        name VARCHAR(100) PRIMARY KEY,
+        value VARCHAR(255),
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    """),
+]
+
+# Colunas que tabelas criadas por versões anteriores podem não ter
+MYSQL_COLUMNS = [
+    ('emails', 'response_template_id',
+     "ALTER TABLE emails ADD COLUMN response_template_id INT NULL, "
+     "ADD FOREIGN KEY (response_template_id) REFERENCES response_templates(id) ON DELETE SET NULL"),
+    ('emails', 'dedup_key',
+     "ALTER TABLE emails ADD COLUMN dedup_key CHAR(64) NULL"),
+    ('emails_archive', 'dedup_key',
+     "ALTER TABLE emails_archive ADD COLUMN dedup_key CHAR(64) NULL"),
+]
+
+# Índices que tabelas criadas por versões anteriores podem não ter
+MYSQL_INDEXES = [
+    ('emails', 'ft_emails_subject',
+     "ALTER TABLE emails ADD FULLTEXT INDEX ft_emails_subject (subject)"),
+    ('emails', 'uq_emails_dedup_key',
+     "ALTER TABLE emails ADD UNIQUE INDEX uq_emails_dedup_key (dedup_key), ALGORITHM=INPLACE, LOCK=NONE"),
+    ('emails', 'idx_emails_created',
+     "ALTER TABLE emails ADD INDEX idx_emails_created (created_at), ALGORITHM=INPLACE, LOCK=NONE"),
+    ('emails_archive', 'uq_emails_archive_dedup_key',
+     "ALTER TABLE emails_archive ADD UNIQUE INDEX uq_emails_archive_dedup_key (dedup_key), ALGORITHM=INPLACE, LOCK=NONE"),
+]
+
+
+# Hora local, como o CURRENT_TIMESTAMP da sessão MySQL
+SQLITE_NOW = "(datetime('now', 'localtime'))"
+
+# Tabelas do SQLite: mesmas colunas e índices; FULLTEXT vira FTS5 mantido por gatilhos
+SQLITE_TABLES = [
+    ('users', f"""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username VARCHAR(50) UNIQUE NOT NULL,
+        email VARCHAR(100) UNIQUE NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        is_admin BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT {SQLITE_NOW}
+    )
+    """),
+    ('categories', f"""
+    CREATE TABLE IF NOT EXISTS categories (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name VARCHAR(100) NOT NULL,
+        description TEXT,
+        color VARCHAR(7) DEFAULT '#007bff',
+        created_at TIMESTAMP DEFAULT {SQLITE_NOW}
+    )
+    """),
+    ('response_templates', f"""
+    CREATE TABLE IF NOT EXISTS response_templates (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category_id INTEGER NOT NULL UNIQUE REFERENCES categories(id) ON DELETE CASCADE,
+        current_version INTEGER NOT NULL DEFAULT 1,
+        updated_at TIMESTAMP DEFAULT {SQLITE_NOW}
+    )
+    """),
+    ('response_template_versions', f"""
+    CREATE TABLE IF NOT EXISTS response_template_versions (
+        template_id INTEGER NOT NULL REFERENCES response_templates(id) ON DELETE CASCADE,
+        version INTEGER NOT NULL,
+        body TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT {SQLITE_NOW},
+        PRIMARY KEY (template_id, version)
+    )
+    """),
+    ('emails', f"""
+    CREATE TABLE IF NOT EXISTS emails (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sender VARCHAR(255) NOT NULL,
+        subject VARCHAR(500) NOT NULL,
+        category_id INTEGER REFERENCES categories(id) ON DELETE SET NULL,
+        confidence_score FLOAT DEFAULT 0.0,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        is_processed BOOLEAN DEFAULT FALSE,
+        response_template_id INTEGER NULL REFERENCES response_templates(id) ON DELETE SET NULL,
+        dedup_key CHAR(64) NULL,
+        created_at TIMESTAMP DEFAULT {SQLITE_NOW}
+    )
+    """),
+    ('emails_uq_dedup_key', "CREATE UNIQUE INDEX IF NOT EXISTS uq_emails_dedup_key ON emails (dedup_key)"),
+    ('emails_idx_created', "CREATE INDEX IF NOT EXISTS idx_emails_created ON emails (created_at)"),
+    ('emails_idx_user', "CREATE INDEX IF NOT EXISTS idx_emails_user ON emails (user_id)"),
+    ('email_contents', """
+    CREATE TABLE IF NOT EXISTS email_contents (
+        email_id INTEGER PRIMARY KEY REFERENCES emails(id) ON DELETE CASCADE,
+        body TEXT NOT NULL,
+        body_compressed BLOB NULL,
+        suggested_response TEXT
+    )
+    """),
+    ('feedback', f"""
+    CREATE TABLE IF NOT EXISTS feedback (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email_id INTEGER NOT NULL REFERENCES emails(id) ON DELETE CASCADE,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        original_category_id INTEGER REFERENCES categories(id) ON DELETE SET NULL,
+        corrected_category_id INTEGER REFERENCES categories(id) ON DELETE SET NULL,
+        feedback_text TEXT,
+        created_at TIMESTAMP DEFAULT {SQLITE_NOW}
+    )
+    """),
+    # Chaves estrangeiras não são indexadas automaticamente no SQLite
+    ('feedback_idx_email', "CREATE INDEX IF NOT EXISTS idx_feedback_email ON feedback (email_id)"),
+    ('emails_archive', f"""
+    CREATE TABLE IF NOT EXISTS emails_archive (
+        id INTEGER PRIMARY KEY,
+        sender VARCHAR(255) NOT NULL,
+        subject VARCHAR(500) NOT NULL,
+        category_id INTEGER,
+        confidence_score FLOAT DEFAULT 0.0,
+        user_id INTEGER NOT NULL,
+        is_processed BOOLEAN DEFAULT FALSE,
+        response_template_id INTEGER NULL,
+        dedup_key CHAR(64) NULL,
+        created_at TIMESTAMP NULL,
+        archived_at TIMESTAMP DEFAULT {SQLITE_NOW}
+    )
+    """),
+    ('emails_archive_idx_created',
+     "CREATE INDEX IF NOT EXISTS idx_emails_archive_created ON emails_archive (created_at)"),
+    ('emails_archive_idx_user_created',
+     "CREATE INDEX IF NOT EXISTS idx_emails_archive_user_created ON emails_archive (user_id, created_at)"),
+    ('email_contents_archive', """
+    CREATE TABLE IF NOT EXISTS email_contents_archive (
+        email_id INTEGER PRIMARY KEY,
+        body TEXT NOT NULL,
+        body_compressed BLOB NULL,
+        suggested_response TEXT
+    )
+    """),
+    ('email_archive_totals', """
+    CREATE TABLE IF NOT EXISTS email_archive_totals (
+        user_id INTEGER NOT NULL,
+        category_id INTEGER NOT NULL DEFAULT 0,
+        email_count INTEGER NOT NULL DEFAULT 0,
+        confidence_sum DOUBLE NOT NULL DEFAULT 0,
+        confidence_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, category_id)
+    )
+    """),
+    ('system_state', f"""
+    CREATE TABLE IF NOT EXISTS system_state (
+        name VARCHAR(100) PRIMARY KEY,
+        value VARCHAR(255),
+        updated_at TIMESTAMP DEFAULT {SQLITE_NOW}
+    )
+    """),
+    # Busca textual: índices FTS5 de conteúdo externo, sincronizados por gatilhos
+    ('emails_fts', """
+    CREATE VIRTUAL TABLE IF NOT EXISTS emails_fts
+    USING fts5(subject, content='emails', content_rowid='id')
+    """),
+    ('emails_fts_insert', """
+    CREATE TRIGGER IF NOT EXISTS emails_fts_insert AFTER INSERT ON emails BEGIN
+        INSERT INTO emails_fts (rowid, subject) VALUES (new.id, new.subject);
+    END
+    """),
+    ('emails_fts_delete', """
+    CREATE TRIGGER IF NOT EXISTS emails_fts_delete AFTER DELETE ON emails BEGIN
+        INSERT INTO emails_fts (emails_fts, rowid, subject) VALUES ('delete', old.id, old.subject);
+    END
+    """),
+    ('emails_fts_update', """
+    CREATE TRIGGER IF NOT EXISTS emails_fts_update AFTER UPDATE OF subject ON emails BEGIN
+        INSERT INTO emails_fts (emails_fts, rowid, subject) VALUES ('delete', old.id, old.subject);
+        INSERT INTO emails_fts (rowid, subject) VALUES (new.id, new.subject);
+    END
+    """),
+    ('email_contents_fts', """
+    CREATE VIRTUAL TABLE IF NOT EXISTS email_contents_fts
+    USING fts5(body, content='email_contents', content_rowid='email_id')
+    """),
+    ('email_contents_fts_insert', """
+    CREATE TRIGGER IF NOT EXISTS email_contents_fts_insert AFTER INSERT ON email_contents BEGIN
+        INSERT INTO email_contents_fts (rowid, body) VALUES (new.email_id, new.body);
+    END
+    """),
+    ('email_contents_fts_delete', """
+    CREATE TRIGGER IF NOT EXISTS email_contents_fts_delete AFTER DELETE ON email_contents BEGIN
+        INSERT INTO email_contents_fts (email_contents_fts, rowid, body) VALUES ('delete', old.email_id, old.body);
+    END
+    """),
+    ('email_contents_fts_update', """
+    CREATE TRIGGER IF NOT EXISTS email_contents_fts_update AFTER UPDATE OF body ON email_contents BEGIN
+        INSERT INTO email_contents_fts (email_contents_fts, rowid, body) VALUES ('delete', old.email_id, old.body);
+        INSERT INTO email_contents_fts (rowid, body) VALUES (new.email_id, new.body);
+    END
+    """),
+]
+
+
+class BufferedCursor:
+    """Envolve um cursor do driver; com buffered, lê o resultado inteiro logo após o execute"""
+
+    def __init__(self, cursor, buffered=True):
+        self._cursor = cursor
+        self._buffered = buffered
+        self._rows = None
+        self._position = 0
+        self.rowcount = -1
+
+    def _after_execute(self):
+        self._rows = None
+        self._position = 0
+        self.rowcount = self._cursor.rowcount
+        # Como no cursor buffered do MySQL: SELECT já lido, com rowcount conhecido
+        if self._buffered and self._cursor.description is not None:
+            self._rows = self._cursor.fetchall()
+            self.rowcount = len(self._rows)
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def fetchmany(self, size=1):
+        if self._rows is None:
+            return self._cursor.fetchmany(size)
+        rows = self._rows[self._position:self._position + size]
+        self._position += len(rows)
+        return rows
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchall(self):
+        if self._rows is None:
+            return self._cursor.fetchall()
+        rows = self._rows[self._position:]
+        self._position = len(self._rows)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._cursor.close()
+
+
+class MySQLPreparedCursor(BufferedCursor):
+    """Instrução preparada no servidor uma única vez e executada pelo protocolo binário"""
+
+    def __init__(self, connection, sql):
+        # O conector não tem cursor preparado buffered; o resultado é lido em _after_execute
+        super().__init__(connection.cursor(prepared=True, buffered=False))
+        self.sql = sql
+
+    def execute(self, sql=None, params=()):
+        # Sempre o mesmo objeto str: o conector só prepara de novo quando a instrução muda
+        self._cursor.execute(self.sql, tuple(params or ()))
+        self._after_execute()
+        return self
+
+
+class MySQLBackend:
+    name = 'mysql'
+    label = 'MySQL'
+    tables = MYSQL_TABLES
+    columns = MYSQL_COLUMNS
+    indexes = MYSQL_INDEXES
+
+    def connect(self, host=None, port=None, user=None, password=None, autocommit=False):
+        """Conexão com o primário (DB_*) ou, com host/porta, com uma réplica"""
+        # ALTERE AQUI SUAS CREDENCIAIS DO MYSQL
+        return mysql.connector.connect(
+            host=host or os.getenv('DB_HOST', 'localhost'),
+            database=os.getenv('DB_NAME', 'email_classifier_teste'),
+            user=user or os.getenv('DB_USER', 'dudu-e'),
+            password=password or os.getenv('DB_PASSWORD', 'dudu'),
+            port=port or os.getenv('DB_PORT', 3306),
+            autocommit=autocommit,
+            # Resultados lidos por completo: rowcount disponível e sem "Unread result found"
+            buffered=True
+        )
+
+    def connection_help(self):
+        return [
+            "1. O MySQL está rodando",
+            "2. As credenciais estão corretas",
+            f"3. O banco '{os.getenv('DB_NAME', 'email_classifier_teste')}' existe",
+        ]
+
+    def column_info(self, db, cursor, table, column):
+        """(data_type, is_nullable) da coluna, ou None se ela não existe"""
+        db.execute(cursor, 'schema.column_info', """
+            SELECT data_type, is_nullable FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """, (table, column))
+        return cursor.fetchone()
+
+    def index_exists(self, db, cursor, table, index_name):
+        db.execute(cursor, 'schema.index_exists', """
+            SELECT 1 FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+            LIMIT 1
+        """, (table, index_name))
+        return cursor.fetchone() is not None
+
+    def explain(self, cursor, statement, params):
+        cursor.execute(f"EXPLAIN FORMAT=JSON {statement}", params or ())
+        row = cursor.fetchone()
+        return json.loads(row[0]) if row else None
+
+    def prepare(self, connection, sql):
+        return MySQLPreparedCursor(connection, sql)
+
+    def needs_reprepare(self, error):
+        """Instrução desconhecida no servidor (1243) ou conexão perdida e refeita"""
+        return getattr(error, 'errno', None) in (1243, 2006, 2013, 2055)
+
+    def is_unknown_column(self, error):
+        return getattr(error, 'errno', None) == 1054
+
+    def reconnect(self, connection):
+        if not connection.is_connected():
+            connection.reconnect(attempts=2, delay=0)
+
+    def insert_unique(self, db, cursor, name, sql, params, table, key):
+        """INSERT numa tabela com dedup_key única: (id, criado) sem duplicar a linha"""
+        cursor = db.execute_prepared(name, f"{sql} ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)", params)
+        # rowcount 0: a chave já existia (a conexão não usa CLIENT_FOUND_ROWS)
+        return cursor.lastrowid, cursor.rowcount == 1
+
+    def try_lock(self, db, cursor, name):
+        """Trava nomeada entre processos, sem espera (True se obtida)"""
+        db.execute(cursor, 'lock.get', "SELECT GET_LOCK(%s, 0)", (name,))
+        return cursor.fetchone()[0] == 1
+
+    def release_lock(self, db, cursor, name):
+        db.execute(cursor, 'lock.release', "SELECT RELEASE_LOCK(%s)", (name,))
+        cursor.fetchone()
+
+    def update_from(self, db, cursor, name, table, source, columns):
+        """Copia `columns` de source para table (linhas casadas por id) num único UPDATE ... JOIN"""
+        assignments = ', '.join(f"t.{column} = s.{column}" for column in columns)
+        db.execute(cursor, name, f"UPDATE {table} t JOIN {source} s ON s.id = t.id SET {assignments}")
+
+    def search_source(self, terms, user_id=None):
+        """(SQL, parâmetros) de uma subconsulta (email_id, score) sobre os índices FULLTEXT"""
+        boolean_query = build_boolean_query(terms)
+
+        # Assunto (emails) e corpo (email_contents) têm índices separados;
+        # o assunto pesa o dobro, como na classificação
+        if user_id is None:
+            return """
+                SELECT e.id AS email_id,
+                       MATCH(e.subject) AGAINST (%s IN BOOLEAN MODE) * 2 AS score
+                FROM emails e
+                WHERE MATCH(e.subject) AGAINST (%s IN BOOLEAN MODE)
+                UNION ALL
+                SELECT ec.email_id, MATCH(ec.body) AGAINST (%s IN BOOLEAN MODE)
+                FROM email_contents ec
+                WHERE MATCH(ec.body) AGAINST (%s IN BOOLEAN MODE)
+            """, (boolean_query,) * 4
+
+        return """
+            SELECT e.id AS email_id,
+                   MATCH(e.subject) AGAINST (%s IN BOOLEAN MODE) * 2 AS score
+            FROM emails e
+            WHERE MATCH(e.subject) AGAINST (%s IN BOOLEAN MODE) AND e.user_id = %s
+            UNION ALL
+            SELECT ec.email_id, MATCH(ec.body) AGAINST (%s IN BOOLEAN MODE)
+            FROM email_contents ec
+            JOIN emails e ON e.id = ec.email_id
+            WHERE MATCH(ec.body) AGAINST (%s IN BOOLEAN MODE) AND e.user_id = %s
+        """, (boolean_query, boolean_query, user_id, boolean_query, boolean_query, user_id)
+
+
+# Tradução do SQL no dialeto do MySQL usado pela aplicação
+_SQLITE_REWRITES = [
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\bINSERT\s+IGNORE\b', re.IGNORECASE), 'INSERT OR IGNORE'),
+    (re.compile(r'\bON\s+DUPLICATE\s+KEY\s+UPDATE\b', re.IGNORECASE), 'ON CONFLICT DO UPDATE SET'),
+    (re.compile(r'\bVALUES\((\w+)\)', re.IGNORECASE), r'excluded.\1'),
+    (re.compile(r'\bGREATEST\(', re.IGNORECASE), 'MAX('),
+    (re.compile(r'\bLEAST\(', re.IGNORECASE), 'MIN('),
+    # O SQLite serializa escritas; não há travas de linha
+    (re.compile(r'\bFOR\s+UPDATE(\s+SKIP\s+LOCKED)?', re.IGNORECASE), ''),
+]
+
+
+@lru_cache(maxsize=1024)
+def to_sqlite(sql):
+    for pattern, replacement in _SQLITE_REWRITES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+class SQLiteCursor(BufferedCursor):
+    """Cursor com a interface usada pela aplicação (a do mysql-connector)"""
+
+    def __init__(self, connection, buffered=True):
+        super().__init__(connection.cursor(), buffered)
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(to_sqlite(sql), params or ())
+        self._after_execute()
+        return self
+
+    def executemany(self, sql, seq_params):
+        self._cursor.executemany(to_sqlite(sql), seq_params)
+        self._after_execute()
+        return self
+
+
+class SQLiteConnection:
+    """Conexão SQLite com a interface usada pela aplicação (a do mysql-connector)"""
+
+    def __init__(self, path, timeout):
+        # Conexões ociosas passam de uma thread para outra (uma de cada vez)
+        self._connection = sqlite3.connect(path, timeout=timeout, detect_types=sqlite3.PARSE_DECLTYPES,
+                                           check_same_thread=False)
+        self._closed = False
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.execute("PRAGMA foreign_keys = ON")
+
+    def cursor(self, buffered=True, **kwargs):
+        return SQLiteCursor(self._connection, buffered)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def is_connected(self):
+        return not self._closed
+
+    def close(self):
+        self._closed = True
+        self._connection.close()
+
+
+class SQLiteBackend:
+    name = 'sqlite'
+    label = 'SQLite'
+    tables = SQLITE_TABLES
+    # O DDL acima já cria as demais colunas e índices
+    columns = [
+        ('emails_archive', 'dedup_key',
+         "ALTER TABLE emails_archive ADD COLUMN dedup_key CHAR(64) NULL"),
+    ]
+    indexes = [
+        ('emails_archive', 'uq_emails_archive_dedup_key',
+         "CREATE UNIQUE INDEX IF NOT EXISTS uq_emails_archive_dedup_key ON emails_archive (dedup_key)"),
+    ]
+
+    def __init__(self, path=None, timeout=None):
+        self.path = path or os.getenv('DB_PATH', 'email_classifier.db')
+        self.timeout = timeout if timeout is not None else float(os.getenv('DB_BUSY_TIMEOUT', 10))
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def connect(self):
+        return SQLiteConnection(self.path, self.timeout)
+
+    def connection_help(self):
+        return [f"1. O arquivo '{self.path}' pode ser criado/gravado"]
+
+    def column_info(self, db, cursor, table, column):
+        db.execute(cursor, 'schema.column_info', f"PRAGMA table_info({table})")
+        for _, name, data_type, not_null, _, _ in cursor.fetchall():
+            if name == column:
+                return data_type.lower(), 'NO' if not_null else 'YES'
+        return None
+
+    def index_exists(self, db, cursor, table, index_name):
+        db.execute(cursor, 'schema.index_exists',
+                   "SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s",
+                   (table, index_name))
+        return cursor.fetchone() is not None
+
+    def explain(self, cursor, statement, params):
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement}", params or ())
+        return [{'id': row[0], 'parent': row[1], 'detail': row[3]} for row in cursor.fetchall()]
+
+    def prepare(self, connection, sql):
+        # O sqlite3 já mantém um cache de instruções compiladas por conexão
+        return connection.cursor()
+
+    def needs_reprepare(self, error):
+        return False
+
+    def is_unknown_column(self, error):
+        return isinstance(error, sqlite3.OperationalError) and 'no such column' in str(error)
+
+    def reconnect(self, connection):
+        pass
+
+    def insert_unique(self, db, cursor, name, sql, params, table, key):
+        db.execute(cursor, name, f"{sql} ON CONFLICT (dedup_key) DO NOTHING", params)
+        if cursor.rowcount == 1:
+            return cursor.lastrowid, True
+        db.execute(cursor, f"{table}.by_dedup_key", f"SELECT id FROM {table} WHERE dedup_key = %s", (key,))
+        return cursor.fetchone()[0], False
+
+    def try_lock(self, db, cursor, name):
+        """Trava de arquivo ao lado do banco (vale entre os workers do mesmo servidor)"""
+        with self._locks_guard:
+            if name in self._locks:
+                return False
+            handle = open(f"{self.path}.{name}.lock", 'w')
+            if fcntl:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    handle.close()
+                    return False
+            self._locks[name] = handle
+            return True
+
+    def release_lock(self, db, cursor, name):
+        with self._locks_guard:
+            handle = self._locks.pop(name, None)
+        if handle:
+            handle.close()
+
+    def update_from(self, db, cursor, name, table, source, columns):
+        # O SQLite não tem UPDATE ... JOIN; UPDATE ... FROM (3.33+) faz o mesmo
+        assignments = ', '.join(f"{column} = s.{column}" for column in columns)
+        db.execute(cursor, name, f"UPDATE {table} AS t SET {assignments} FROM {source} AS s WHERE s.id = t.id")
+
+    def search_source(self, terms, user_id=None):
+        """(SQL, parâmetros) de uma subconsulta (email_id, score) sobre os índices FTS5"""
+        # Qualquer termo, com prefixo, como o BOOLEAN MODE sem operadores
+        match = ' OR '.join(f'"{term}"*' for term in terms)
+        # bm25() é menor para documentos mais relevantes
+        if user_id is None:
+            return """
+                SELECT emails_fts.rowid AS email_id, -bm25(emails_fts) * 2 AS score
+                FROM emails_fts
+                WHERE emails_fts MATCH %s
+                UNION ALL
+                SELECT email_contents_fts.rowid, -bm25(email_contents_fts)
+                FROM email_contents_fts
+                WHERE email_contents_fts MATCH %s
+            """, (match, match)
+
+        return """
+            SELECT emails_fts.rowid AS email_id, -bm25(emails_fts) * 2 AS score
+            FROM emails_fts
+            JOIN emails e ON e.id = emails_fts.rowid
+            WHERE emails_fts MATCH %s AND e.user_id = %s
+            UNION ALL
+            SELECT email_contents_fts.rowid, -bm25(email_contents_fts)
+            FROM email_contents_fts
+            JOIN emails e ON e.id = email_contents_fts.rowid
+            WHERE email_contents_fts MATCH %s AND e.user_id = %s
+        """, (match, user_id, match, user_id)
+
+
+BACKENDS = {
+    'mysql': MySQLBackend,
+    'sqlite': SQLiteBackend,
+}
+
+
+def get_backend(name=None):
+    """Backend escolhido por DB_BACKEND (mysql, sqlite)"""
+    name = (name or os.getenv('DB_BACKEND', 'mysql')).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"DB_BACKEND desconhecido: {name}")
+    return BACKENDS[name]()
@@ -0,0 +1,61 @@
+"""Gerador determinístico de emails sintéticos em português, rotulados por categoria."""
+import random
+
+# Vocabulário por categoria (IDs iguais aos de EmailClassifier.categories)
+VOCABULARY = {
+    1: ['erro', 'sistema', 'falha', 'servidor', 'acesso', 'senha', 'bloqueado', 'lentidão', 'travando',
+        'aplicativo', 'conexão', 'timeout', 'backup', 'atualização', 'instalação', 'bug', 'tela', 'login'],
+    2: ['orçamento', 'proposta', 'preço', 'desconto', 'contrato', 'cotação', 'compra', 'cliente',
+        'produto', 'demonstração', 'negociação', 'pagamento', 'parcelamento', 'licenças', 'plano', 'renovação'],
+    3: ['campanha', 'promoção', 'newsletter', 'evento', 'lançamento', 'redes', 'sociais', 'marca',
+        'anúncio', 'divulgação', 'webinar', 'conteúdo', 'blog', 'influenciador', 'banner', 'público'],
+    4: ['vaga', 'currículo', 'entrevista', 'candidato', 'férias', 'benefícios', 'salário', 'treinamento',
+        'contratação', 'admissão', 'colaborador', 'atestado', 'ponto', 'carreira', 'promoção', 'rescisão'],
+    5: ['fatura', 'boleto', 'nota', 'fiscal', 'pagamento', 'vencimento', 'cobrança', 'imposto',
+        'reembolso', 'extrato', 'conciliação', 'despesa', 'receita', 'orçamento', 'auditoria', 'balanço'],
+    6: ['informação', 'dúvida', 'reunião', 'agenda', 'documento', 'endereço', 'horário', 'contato',
+        'cadastro', 'protocolo', 'sugestão', 'elogio', 'parceria', 'consulta', 'atendimento', 'retorno'],
+}
+
+FILLER = ['olá', 'bom', 'dia', 'equipe', 'gostaria', 'favor', 'verificar', 'obrigado', 'aguardo',
+          'retorno', 'hoje', 'semana', 'prazo', 'urgente', 'possível', 'ajuda', 'empresa', 'time']
+
+SUBJECT_TEMPLATES = [
+    "{a} {b}",
+    "Sobre {a} e {b}",
+    "Dúvida: {a} {b}",
+    "Re: {a} {b}",
+    "{a} - {b} pendente",
+]
+
+SENDER_DOMAINS = ['empresa.com', 'cliente.com.br', 'fornecedor.com', 'exemplo.org']
+
+
+def generate_email(rng, category_id=None, body_words=(20, 80), noise=0.3):
+    """Gera (sender, subject, body, category_id); `noise` é a fração de palavras de outras categorias"""
+    if category_id is None:
+        category_id = rng.choice(list(VOCABULARY))
+
+    words = VOCABULARY[category_id]
+    others = [word for cat, vocab in VOCABULARY.items() if cat != category_id for word in vocab]
+
+    subject = rng.choice(SUBJECT_TEMPLATES).format(a=rng.choice(words), b=rng.choice(words))
+
+    body = []
+    for _ in range(rng.randint(*body_words)):
+        roll = rng.random()
+        if roll < noise / 2:
+            body.append(rng.choice(others))
+        elif roll < noise:
+            body.append(rng.choice(FILLER))
+        else:
+            body.append(rng.choice(words))
+
+    sender = f"user{rng.randint(1, 100000)}@{rng.choice(SENDER_DOMAINS)}"
+    return sender, subject.capitalize(), ' '.join(body).capitalize() + '.', category_id
+
+
+def generate_emails(count, seed=42, **kwargs):
+    """Lista com `count` emails sintéticos, reprodutível para a mesma semente"""
+    rng = random.Random(seed)
+    return [generate_email(rng, **kwargs) for _ in range(count)]
@@ -0,0 +1,224 @@
+"""Extração dos dados de treinamento do /retrain.
+
+O feedback é lido em blocos de TRAINING_CHUNK_SIZE linhas por um cursor sem
+buffer (o resultado fica no servidor até ser lido) e cada bloco é descomprimido
+e preprocessado num pool de TRAINING_WORKERS processos. Só a correção mais
+recente de cada email entra no treino. O ID do último feedback usado fica em
+system_state, e o modo incremental puxa apenas o feedback posterior a ele.
+
+IDs de auto-incremento são atribuídos no INSERT, não no commit: um feedback
+com ID menor que o último lido pode aparecer depois (transação ainda aberta
+na leitura, ou atraso da réplica). Por isso a marca guarda também os IDs que
+faltavam entre os TRAINING_WATERMARK_MARGIN anteriores ao último, e o próximo
+treino incremental os relê. Cada feedback entra no modelo uma única vez.
+
+Um ID que falta é reservado antes do próximo ID visível. Se esse feedback foi
+criado há mais de TRAINING_GAP_TIMEOUT segundos, o ID que falta é de um INSERT
+desfeito (ou apagado) e deixa de ser guardado: buracos permanentes não ocupam
+as vagas de WATERMARK_MAX_PENDING.
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from ai_classifier import model_text, preprocess_text
+from classify_pool import mp_context
+from content_store import unpack_body
+from logs import get_logger
+from metrics import metrics, SIZE_BUCKETS
+from storage import Error
+
+TRAINING_CHUNK_SIZE = int(os.getenv('TRAINING_CHUNK_SIZE', 2000))
+# 1 preprocessa no próprio processo
+TRAINING_WORKERS = int(os.getenv('TRAINING_WORKERS', min(4, os.cpu_count() or 1)))
+
+# IDs abaixo do último lido em que um feedback ainda pode aparecer
+TRAINING_WATERMARK_MARGIN = int(os.getenv('TRAINING_WATERMARK_MARGIN', 1000))
+# IDs pendentes guardados na marca (system_state.value tem até 255 caracteres)
+WATERMARK_MAX_PENDING = 20
+# Idade (segundos) a partir da qual um ID que falta não é mais esperado (transação mais longa que isso)
+TRAINING_GAP_TIMEOUT = int(os.getenv('TRAINING_GAP_TIMEOUT', 600))
+
+WATERMARK_NAME = 'retrain_feedback_watermark'
+
+logger = get_logger('training_data')
+
+
+def get_watermark(db):
+    """(ID do último feedback usado num treino, [IDs pendentes abaixo dele]); None se nunca houve"""
+    cursor = db.connection.cursor()
+    db.execute(cursor, 'system_state.retrain_watermark', "SELECT value FROM system_state WHERE name = %s",
+               (WATERMARK_NAME,))
+    row = cursor.fetchone()
+    if not row or not row[0]:
+        return None
+    last_id, _, pending = row[0].partition(':')
+    return int(last_id), [int(feedback_id) for feedback_id in pending.split(',') if feedback_id]
+
+
+def set_watermark(db, watermark):
+    last_id, pending = watermark
+    value = f"{last_id}:{','.join(map(str, pending))}" if pending else str(last_id)
+    cursor = db.connection.cursor()
+    try:
+        db.execute(cursor, 'system_state.set_retrain_watermark', """
+            INSERT INTO system_state (name, value) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE value = VALUES(value)
+        """, (WATERMARK_NAME, value))
+        db.connection.commit()
+    except Exception:
+        db.connection.rollback()
+        raise
+
+
+def stream_feedback(db, connection, since=None, chunk_size=TRAINING_CHUNK_SIZE, pending=()):
+    """Blocos de linhas (feedback_id, subject, body, body_compressed, body legado, categoria)
+
+    Com `since`, só o feedback posterior a ele e o de `pending`. A conexão fica ocupada até o
+    último bloco ser lido; use uma conexão só para isso.
+    """
+    since_filter = ""
+    params = None
+    if since:
+        pending = list(pending)
+        in_pending = f" OR f.id IN ({', '.join(['%s'] * len(pending))})" if pending else ""
+        since_filter = f"AND (f.id > %s{in_pending})"
+        params = (since, *pending)
+
+    def select(cursor):
+        legacy_body = "e.body" if db.legacy_content else "NULL"
+        # Repetições da correção de um mesmo email: vale a mais recente
+        db.execute(cursor, 'retrain.feedback_since' if since else 'retrain.feedback', f"""
+            SELECT f.id, e.subject, ec.body, ec.body_compressed, {legacy_body}, f.corrected_category_id
+            FROM feedback f
+            JOIN emails e ON f.email_id = e.id
+            LEFT JOIN email_contents ec ON ec.email_id = e.id
+            WHERE f.corrected_category_id IS NOT NULL {since_filter}
+              AND NOT EXISTS (
+                  SELECT 1 FROM feedback newer
+                  WHERE newer.email_id = f.email_id AND newer.id > f.id
+                    AND newer.corrected_category_id IS NOT NULL
+              )
+            ORDER BY f.id
+        """, params)
+
+    cursor = connection.cursor(buffered=False)
+    try:
+        select(cursor)
+    except Error as e:
+        if not db.legacy_content_gone(e):
+            raise
+        cursor.close()
+        cursor = connection.cursor(buffered=False)
+        select(cursor)
+
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            metrics.observe('batch_size', len(rows), buckets=SIZE_BUCKETS, operation='retrain_chunk')
+            yield rows
+    finally:
+        cursor.close()
+
+
+def preprocess_chunk(rows):
+    """(último feedback_id, textos, rótulos) de um bloco; roda nos processos do pool"""
+    texts = []
+    labels = []
+    for feedback_id, subject, body_text, body_compressed, legacy_body, category_id in rows:
+        body = unpack_body(body_text, body_compressed) if body_text is not None else legacy_body
+        text = preprocess_text(model_text(subject, body))
+        if text:
+            texts.append(text)
+            labels.append(category_id)
+    return rows[-1][0], texts, labels
+
+
+def preprocess_chunks(chunks, workers=TRAINING_WORKERS):
+    """preprocess_chunk de cada bloco, na ordem, com no máximo 2 blocos por processo em memória"""
+    if workers <= 1:
+        for chunk in chunks:
+            yield preprocess_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context()) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(preprocess_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def pending_feedback(db, connection, watermark, last_id, read_ids):
+    """IDs até last_id que ainda podem receber feedback utilizável: nem lidos, nem descartados, nem antigos"""
+    since, pending = watermark or (0, ())
+    low = max(last_id - TRAINING_WATERMARK_MARGIN, 0)
+    candidates = {feedback_id for feedback_id in range(low + 1, last_id + 1)
+                  if feedback_id > since or feedback_id in pending}
+    candidates -= read_ids
+    if not candidates:
+        return []
+
+    # Feedback visível na faixa: se a leitura o descartou (sem categoria ou substituído por outro
+    # mais novo) e se é antigo o bastante para encerrar a espera pelos IDs que faltam abaixo dele
+    cutoff = datetime.now() - timedelta(seconds=TRAINING_GAP_TIMEOUT)
+    cursor = connection.cursor()
+    db.execute(cursor, 'retrain.settled_feedback', """
+        SELECT f.id,
+               f.corrected_category_id IS NULL OR EXISTS (
+                   SELECT 1 FROM feedback newer
+                   WHERE newer.email_id = f.email_id AND newer.id > f.id
+                     AND newer.corrected_category_id IS NOT NULL
+               ),
+               f.created_at < %s
+        FROM feedback f
+        WHERE f.id > %s AND f.id <= %s
+    """, (cutoff, low, last_id))
+    visible = {feedback_id: (settled, old) for feedback_id, settled, old in cursor.fetchall()}
+    cursor.close()
+
+    expired = False
+    for feedback_id in range(last_id, low, -1):
+        if feedback_id in visible:
+            settled, expired = visible[feedback_id]
+            if settled:
+                candidates.discard(feedback_id)
+        elif expired:
+            candidates.discard(feedback_id)
+
+    pending = sorted(candidates)
+    if len(pending) > WATERMARK_MAX_PENDING:
+        logger.warning("%d IDs de feedback pendentes; só os %d mais recentes serão relidos",
+                       len(pending), WATERMARK_MAX_PENDING)
+        pending = pending[-WATERMARK_MAX_PENDING:]
+    return pending
+
+
+def collect_training_data(db, connection, categories, watermark=None,
+                          chunk_size=TRAINING_CHUNK_SIZE, workers=TRAINING_WORKERS):
+    """(textos, rótulos, nova marca) do feedback posterior à marca (last_id, pendentes) de get_watermark"""
+    since, pending = watermark or (None, ())
+    read_ids = set()
+
+    def chunks():
+        for rows in stream_feedback(db, connection, since, chunk_size, pending):
+            read_ids.update(row[0] for row in rows)
+            yield rows
+
+    texts = []
+    labels = []
+    for _, chunk_texts, chunk_labels in preprocess_chunks(chunks(), workers):
+        for text, label in zip(chunk_texts, chunk_labels):
+            if label in categories:
+                texts.append(text)
+                labels.append(label)
+
+    last_id = max(read_ids | {since or 0})
+    if not last_id:
+        return texts, labels, None
+    return texts, labels, (last_id, pending_feedback(db, connection, watermark, last_id, read_ids))